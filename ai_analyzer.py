@@ -1,148 +1,196 @@
 from openai import OpenAI
 from openai import APIError, AuthenticationError, RateLimitError
-from typing import Dict, Any, Optional
+from openai import APIConnectionError, APITimeoutError, InternalServerError
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from cache import ResponseCache
+from prompt_builder import build_prompt, DEFAULT_TOKEN_BUDGET
+from profiling import Profiler, phase
 import json
+import random
+import threading
+import time
 
-def get_ai_analysis(font_data: Dict[str, Any], api_key: str, model: str = 'gpt-4o-mini') -> Optional[Dict[str, Any]]:
-    """Uses AI to analyze typography and suggest font pairings"""
-    
-    client = OpenAI(api_key=api_key)
-    
-    # Prepare font data for AI analysis
-    fonts_summary = []
-    for index, font in enumerate(font_data.get('fonts', []), 1):
-        fonts_summary.append({
-            'rank': index,
-            'fontFamily': font.get('fontFamily', ''),
-            'totalUsageCount': font.get('totalUsageCount', 0),
-            'elements': font.get('elements', []),
-            'variations': [
-                {
-                    'fontSize': v.get('fontSize', ''),
-                    'fontSizePx': v.get('fontSizePx', 0),
-                    'fontWeight': v.get('fontWeight', ''),
-                    'fontStyle': v.get('fontStyle', ''),
-                    'usageCount': v.get('usageCount', 0),
-                    'elements': v.get('elements', []),
-                    'sampleText': v.get('sampleText', '')
-                }
-                for v in font.get('variations', [])
-            ]
-        })
-    
-    # Limit font data to prevent token limit issues (keep top 20 fonts)
-    limited_fonts_summary = fonts_summary[:20]
-    total_fonts_count = len(fonts_summary)
-    font_data_note = f"Font Data (Used Fonts)" if total_fonts_count <= 20 else f"Font Data (Used Fonts - showing top 20 of {total_fonts_count} total)"
-    
-    prompt = f"""You are a typography expert. Analyze the following font usage data from a website and provide:
+SYSTEM_PROMPT = 'You are an expert typographer and web design consultant. Provide detailed, actionable typography analysis and recommendations. Always respond with valid JSON only.'
+TEMPERATURE = 0.7
 
-1. **Typography Analysis**: 
-   - Overall typography quality and consistency
-   - Font hierarchy assessment
-   - Readability evaluation
-   - Design style classification (modern, classic, minimalist, etc.)
+# Retries for rate limits and transient API failures, with exponential backoff and jitter
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
 
-2. **Font Pairing Suggestions**:
-   - Suggest 3-5 complementary font pairings that would work well with the existing fonts
-   - Explain why each pairing works
-   - Include both serif/sans-serif combinations and alternative options
+class MalformedResponseError(Exception):
+    """The API answered, but not with a JSON object"""
 
-3. **Recommendations**:
-   - Specific improvements for font sizes, weights, and spacing
-   - Suggestions for better typography hierarchy
-   - Any issues or inconsistencies found
 
-{font_data_note}:
-{json.dumps(limited_fonts_summary, indent=2)}
+# OpenAI clients keep an HTTP connection pool, so one client per API key is reused across calls
+_clients = {}
+_clients_lock = threading.Lock()
 
-Declared but Unused Fonts:
-{json.dumps([f for f in font_data.get('declaredFonts', []) if f not in [font.get('fontFamily', '') for font in font_data.get('fonts', [])]], indent=2)}
+def get_client(api_key: str) -> OpenAI:
+    """Returns a shared OpenAI client for api_key"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # Retries are handled by _create_completion so backoff is visible and configurable
+            client = OpenAI(api_key=api_key, max_retries=0)
+            _clients[api_key] = client
+        return client
 
-External Font Sources:
-{json.dumps(font_data.get('externalFonts', []), indent=2)}
+def get_ai_analysis(font_data: Dict[str, Any], api_key: str, model: str = 'gpt-4o-mini',
+                    cache: Optional[ResponseCache] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                    max_retries: int = MAX_RETRIES, profiler: Optional[Profiler] = None,
+                    before_request: Optional[Callable[[int], None]] = None) -> Optional[Dict[str, Any]]:
+    """Uses AI to analyze typography and suggest font pairings
 
-@font-face Declarations:
-{json.dumps(font_data.get('fontFaces', []), indent=2)}
+    The prompt is trimmed to fit token_budget and its size is reported under result['usage'].
+    With a ResponseCache, a request whose prompt and model were answered before is served from
+    the cache instead of calling the API, and its usage then carries no API token or retry
+    counts. before_request, e.g. a rate limiter, is called with the prompt tokens only when
+    the API is actually called. A profiler receives ai.prompt, ai.cache, ai.api and ai.parse
+    timings and token counters.
+    """
+    
+    url = font_data.get('url')
+    with phase(profiler, 'ai.prompt', url):
+        built = build_prompt(font_data, token_budget, model, SYSTEM_PROMPT)
+    if profiler is not None:
+        profiler.count('promptTokens', built['tokens'], url)
+    usage = {
+        'promptTokens': built['tokens'],
+        'tokenBudget': built['tokenBudget'],
+        'overBudget': built['overBudget'],
+        'trimLevel': built['trimLevel'],
+        'tokenizer': built['tokenizer']
+    }
+    
+    messages = [
+        {
+            'role': 'system',
+            'content': SYSTEM_PROMPT
+        },
+        {
+            'role': 'user',
+            'content': built['prompt']
+        }
+    ]
+    
+    cache_key = None
+    if cache is not None:
+        with phase(profiler, 'ai.cache', url):
+            cache_key = cache.key_for(model, messages, TEMPERATURE)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            # The stored usage describes the original API call; a hit makes none
+            cached['usage'] = dict(usage, cached=True)
+            return cached
+    
+    if before_request is not None:
+        before_request(built['tokens'])
+    result = _request_analysis(get_client(api_key), model, messages, max_retries, profiler, url)
+    result['usage'] = dict(result.get('usage', {}), **usage)
+    
+    if cache is not None:
+        cache.put(cache_key, result)
+    return result
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before the next attempt, honouring the server's Retry-After when given"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    for header, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return min(float(value) * scale, BACKOFF_MAX_SECONDS)
+            except ValueError:
+                # HTTP-date form; fall back to exponential backoff
+                pass
+    delay = BACKOFF_BASE_SECONDS * (2 ** attempt)
+    return min(delay, BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
 
-Font Files Loaded:
-{json.dumps(font_data.get('fontFiles', [])[:20], indent=2)}
+def _create_completion(client: OpenAI, model: str, messages: List[Dict[str, str]], max_retries: int) -> Tuple[Any, int]:
+    """Calls the chat completions API, retrying rate limits and transient failures; returns (response, retries)"""
+    attempt = 0
+    while True:
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                response_format={'type': 'json_object'}
+            )
+            return response, attempt
+        except (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError) as e:
+            # An exhausted quota will not recover by waiting
+            if attempt >= max_retries or getattr(e, 'code', None) == 'insufficient_quota':
+                raise
+            time.sleep(_retry_delay(e, attempt))
+            attempt += 1
+
+def _request_analysis(client: OpenAI, model: str, messages: List[Dict[str, str]],
+                      max_retries: int = MAX_RETRIES, profiler: Optional[Profiler] = None,
+                      url: Optional[str] = None) -> Dict[str, Any]:
+    """Sends the chat completion and validates the JSON analysis it returns"""
+    
+    result, usage = request_json(client, model, messages, max_retries, profiler, url)
+    result = normalize_analysis(result)
+    result['usage'] = usage
+    return result
 
-Variable Fonts:
-{json.dumps(font_data.get('variableFonts', []), indent=2)}
+def normalize_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Ensures required fields exist (with defaults if missing)"""
+    if 'analysis' not in result:
+        result['analysis'] = {}
+    if 'fontPairings' not in result:
+        result['fontPairings'] = []
+    if 'recommendations' not in result:
+        result['recommendations'] = []
+    if 'issues' not in result:
+        result['issues'] = []
+    return result
 
-Provide your analysis in a structured JSON format with the following structure:
-{{
-  "analysis": {{
-    "overallQuality": "rating and brief description",
-    "hierarchy": "assessment of font hierarchy",
-    "readability": "readability evaluation",
-    "style": "design style classification"
-  }},
-  "fontPairings": [
-    {{
-      "primary": "font name",
-      "secondary": "font name",
-      "reason": "why this pairing works",
-      "useCase": "best use case for this pairing"
-    }}
-  ],
-  "recommendations": [
-    "specific recommendation 1",
-    "specific recommendation 2"
-  ],
-  "issues": [
-    "issue 1 if any",
-    "issue 2 if any"
-  ]
-}}"""
+def request_json(client: OpenAI, model: str, messages: List[Dict[str, str]],
+                 max_retries: int = MAX_RETRIES, profiler: Optional[Profiler] = None,
+                 url: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Sends the chat completion and returns (parsed JSON object, usage)"""
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    'role': 'system',
-                    'content': 'You are an expert typographer and web design consultant. Provide detailed, actionable typography analysis and recommendations. Always respond with valid JSON only.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            temperature=0.7,
-            response_format={'type': 'json_object'}
-        )
+        with phase(profiler, 'ai.api', url):
+            response, retries = _create_completion(client, model, messages, max_retries)
         
         content = response.choices[0].message.content
         if not content:
-            raise Exception('Empty response from AI')
+            raise MalformedResponseError('AI Analysis failed: Empty response from AI')
         
         # Parse JSON with better error handling
         try:
-            result = json.loads(content)
+            with phase(profiler, 'ai.parse', url):
+                result = json.loads(content)
         except json.JSONDecodeError as e:
-            raise Exception(f'Invalid JSON response from AI: {str(e)}\nResponse: {content[:200]}')
+            raise MalformedResponseError(f'AI Analysis failed: Invalid JSON response from AI: {str(e)}\nResponse: {content[:200]}')
         
         # Validate response structure
         if not isinstance(result, dict):
-            raise Exception('AI response is not a JSON object')
+            raise MalformedResponseError('AI Analysis failed: AI response is not a JSON object')
         
-        # Ensure required fields exist (with defaults if missing)
-        if 'analysis' not in result:
-            result['analysis'] = {}
-        if 'fontPairings' not in result:
-            result['fontPairings'] = []
-        if 'recommendations' not in result:
-            result['recommendations'] = []
-        if 'issues' not in result:
-            result['issues'] = []
+        # Token counts as billed by the API
+        usage = {'retries': retries}
+        if getattr(response, 'usage', None) is not None:
+            usage['apiPromptTokens'] = response.usage.prompt_tokens
+            usage['completionTokens'] = response.usage.completion_tokens
+        if profiler is not None:
+            profiler.count('aiRetries', retries, url)
+            if 'completionTokens' in usage:
+                profiler.count('apiPromptTokens', usage['apiPromptTokens'], url)
+                profiler.count('completionTokens', usage['completionTokens'], url)
         
-        return result
+        return result, usage
+    except MalformedResponseError:
+        raise
     except AuthenticationError as e:
         raise Exception(f'OpenAI API authentication failed. Please check your API key: {str(e)}')
     except RateLimitError as e:
-        raise Exception(f'OpenAI API rate limit exceeded. Please try again later: {str(e)}')
+        raise Exception(f'OpenAI API rate limit exceeded after {max_retries} retries. Please try again later: {str(e)}')
     except APIError as e:
         raise Exception(f'OpenAI API error: {str(e)}')
     except Exception as e:
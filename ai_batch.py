@@ -0,0 +1,133 @@
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from ai_analyzer import get_ai_analysis, get_client, request_json, normalize_analysis, MalformedResponseError
+from ai_analyzer import SYSTEM_PROMPT, TEMPERATURE, MAX_RETRIES
+from cache import ResponseCache
+from profiling import Profiler, phase
+from prompt_builder import encode_site, batch_overhead_tokens, build_batch_prompt, DEFAULT_TOKEN_BUDGET
+
+DEFAULT_BATCH_SIZE = 5
+DEFAULT_BATCH_TOKEN_CEILING = 16000
+
+
+def plan_batches(sites: List[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+                 token_ceiling: int = DEFAULT_BATCH_TOKEN_CEILING, overhead_tokens: int = 0) -> List[List[int]]:
+    """Groups site indexes in order so each group has at most batch_size sites and fits token_ceiling
+
+    A site too large to share a request with anything else gets a group of its own.
+    """
+    batches = []
+    current = []
+    current_tokens = overhead_tokens
+    for index, site in enumerate(sites):
+        if current and (len(current) >= batch_size or current_tokens + site['sectionTokens'] > token_ceiling):
+            batches.append(current)
+            current = []
+            current_tokens = overhead_tokens
+        current.append(index)
+        current_tokens += site['sectionTokens']
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _valid_site_result(value: Any) -> bool:
+    """A site entry must at least carry the analysis object and the pairings list"""
+    return (isinstance(value, dict) and isinstance(value.get('analysis'), dict)
+            and isinstance(value.get('fontPairings'), list))
+
+
+def _single_messages(site: Dict[str, Any]) -> List[Dict[str, str]]:
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': site['prompt']}
+    ]
+
+
+def _site_usage(site: Dict[str, Any], token_budget: int) -> Dict[str, Any]:
+    return {
+        'promptTokens': site['tokens'],
+        'tokenBudget': token_budget,
+        'overBudget': site['tokens'] > token_budget,
+        'trimLevel': site['trimLevel'],
+        'tokenizer': site['tokenizer']
+    }
+
+
+def get_ai_analyses(font_datas: List[Dict[str, Any]], api_key: str, model: str = 'gpt-4o-mini',
+                    cache: Optional[ResponseCache] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                    batch_size: int = DEFAULT_BATCH_SIZE, token_ceiling: int = DEFAULT_BATCH_TOKEN_CEILING,
+                    max_retries: int = MAX_RETRIES, profiler: Optional[Profiler] = None,
+                    before_request: Optional[Callable[[int], None]] = None
+                    ) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """Analyzes several pages, packing their summaries into shared requests where they fit
+
+    Each page is encoded exactly as get_ai_analysis would encode it, so cached single-page
+    answers are reused and batched answers are cached under the single-page key. Pages whose
+    entry in a batched response is missing or malformed, or whose whole batched answer is not
+    JSON, fall back to one get_ai_analysis call each. API errors such as a bad key or an
+    exhausted quota are raised rather than repeated per page. before_request is called with
+    the prompt tokens of every request that goes to the API, as in get_ai_analysis. Returns
+    one (analysis, error) pair per input, in order.
+    """
+    results = [None] * len(font_datas)
+    sites = [encode_site(font_data, token_budget, model, SYSTEM_PROMPT) for font_data in font_datas]
+    cache_keys = [None] * len(sites)
+
+    pending = []
+    for index, site in enumerate(sites):
+        if cache is not None:
+            cache_keys[index] = cache.key_for(model, _single_messages(site), TEMPERATURE)
+            cached = cache.get(cache_keys[index])
+            if cached is not None:
+                cached['usage'] = dict(_site_usage(site, token_budget), cached=True)
+                results[index] = (cached, None)
+                continue
+        pending.append(index)
+
+    overhead = batch_overhead_tokens(model, SYSTEM_PROMPT)
+    fallback = []
+    for group in plan_batches([sites[i] for i in pending], batch_size, token_ceiling, overhead):
+        indexes = [pending[i] for i in group]
+        if len(indexes) == 1:
+            fallback.extend(indexes)
+            continue
+
+        with phase(profiler, 'ai.batchPrompt'):
+            built = build_batch_prompt([sites[i] for i in indexes], model, SYSTEM_PROMPT)
+        messages = [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': built['prompt']}
+        ]
+        if before_request is not None:
+            before_request(built['tokens'])
+        try:
+            response, usage = request_json(get_client(api_key), model, messages, max_retries, profiler)
+        except MalformedResponseError:
+            fallback.extend(indexes)
+            continue
+
+        answers = response.get('sites') if isinstance(response.get('sites'), dict) else {}
+        for site_id, index in zip(built['siteIds'], indexes):
+            answer = answers.get(site_id)
+            if not _valid_site_result(answer):
+                fallback.append(index)
+                continue
+            result = normalize_analysis(answer)
+            # Retries belong to the shared request, not to each site in it
+            result['usage'] = dict(_site_usage(sites[index], token_budget), batchSize=len(indexes),
+                                   batchPromptTokens=built['tokens'], batchRetries=usage['retries'])
+            if cache is not None:
+                cache.put(cache_keys[index], result)
+            results[index] = (result, None)
+
+    for index in sorted(fallback):
+        try:
+            # The cache was already consulted above; store the answer directly
+            result = get_ai_analysis(font_datas[index], api_key, model, None, token_budget, max_retries, profiler,
+                                     before_request)
+            if cache is not None:
+                cache.put(cache_keys[index], result)
+            results[index] = (result, None)
+        except Exception as e:
+            results[index] = (None, str(e))
+    return results
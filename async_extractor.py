@@ -0,0 +1,176 @@
+from playwright.async_api import Page
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+from browser_pool import AsyncBrowserPool
+from settle import SettlePolicy, settle_page_async
+from resource_blocking import ResourceBlocker
+from stylesheet_memo import StylesheetMemo
+from font_parser import analyze_font_binaries
+from font_store import FontStore
+from profiling import Profiler, phase
+from font_network import FontNetworkMonitor, FontBudget
+from font_extractor import (
+    COLLECTORS, PAGE_EXTRACTION_SCRIPT, SamplingBudget, build_font_data, record_page_counters,
+    frame_script_options, child_frames, frame_results
+)
+import asyncio
+
+async def analyze_fonts_async(url: str, verbose: bool = False, pool: Optional[AsyncBrowserPool] = None,
+                              collector: str = 'elements', settle: Optional[SettlePolicy] = None,
+                              blocker: Optional[ResourceBlocker] = None,
+                              sheet_memo: Optional[StylesheetMemo] = None,
+                              font_budget: Optional[FontBudget] = None,
+                              parse_fonts: bool = False,
+                              font_store: Optional[FontStore] = None,
+                              profiler: Optional[Profiler] = None,
+                              sampling: Optional[SamplingBudget] = None,
+                              style_sharing: bool = False) -> Dict[str, Any]:
+    """asyncio counterpart of font_extractor.analyze_fonts, returning the same dict"""
+    
+    if collector not in COLLECTORS:
+        raise ValueError(f"Unknown collector '{collector}', expected one of: {', '.join(COLLECTORS)}")
+    
+    options = {'collector': collector, 'settle': settle, 'blocker': blocker, 'sheet_memo': sheet_memo,
+               'font_budget': font_budget, 'parse_fonts': parse_fonts, 'font_store': font_store, 'profiler': profiler,
+               'sampling': sampling, 'style_sharing': style_sharing}
+    
+    if pool is None:
+        async with AsyncBrowserPool(max_pages_per_browser=1, profiler=profiler) as own_pool:
+            return await analyze_fonts_async(url, verbose, own_pool, **options)
+    
+    with phase(profiler, 'analyze', url):
+        async with pool.page() as page:
+            return await _extract_page(page, url, **options)
+
+async def analyze_fonts_concurrent(urls: Iterable[str], concurrency: int = 4, per_host_limit: int = 2,
+                                   verbose: bool = False, pool: Optional[AsyncBrowserPool] = None,
+                                   pool_options: Optional[Dict[str, Any]] = None,
+                                   lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                                   **options) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Analyzes many URLs with up to `concurrency` pages in flight, yielding (url, font_data, error) as each completes
+
+    At most `per_host_limit` pages of the same host are loaded at once. URLs are pulled from the
+    iterable lazily, so very long lists are never materialized as tasks all at once. `lookup`,
+    e.g. a result cache check, runs in a thread for each URL under its host slot; a URL it
+    returns a result for is yielded with that result instead of being rendered. Remaining
+    keyword options are passed to analyze_fonts_async.
+    """
+    
+    if pool is None:
+        async with AsyncBrowserPool(**(pool_options or {})) as own_pool:
+            async for item in analyze_fonts_concurrent(urls, concurrency, per_host_limit, verbose, own_pool,
+                                                       lookup=lookup, **options):
+                yield item
+        return
+    
+    slots = asyncio.Semaphore(concurrency)
+    host_slots = {}
+    loop = asyncio.get_running_loop()
+    
+    async def run(url):
+        host = urlsplit(url).netloc.lower()
+        if host not in host_slots:
+            host_slots[host] = asyncio.Semaphore(per_host_limit)
+        # Take the host slot first so a busy host does not hold global slots while it waits
+        async with host_slots[host]:
+            if lookup is not None:
+                try:
+                    result = await loop.run_in_executor(None, lookup, url)
+                except Exception:
+                    result = None
+                if result is not None:
+                    return url, result, None
+            async with slots:
+                try:
+                    return url, await analyze_fonts_async(url, verbose, pool, **options), None
+                except Exception as e:
+                    return url, None, str(e)
+    
+    # Keep a bounded window of scheduled tasks; each still waits on the semaphores above
+    window = max(concurrency * 4, concurrency + per_host_limit)
+    url_iter = iter(urls)
+    pending = set()
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < window:
+            try:
+                pending.add(asyncio.ensure_future(run(next(url_iter))))
+            except StopIteration:
+                exhausted = True
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+async def _extract_page(page: Page, url: str, collector: str = 'elements', settle: Optional[SettlePolicy] = None,
+                        blocker: Optional[ResourceBlocker] = None,
+                        sheet_memo: Optional[StylesheetMemo] = None,
+                        font_budget: Optional[FontBudget] = None,
+                        parse_fonts: bool = False,
+                        font_store: Optional[FontStore] = None,
+                        profiler: Optional[Profiler] = None,
+                        sampling: Optional[SamplingBudget] = None,
+                        style_sharing: bool = False) -> Dict[str, Any]:
+    """Loads url in page and extracts font information from it"""
+    
+    blocking_report = await blocker.attach_async(page) if blocker else None
+    
+    network = FontNetworkMonitor(capture_bodies=parse_fonts or font_store is not None)
+    network.attach_async(page)
+    
+    with phase(profiler, 'settle', url):
+        settle_info = await settle_page_async(page, url, settle)
+    if profiler is not None:
+        profiler.record_settle(settle_info, url)
+    
+    script_options = {'collector': collector}
+    if sheet_memo is not None:
+        script_options['knownSheets'] = sheet_memo.known_keys()
+    if parse_fonts:
+        script_options['codepoints'] = True
+    if sampling is not None:
+        script_options['sample'] = sampling.script_options()
+    if style_sharing:
+        script_options['styleSharing'] = True
+    with phase(profiler, 'evaluate', url):
+        sections = await page.evaluate(PAGE_EXTRACTION_SCRIPT, script_options)
+    if profiler is not None:
+        record_page_counters(profiler, url, sections)
+    if sheet_memo is not None:
+        sections = sheet_memo.expand(sections)
+    
+    with phase(profiler, 'iframes', url):
+        frames = child_frames(page)
+        frame_options = frame_script_options(collector, parse_fonts, sampling, style_sharing)
+        results = await asyncio.gather(*(frame.evaluate(PAGE_EXTRACTION_SCRIPT, frame_options) for frame in frames),
+                                       return_exceptions=True)
+        frames = frame_results(frames, results)
+    if profiler is not None:
+        profiler.count('frames', len(frames), url)
+    
+    font_data = build_font_data(url, sections, frames, network.files)
+    font_data['settle'] = settle_info
+    font_data['fontNetwork'] = network.report(font_data, font_budget)
+    with phase(profiler, 'fontFiles', url):
+        # Hashing, decompression, parsing and store writes run off the loop so other pages keep going;
+        # the bodies are copied since late responses may still add to them
+        loop = asyncio.get_running_loop()
+        bodies = dict(network.bodies)
+        if parse_fonts:
+            font_data['fontBinaries'] = await loop.run_in_executor(None, analyze_font_binaries, bodies, font_data,
+                                                                   font_store)
+        elif font_store is not None:
+            await loop.run_in_executor(None, _store_font_files, font_store, bodies)
+    if profiler is not None:
+        profiler.count('fontFiles', font_data['fontNetwork']['totals']['files'], url)
+        profiler.count('fontTransferBytes', font_data['fontNetwork']['totals']['transferBytes'], url)
+    if blocking_report is not None:
+        font_data['resourceBlocking'] = blocking_report
+    if 'stylesheetMemo' in sections:
+        font_data['stylesheetMemo'] = sections['stylesheetMemo']
+    return font_data
+
+def _store_font_files(font_store: FontStore, bodies: Dict[str, bytes]):
+    for file_url, body in bodies.items():
+        font_store.add(file_url, body)
@@ -0,0 +1,179 @@
+from typing import Dict, List, Any, Iterator, Optional, Set, Callable
+from urllib.request import urlopen
+import xml.etree.ElementTree as ET
+import json
+import os
+import sys
+import time
+from pipeline import run_pipeline
+from worker_pool import WorkerPool
+from cache import ResultCache, ResponseCache, options_key
+from prompt_builder import DEFAULT_TOKEN_BUDGET
+from ai_batch import DEFAULT_BATCH_TOKEN_CEILING
+from output_formatter import NdjsonWriter, compact_record
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def _read_source(source: str) -> bytes:
+    if source.startswith('http://') or source.startswith('https://'):
+        with urlopen(source, timeout=30) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _sitemap_urls(content: bytes, depth: int = 0) -> Iterator[str]:
+    """Yields page URLs from a sitemap, following sitemap indexes a few levels deep"""
+    root = ET.fromstring(content)
+    tag = root.tag.replace(SITEMAP_NS, '')
+    for loc in root.iter(f'{SITEMAP_NS}loc'):
+        url = (loc.text or '').strip()
+        if not url:
+            continue
+        if tag == 'sitemapindex':
+            if depth < 3:
+                yield from _sitemap_urls(_read_source(url), depth + 1)
+        else:
+            yield url
+
+
+def read_url_list(source: str) -> List[str]:
+    """Reads URLs from a text file (one per line, '#' comments allowed) or a sitemap.xml path/URL"""
+    content = _read_source(source)
+    if content.lstrip().startswith(b'<'):
+        urls = list(_sitemap_urls(content))
+    else:
+        urls = []
+        for line in content.decode('utf-8', errors='replace').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+    # Drop duplicates but keep the original order
+    return list(dict.fromkeys(urls))
+
+
+def load_completed_urls(output_path: str) -> Set[str]:
+    """Returns the URLs that already have a successful record in a JSONL results file"""
+    completed = set()
+    if output_path == '-' or not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run that was killed mid-write leaves a truncated last line
+                continue
+            if record.get('url') and not record.get('error'):
+                completed.add(record['url'])
+    return completed
+
+
+class JsonlWriter(NdjsonWriter):
+    """Appends one JSON record per line to output_path, flushed immediately so results survive a crash
+
+    An output_path of '-' streams to stdout instead. compact drops empty sections from each
+    record's fontData and keeps the url/error/fontData/aiAnalysis line shape that resume reads.
+    """
+
+    def __init__(self, output_path: str, compact: bool = False):
+        self.output_path = output_path
+        if output_path == '-':
+            stream = sys.stdout
+        else:
+            stream = open(output_path, 'a+', encoding='utf-8')
+            # Start on a fresh line if the previous run died mid-record
+            stream.seek(0, os.SEEK_END)
+            if stream.tell() > 0:
+                stream.seek(stream.tell() - 1)
+                if stream.read(1) != '\n':
+                    stream.write('\n')
+        super().__init__(stream)
+        self.compact_data = compact
+
+    def write(self, record: Dict[str, Any]):
+        if self.compact_data:
+            record = dict(record, fontData=compact_record(record['fontData']) if record.get('fontData') else None)
+        self.write_record(record)
+
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+async def run_batch(urls: List[str], output_path: str, concurrency: int = 4, per_host_limit: int = 2,
+                    api_key: Optional[str] = None, model: str = 'gpt-4o-mini', resume: bool = True,
+                    verbose: bool = False, pool_options: Optional[Dict[str, Any]] = None,
+                    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    cache: Optional[ResultCache] = None, refresh: bool = False,
+                    ai_cache: Optional[ResponseCache] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                    ai_concurrency: int = 2, queue_size: int = 8, requests_per_minute: Optional[int] = None,
+                    tokens_per_minute: Optional[int] = None, ai_batch_size: int = 1,
+                    ai_batch_tokens: int = DEFAULT_BATCH_TOKEN_CEILING, compact: bool = False,
+                    metrics: bool = False, skip_ai_above: Optional[float] = None,
+                    worker_pool: Optional[WorkerPool] = None, **extraction_options) -> Dict[str, Any]:
+    """Analyzes every URL and streams one JSONL record per URL to output_path as it finishes
+
+    Extraction and AI analysis run as overlapping pipeline stages (see pipeline.run_pipeline),
+    in worker processes when a worker_pool is given.
+    An output_path of '-' streams the records to stdout; compact drops empty sections.
+    With resume, URLs that already have a successful record in output_path are skipped. With
+    a cache, unchanged pages are revalidated over plain HTTP and served without rendering.
+    Returns a summary of the run.
+    """
+    skipped = 0
+    if resume:
+        completed = load_completed_urls(output_path)
+        pending = [u for u in urls if u not in completed]
+        skipped = len(urls) - len(pending)
+    else:
+        pending = list(urls)
+
+    summary = {'total': len(urls), 'skipped': skipped, 'succeeded': 0, 'failed': 0, 'cached': 0}
+    started = time.monotonic()
+    cache_options = options_key(extraction_options)
+    fingerprints = {}
+    lookup = None
+
+    if cache is not None:
+        def lookup(url):
+            # Revalidated over plain HTTP inside the extraction stage, under the URL's host limit
+            cached_result, fingerprint = cache.lookup(url, cache_options, refresh)
+            if cached_result is None:
+                fingerprints[url] = fingerprint
+            return cached_result
+
+    def store(url, font_data):
+        if cache is not None:
+            cache.store_result(url, font_data, fingerprints.pop(url, None), cache_options)
+
+    with JsonlWriter(output_path, compact) as writer:
+        def write(record):
+            writer.write(record)
+            summary['failed' if record['error'] else 'succeeded'] += 1
+            if record.get('cached'):
+                summary['cached'] += 1
+            if on_result:
+                on_result(record)
+
+        summary['pipeline'] = await run_pipeline(
+            pending, write, api_key, model, concurrency, per_host_limit, ai_concurrency, queue_size,
+            requests_per_minute, tokens_per_minute, ai_cache, token_budget, verbose, pool_options,
+            lookup=lookup, on_extracted=store, ai_batch_size=ai_batch_size,
+            ai_batch_tokens=ai_batch_tokens, metrics=metrics, skip_ai_above=skip_ai_above, worker_pool=worker_pool,
+            **extraction_options
+        )
+
+    summary['elapsedSeconds'] = round(time.monotonic() - started, 2)
+    if ai_cache is not None:
+        summary['aiCache'] = ai_cache.stats()
+    if extraction_options.get('font_store') is not None:
+        summary['fontStore'] = extraction_options['font_store'].stats()
+    return summary
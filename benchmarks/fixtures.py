@@ -0,0 +1,327 @@
+from typing import Dict, List, Any, Optional, Tuple
+import os
+import struct
+import zlib
+
+# Families of the bundled fonts: (family, weight, file name, container, variable)
+BUNDLED_FONTS = [
+    ('Bench Sans', 400, 'bench-sans-400.woff', 'woff', False),
+    ('Bench Sans', 700, 'bench-sans-700.woff', 'woff', False),
+    ('Bench Serif', 400, 'bench-serif-400.ttf', 'ttf', False),
+    ('Bench Serif', 700, 'bench-serif-700.ttf', 'ttf', False),
+    ('Bench Mono', 400, 'bench-mono-400.woff', 'woff', False),
+    ('Bench Display', 900, 'bench-display-900.ttf', 'ttf', False),
+    ('Bench Flex', 400, 'bench-flex.ttf', 'ttf', True)
+]
+
+LARGE_DOM_NODES = 50000
+STYLESHEET_COUNT = 80
+FONT_FACE_FAMILIES = 20
+IFRAME_COUNT = 3
+LAZY_SECTIONS = 40
+COMPONENT_CARDS = 2000
+
+WORDS = ('typography rhythm measure kerning baseline glyph serif ligature contrast hierarchy '
+         'weight spacing leading tracking scale harmony legibility texture').split()
+
+
+def _checksum(data: bytes) -> int:
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+def _glyph(width: int) -> bytes:
+    """A simple glyph: one rectangular contour inside the advance width"""
+    x_min, x_max, y_max = 50, width - 50, 700
+    data = struct.pack('>hhhhh', 1, x_min, 0, x_max, y_max)
+    data += struct.pack('>HH', 3, 0) + bytes([0x01] * 4)
+    data += struct.pack('>hhhh', x_min, 0, x_max - x_min, 0)
+    data += struct.pack('>hhhh', 0, y_max, 0, -y_max)
+    return data + b'\0' * (-len(data) % 4)
+
+
+def _name_table(names: Dict[int, str]) -> bytes:
+    records, strings = b'', b''
+    for name_id in sorted(names):
+        encoded = names[name_id].encode('utf-16-be')
+        records += struct.pack('>HHHHHH', 3, 1, 0x409, name_id, len(encoded), len(strings))
+        strings += encoded
+    return struct.pack('>HHH', 0, len(names), 6 + len(records)) + records + strings
+
+
+def build_font(family: str, weight: int = 400, variable: bool = False) -> bytes:
+    """Builds a small valid TrueType font mapping printable ASCII to box glyphs
+
+    Glyph widths depend on the weight so different files differ in content. A variable font
+    gets an fvar table with a wght axis (without gvar deltas, so it renders as one instance).
+    """
+    first, last = 32, 126
+    widths = [600] + [0 if code == 32 else 400 + (code % 7) * 40 + weight // 10 for code in range(first, last + 1)]
+    widths[1] = 250
+    glyphs = [_glyph(widths[0])] + [b'' if code == 32 else _glyph(widths[code - first + 1]) for code in range(first, last + 1)]
+    num_glyphs = len(glyphs)
+
+    loca, glyf = [], b''
+    for glyph in glyphs:
+        loca.append(len(glyf))
+        glyf += glyph
+    loca.append(len(glyf))
+
+    seg_end, seg_start, seg_delta = [last, 0xFFFF], [first, 0xFFFF], [(1 - first) & 0xFFFF, 1]
+    cmap_sub = struct.pack('>HHHHHHH', 4, 32, 0, 4, 4, 1, 0)
+    cmap_sub += struct.pack('>HH', *seg_end) + b'\0\0' + struct.pack('>HH', *seg_start)
+    cmap_sub += struct.pack('>HH', *seg_delta) + struct.pack('>HH', 0, 0)
+    subfamily = 'Bold' if weight >= 700 else 'Regular'
+    names = {1: family, 2: subfamily, 3: f'{family} {weight}; bench', 4: f'{family} {subfamily}',
+             5: 'Version 1.000', 6: f"{family.replace(' ', '')}-{subfamily}"}
+
+    tables = {
+        'head': struct.pack('>IIIIHHqqhhhhHHhhh', 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0x000B, 1000, 0, 0,
+                            0, 0, max(widths), 700, 1 if weight >= 700 else 0, 8, 2, 1, 0),
+        'hhea': struct.pack('>IhhhHhhhhhhhhhhhH', 0x00010000, 800, -200, 0, max(widths), 0, 50, max(widths) - 50,
+                            1, 0, 0, 0, 0, 0, 0, 0, num_glyphs),
+        'maxp': struct.pack('>IHHHHHHHHHHHHHH', 0x00010000, num_glyphs, 4, 1, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0),
+        'OS/2': struct.pack('>HhHHH' + 'h' * 11 + '10sIIII4sHHHhhhHHIIhhHHH', 4, 500, weight, 5, 0,
+                            650, 700, 0, 140, 650, 700, 0, 480, 50, 250, 0, bytes(10), 1, 0, 0, 0, b'BNCH',
+                            0x20 if weight >= 700 else 0x40, first, last, 800, -200, 0, 800, 200, 1, 0,
+                            500, 700, 0, 32, 1),
+        'hmtx': b''.join(struct.pack('>Hh', width, 50 if width else 0) for width in widths),
+        'cmap': struct.pack('>HHHHI', 0, 1, 3, 1, 12) + cmap_sub,
+        'loca': struct.pack(f'>{len(loca)}I', *loca),
+        'glyf': glyf,
+        'post': struct.pack('>IIhhIIIII', 0x00030000, 0, -100, 50, 0, 0, 0, 0, 0)
+    }
+    if variable:
+        names[256] = 'Weight'
+        tables['fvar'] = struct.pack('>HHHHHHHH', 1, 0, 16, 2, 1, 20, 0, 8)
+        tables['fvar'] += struct.pack('>4siiiHH', b'wght', 100 << 16, 400 << 16, 900 << 16, 0, 256)
+    tables['name'] = _name_table(names)
+
+    tags = sorted(tables)
+    num_tables = len(tags)
+    power = 1
+    while power * 2 <= num_tables:
+        power *= 2
+    header = struct.pack('>IHHHH', 0x00010000, num_tables, power * 16, power.bit_length() - 1, num_tables * 16 - power * 16)
+    offset = len(header) + 16 * num_tables
+    directory, body = b'', b''
+    for tag in tags:
+        data = tables[tag]
+        directory += struct.pack('>4sIII', tag.encode('latin-1'), _checksum(data), offset + len(body), len(data))
+        body += data + b'\0' * (-len(data) % 4)
+    font = bytearray(header + directory + body)
+    head_offset = struct.unpack_from('>I', directory, 16 * tags.index('head') + 8)[0]
+    struct.pack_into('>I', font, head_offset + 8, (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+def to_woff(font: bytes) -> bytes:
+    """Wraps a TrueType font in WOFF 1.0, zlib-compressing each table"""
+    num_tables = struct.unpack_from('>H', font, 4)[0]
+    records = [struct.unpack_from('>4sIII', font, 12 + 16 * i) for i in range(num_tables)]
+    offset = 44 + 20 * num_tables
+    directory, body = b'', b''
+    for tag, checksum, table_offset, length in records:
+        table = font[table_offset:table_offset + length]
+        compressed = zlib.compress(table)
+        if len(compressed) >= length:
+            compressed = table
+        directory += struct.pack('>4sIIII', tag, offset + len(body), len(compressed), length, checksum)
+        body += compressed + b'\0' * (-len(compressed) % 4)
+    header = struct.pack('>4s4sIHHIHHIIIII', b'wOFF', font[0:4], offset + len(body), num_tables, 0, len(font),
+                         1, 0, 0, 0, 0, 0, 0)
+    return header + directory + body
+
+
+def _text(index: int, words: int = 12) -> str:
+    return ' '.join(WORDS[(index * 7 + i * 3) % len(WORDS)] for i in range(words)).capitalize() + '.'
+
+
+def _font_face_css(fonts: Optional[List[Tuple[str, int, str, str, bool]]] = None) -> str:
+    rules = []
+    for family, weight, file_name, container, variable in fonts or BUNDLED_FONTS:
+        font_format = {'woff': 'woff', 'ttf': 'truetype'}[container]
+        weight_range = '100 900' if variable else str(weight)
+        rules.append(f"@font-face {{ font-family: '{family}'; src: url('/fonts/{file_name}') format('{font_format}'); "
+                     f"font-weight: {weight_range}; font-display: swap; }}")
+    return '\n'.join(rules)
+
+
+BASE_CSS = """
+body { font-family: 'Bench Sans', sans-serif; font-size: 16px; line-height: 1.5; margin: 0 auto; max-width: 960px; }
+h1 { font-family: 'Bench Serif', serif; font-size: 40px; font-weight: 700; }
+h2 { font-family: 'Bench Serif', serif; font-size: 28px; font-weight: 700; }
+h3 { font-size: 20px; font-weight: 700; }
+code, pre { font-family: 'Bench Mono', monospace; font-size: 14px; }
+.lead { font-family: 'Bench Flex', sans-serif; font-size: 20px; font-variation-settings: 'wght' 450; }
+.display { font-family: 'Bench Display', serif; font-size: 48px; font-weight: 900; }
+"""
+
+
+def _page(title: str, body: str, head: str = '') -> str:
+    return (f'<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>{title}</title>\n'
+            f'<link rel="stylesheet" href="/css/base.css">\n{head}</head>\n<body>\n{body}\n</body></html>\n')
+
+
+def _article(index: int) -> str:
+    return (f'<article><h2>{_text(index, 4)}</h2><p class="lead">{_text(index + 1, 20)}</p>'
+            f'<p>{_text(index + 2, 40)} <em>{_text(index + 3, 3)}</em> <strong>{_text(index + 4, 2)}</strong></p>'
+            f'<pre><code>{_text(index + 5, 6)}</code></pre></article>')
+
+
+def _small() -> Dict[str, str]:
+    body = '<header><h1>Small page</h1></header>\n' + '\n'.join(_article(i) for i in range(5))
+    return {'small.html': _page('Small page', body)}
+
+
+def _large_dom() -> Dict[str, str]:
+    # Each block is 10 elements; together with the page chrome this reaches LARGE_DOM_NODES
+    blocks = []
+    for i in range(LARGE_DOM_NODES // 10):
+        blocks.append(f'<div class="card"><h3>{_text(i, 3)}</h3><p>{_text(i, 8)} <span>{_text(i + 1, 2)}</span> '
+                      f'<em>{_text(i + 2, 2)}</em> <a href="#{i}">{_text(i + 3, 1)}</a></p>'
+                      f'<ul><li>{_text(i + 4, 2)}</li><li><code>{_text(i + 5, 1)}</code></li></ul></div>')
+    body = '<h1>Large DOM</h1>\n<main>\n' + '\n'.join(blocks) + '\n</main>'
+    return {'large-dom.html': _page('Large DOM', body)}
+
+
+def _many_stylesheets() -> Dict[str, str]:
+    files = {}
+    links = []
+    for i in range(STYLESHEET_COUNT):
+        rules = [f'.s{i}-{j} {{ font-family: "Bench {("Sans", "Serif", "Mono")[j % 3]}", sans-serif; '
+                 f'font-size: {12 + j % 12}px; letter-spacing: {j % 3 * 0.01:.2f}em; }}' for j in range(25)]
+        if i % 10 == 0:
+            rules.append(_font_face_css(BUNDLED_FONTS[i // 10 % len(BUNDLED_FONTS):][:1]))
+        files[f'css/sheet-{i:02d}.css'] = '\n'.join(rules) + '\n'
+        links.append(f'<link rel="stylesheet" href="/css/sheet-{i:02d}.css">')
+    body = '<h1>Many stylesheets</h1>\n' + '\n'.join(
+        f'<p class="s{i % STYLESHEET_COUNT}-{i % 25}">{_text(i, 15)}</p>' for i in range(200))
+    files['many-stylesheets.html'] = _page('Many stylesheets', body, '\n'.join(links))
+    return files
+
+
+def _many_font_faces() -> Dict[str, str]:
+    ranges = ['U+0000-00FF', 'U+0100-024F', 'U+0370-03FF', 'U+0400-04FF']
+    rules = []
+    for f in range(FONT_FACE_FAMILIES):
+        for weight in (300, 400, 500, 700, 900):
+            for r, unicode_range in enumerate(ranges):
+                file_name = BUNDLED_FONTS[(f + weight // 100 + r) % len(BUNDLED_FONTS)][2]
+                rules.append(f"@font-face {{ font-family: 'Face {f:02d}'; font-weight: {weight}; "
+                             f"src: url('/fonts/{file_name}'); unicode-range: {unicode_range}; }}")
+    rules += [f".f{f} {{ font-family: 'Face {f:02d}', sans-serif; }}" for f in range(FONT_FACE_FAMILIES)]
+    body = '<h1>Many @font-face rules</h1>\n' + '\n'.join(
+        f'<p class="f{i % 4}" style="font-weight: {(300, 400, 700)[i % 3]}">{_text(i, 15)}</p>' for i in range(60))
+    return {
+        'css/font-faces.css': '\n'.join(rules) + '\n',
+        'many-font-faces.html': _page('Many @font-face rules', body, '<link rel="stylesheet" href="/css/font-faces.css">')
+    }
+
+
+def _iframes() -> Dict[str, str]:
+    files = {}
+    frames = []
+    for i in range(IFRAME_COUNT):
+        inner = _page(f'Inner frame {i}', f'<h2>Inner {i}</h2><pre><code>{_text(i, 10)}</code></pre><p>{_text(i, 30)}</p>')
+        files[f'frames/inner-{i}.html'] = inner
+        outer = _page(f'Frame {i}', f'<h1 class="display">Frame {i}</h1>' + _article(i) +
+                      f'<iframe src="/frames/inner-{i}.html" width="600" height="300"></iframe>')
+        files[f'frames/frame-{i}.html'] = outer
+        frames.append(f'<iframe src="/frames/frame-{i}.html" width="900" height="600"></iframe>')
+    body = '<h1>Nested iframes</h1>\n' + _article(0) + '\n' + '\n'.join(frames)
+    files['iframes.html'] = _page('Nested iframes', body)
+    return files
+
+
+UTILITY_CSS = """
+.flex { display: flex; } .grid { display: grid; grid-template-columns: repeat(3, 1fr); } .gap-4 { gap: 16px; }
+.p-4 { padding: 16px; } .rounded { border-radius: 8px; } .shadow { box-shadow: 0 1px 3px rgba(0, 0, 0, .2); }
+.font-sans { font-family: 'Bench Sans', sans-serif; } .font-serif { font-family: 'Bench Serif', serif; }
+.font-mono { font-family: 'Bench Mono', monospace; }
+.text-sm { font-size: 14px; line-height: 20px; } .text-base { font-size: 16px; line-height: 24px; }
+.text-xl { font-size: 20px; line-height: 28px; } .font-bold { font-weight: 700; } .italic { font-style: italic; }
+.uppercase { text-transform: uppercase; } .tracking-wide { letter-spacing: .025em; }
+.text-gray { color: #4b5563; } .text-blue { color: #1d4ed8; }
+.font-sans > p:last-child { font-size: 15px; } [data-size="lg"] { font-size: 18px; } :lang(fr) { font-style: italic; }
+"""
+
+
+def _components() -> Dict[str, str]:
+    # Utility-class cards repeated as a component library renders them; some styles also depend
+    # on child position and attributes, which style sharing has to tell apart
+    cards = []
+    for i in range(COMPONENT_CARDS):
+        lang = ' lang="fr"' if i % 5 == 0 else ''
+        size = ' data-size="lg"' if i % 3 == 0 else ''
+        footer = f'<p class="text-base text-gray">{_text(i + 5, 6)}</p>' if i % 2 == 0 else ''
+        cards.append(f'<div class="flex p-4 rounded shadow"{lang}><div class="font-sans">'
+                     f'<h3 class="font-serif text-xl font-bold">{_text(i, 3)}</h3>'
+                     f'<p class="text-base text-gray">{_text(i + 1, 14)}</p>'
+                     f'<span class="text-sm uppercase tracking-wide text-blue"{size}>{_text(i + 2, 2)}</span> '
+                     f'<code class="font-mono text-sm">{_text(i + 3, 1)}</code> '
+                     f'<em class="italic text-sm">{_text(i + 4, 2)}</em>{footer}</div></div>')
+    body = '<h1>Components</h1>\n<main class="grid gap-4">\n' + '\n'.join(cards) + '\n</main>'
+    return {'components.html': _page('Components', body, f'<style>{UTILITY_CSS}</style>')}
+
+
+LAZY_SCRIPT = """
+<script>
+  // Sections are filled in only when scrolled into view; the display face is first needed there
+  const observer = new IntersectionObserver(entries => entries.forEach(entry => {
+    if (!entry.isIntersecting || entry.target.dataset.loaded) return;
+    entry.target.dataset.loaded = '1';
+    const i = Number(entry.target.dataset.index);
+    setTimeout(() => {
+      entry.target.innerHTML = `<h2 class="display">Section ${i}</h2>` + entry.target.dataset.text;
+    }, 50);
+  }), { rootMargin: '200px' });
+  document.querySelectorAll('.lazy').forEach(section => observer.observe(section));
+</script>
+"""
+
+
+def _lazy() -> Dict[str, str]:
+    sections = [f'<section class="lazy" data-index="{i}" style="min-height: 900px" '
+                f'data-text="&lt;p class=&quot;lead&quot;&gt;{_text(i, 30)}&lt;/p&gt;"></section>'
+                for i in range(LAZY_SECTIONS)]
+    body = '<h1>Lazy-loaded content</h1>\n' + _article(0) + '\n' + '\n'.join(sections) + LAZY_SCRIPT
+    return {'lazy.html': _page('Lazy-loaded content', body)}
+
+
+# Fixture page -> (builder, description); every builder returns relative path -> file contents
+FIXTURES = {
+    'small': (_small, 'A handful of articles in four families'),
+    'large-dom': (_large_dom, f'About {LARGE_DOM_NODES:,} DOM nodes'),
+    'many-stylesheets': (_many_stylesheets, f'{STYLESHEET_COUNT} linked stylesheets'),
+    'many-font-faces': (_many_font_faces, f'{FONT_FACE_FAMILIES * 20} @font-face rules with unicode-range subsets'),
+    'iframes': (_iframes, f'{IFRAME_COUNT} same-origin iframes, each with a nested iframe'),
+    'lazy': (_lazy, f'{LAZY_SECTIONS} sections filled in on scroll'),
+    'components': (_components, f'{COMPONENT_CARDS} utility-class cards, as component libraries render them')
+}
+
+
+def build_corpus(directory: str) -> Dict[str, Any]:
+    """Writes the fixture pages, stylesheets and bundled fonts into directory
+
+    Returns {fixture name: {'path', 'description'}}. The output only depends on the code, so
+    two versions of the analyzer are always benchmarked against identical pages.
+    """
+    files = {'css/base.css': _font_face_css() + '\n' + BASE_CSS}
+    corpus = {}
+    for name, (builder, description) in FIXTURES.items():
+        files.update(builder())
+        corpus[name] = {'path': f'{name}.html', 'description': description}
+
+    for path, content in files.items():
+        full_path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    os.makedirs(os.path.join(directory, 'fonts'), exist_ok=True)
+    for family, weight, file_name, container, variable in BUNDLED_FONTS:
+        font = build_font(family, weight, variable)
+        with open(os.path.join(directory, 'fonts', file_name), 'wb') as f:
+            f.write(to_woff(font) if container == 'woff' else font)
+    return corpus
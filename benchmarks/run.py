@@ -0,0 +1,330 @@
+"""Reproducible benchmark of the analyzer against local fixture pages and a mock OpenAI endpoint
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --output new.json --compare results.json
+"""
+from typing import Dict, List, Any, Optional
+from contextlib import redirect_stdout
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import click
+from async_extractor import analyze_fonts_concurrent
+from browser_pool import BrowserPool, _process_tree_rss_mb
+from font_extractor import analyze_fonts
+from profiling import Profiler
+import output_formatter
+from benchmarks.fixtures import FIXTURES, build_corpus
+from benchmarks.server import serve
+
+MOCK_API_KEY = 'sk-benchmark'
+
+
+class RssSampler:
+    """Samples the resident memory of this process and of its child processes (the browsers)"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_tree_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_tree_mb = max(self.peak_tree_mb, _process_tree_rss_mb(os.getpid()) or 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def result(self) -> Dict[str, float]:
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return {'pythonMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+                'childrenMb': round(self.peak_tree_mb, 1)}
+
+
+def _latency(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        'runs': len(values),
+        'meanMs': round(sum(values) / len(values), 1),
+        'p50Ms': round(values[len(values) // 2], 1),
+        'p95Ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        'minMs': round(values[0], 1)
+    }
+
+
+def _version() -> Dict[str, Optional[str]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit or None, 'dirty': dirty}
+
+
+def bench_extraction(urls: Dict[str, str], repeats: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Sequential analyze_fonts runs per fixture: latency plus the profiler's phase breakdown"""
+    results = {}
+    with BrowserPool() as pool:
+        # Warm-up: browser launch and first-page costs are not charged to the first fixture
+        analyze_fonts(next(iter(urls.values())), pool=pool, **options)
+        for name, url in urls.items():
+            profiler = Profiler()
+            pool.profiler = profiler
+            durations = []
+            font_data = None
+            for _ in range(repeats):
+                started = time.perf_counter()
+                font_data = analyze_fonts(url, pool=pool, profiler=profiler, **options)
+                durations.append((time.perf_counter() - started) * 1000)
+            pool.profiler = None
+            summary = profiler.summary()
+            results[name] = {
+                'latency': _latency(durations),
+                'phases': {phase: {'meanMs': stats['meanMs'], 'p95Ms': stats['p95Ms']}
+                           for phase, stats in summary['phases'].items()},
+                'counters': {counter: stats['mean'] for counter, stats in summary['counters'].items()},
+                'fonts': len(font_data.get('fonts', [])),
+                'fontFaces': len(font_data.get('fontFaces', []))
+            }
+            click.echo(f"  {name:<18} {results[name]['latency']['meanMs']:>8.1f} ms mean", err=True)
+    return results
+
+
+def bench_style_sharing(urls: Dict[str, str], repeats: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """In-page evaluate time with and without style_sharing per fixture, and whether the fonts match"""
+    results = {}
+    with BrowserPool() as pool:
+        analyze_fonts(next(iter(urls.values())), pool=pool, **options)
+        for name, url in urls.items():
+            runs = {}
+            for sharing in (False, True):
+                profiler = Profiler()
+                for _ in range(repeats):
+                    font_data = analyze_fonts(url, pool=pool, profiler=profiler, style_sharing=sharing, **options)
+                summary = profiler.summary()
+                runs[sharing] = {'evaluateMs': summary['phases']['evaluate']['meanMs'], 'fonts': font_data['fonts'],
+                                 'counters': summary['counters']}
+            plain, shared = runs[False], runs[True]
+            results[name] = {
+                'evaluateMeanMs': plain['evaluateMs'],
+                'sharedEvaluateMeanMs': shared['evaluateMs'],
+                'speedup': round(plain['evaluateMs'] / shared['evaluateMs'], 2) if shared['evaluateMs'] else None,
+                'styledElements': plain['counters'].get('styledElements', {}).get('mean'),
+                'sharedStyledElements': shared['counters'].get('styledElements', {}).get('mean'),
+                'sameOutput': plain['fonts'] == shared['fonts']
+            }
+            click.echo(f"  {name:<18} {plain['evaluateMs']:>8.1f} -> {shared['evaluateMs']:>8.1f} ms evaluate"
+                       f"{'' if results[name]['sameOutput'] else '  OUTPUT DIFFERS'}", err=True)
+    return results
+
+
+def bench_throughput(urls: List[str], levels: List[int], pages: int, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pages/sec of analyze_fonts_concurrent over the whole corpus at each concurrency level"""
+    results = []
+    for concurrency in levels:
+        work = [urls[i % len(urls)] for i in range(pages)]
+
+        async def run():
+            errors = 0
+            async for _, _, error in analyze_fonts_concurrent(work, concurrency=concurrency,
+                                                              per_host_limit=concurrency, **options):
+                errors += error is not None
+            return errors
+
+        started = time.perf_counter()
+        errors = asyncio.run(run())
+        seconds = time.perf_counter() - started
+        results.append({'concurrency': concurrency, 'pages': pages, 'errors': errors, 'seconds': round(seconds, 2),
+                        'pagesPerSecond': round(pages / seconds, 2)})
+        click.echo(f"  concurrency {concurrency:<3} {pages / seconds:>7.2f} pages/s", err=True)
+    return results
+
+
+def bench_ai(font_datas: Dict[str, Dict[str, Any]], repeats: int, batch_size: int) -> Dict[str, Any]:
+    """get_ai_analysis per fixture and get_ai_analyses over all of them, against the mock endpoint"""
+    from ai_analyzer import get_ai_analysis
+    from ai_batch import get_ai_analyses
+
+    single = Profiler()
+    durations = []
+    for _ in range(repeats):
+        for font_data in font_datas.values():
+            started = time.perf_counter()
+            get_ai_analysis(font_data, MOCK_API_KEY, cache=None, max_retries=0, profiler=single)
+            durations.append((time.perf_counter() - started) * 1000)
+
+    batched = Profiler()
+    started = time.perf_counter()
+    results = get_ai_analyses(list(font_datas.values()), MOCK_API_KEY, cache=None, batch_size=batch_size,
+                              max_retries=0, profiler=batched)
+    batch_ms = (time.perf_counter() - started) * 1000
+    single_summary, batched_summary = single.summary(), batched.summary()
+    return {
+        'single': {'latency': _latency(durations),
+                   'phases': {phase: stats['meanMs'] for phase, stats in single_summary['phases'].items()},
+                   'promptTokens': single_summary['counters'].get('promptTokens', {}).get('mean')},
+        'batch': {'sites': len(results), 'batchSize': batch_size, 'totalMs': round(batch_ms, 1),
+                  'apiCalls': batched_summary['phases'].get('ai.api', {}).get('count', 0),
+                  'errors': sum(1 for _, error in results if error)}
+    }
+
+
+def bench_formatting(font_datas: Dict[str, Dict[str, Any]], repeats: int) -> Dict[str, Any]:
+    """format_output in text and JSON mode, with the output discarded"""
+    console_file = output_formatter.console.file
+    results = {}
+    try:
+        for mode, json_output in (('text', False), ('json', True)):
+            durations = []
+            for _ in range(repeats):
+                for font_data in font_datas.values():
+                    sink = io.StringIO()
+                    output_formatter.console.file = sink
+                    started = time.perf_counter()
+                    with redirect_stdout(sink):
+                        output_formatter.format_output(font_data, None, json_output=json_output)
+                    durations.append((time.perf_counter() - started) * 1000)
+            results[mode] = _latency(durations)
+    finally:
+        output_formatter.console.file = console_file
+    return results
+
+
+def _numbers(value: Any, prefix: str = '') -> Dict[str, float]:
+    """Flattens nested dicts (and throughput rows keyed by concurrency) into path -> number"""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(_numbers(item, f'{prefix}.{key}' if prefix else key))
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict) and 'concurrency' in item:
+                flat.update(_numbers(item, f"{prefix}[c={item['concurrency']}]"))
+    return flat
+
+
+# Metrics where a higher number is better; everything else timed or sized is better lower
+HIGHER_IS_BETTER = ('pagesPerSecond',)
+COMPARED_SUFFIXES = ('meanMs', 'p95Ms', 'totalMs', 'pagesPerSecond', 'pythonMb', 'childrenMb')
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[str]:
+    """Lines describing metrics that moved by more than threshold (relative) between two reports"""
+    old, new = _numbers(baseline), _numbers(current)
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(COMPARED_SUFFIXES) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        if abs(change) < threshold:
+            continue
+        better = (change > 0) == key.endswith(HIGHER_IS_BETTER)
+        lines.append(f"{'better' if better else 'WORSE ':<6} {change:+7.1%}  {key}: {old[key]} -> {new[key]}")
+    return lines
+
+
+@click.command()
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report to this file')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False),
+              help='Report from a previous run to compare against')
+@click.option('--threshold', default=0.1, show_default=True, help='Relative change reported by --compare')
+@click.option('--repeats', default=3, show_default=True, help='Runs per fixture for latency figures')
+@click.option('--concurrency', default='1,2,4,8', show_default=True, help='Comma-separated concurrency levels')
+@click.option('--pages', default=24, show_default=True, help='Pages per concurrency level')
+@click.option('--fixtures', 'fixture_names', help=f"Comma-separated subset of: {', '.join(FIXTURES)}")
+@click.option('--parse-fonts', is_flag=True, help='Also parse the downloaded font files')
+@click.option('--style-sharing', is_flag=True, help='Also compare extraction with and without style sharing')
+@click.option('--ai/--no-ai', default=True, show_default=True, help='Benchmark the AI step against the mock endpoint')
+@click.option('--mock-latency-ms', default=200.0, show_default=True, help='Simulated model latency per request')
+@click.option('--batch-size', default=4, show_default=True, help='Sites per batched AI request')
+def main(output, baseline_path, threshold, repeats, concurrency, pages, fixture_names, parse_fonts, style_sharing, ai,
+         mock_latency_ms, batch_size):
+    """Runs the benchmark suite and prints (or writes) the JSON report"""
+    names = fixture_names.split(',') if fixture_names else list(FIXTURES)
+    unknown = [name for name in names if name not in FIXTURES]
+    if unknown:
+        raise click.BadParameter(f"unknown fixture(s): {', '.join(unknown)}", param_hint='--fixtures')
+    levels = [int(level) for level in concurrency.split(',')]
+    options = {'parse_fonts': parse_fonts}
+
+    with tempfile.TemporaryDirectory() as directory, RssSampler() as sampler:
+        corpus = build_corpus(directory)
+        with serve(directory, mock_latency_ms) as base_url:
+            os.environ['OPENAI_BASE_URL'] = f'{base_url}/v1'
+            urls = {name: f"{base_url}/{corpus[name]['path']}" for name in names}
+
+            click.echo('Extraction latency', err=True)
+            extraction = bench_extraction(urls, repeats, options)
+            sharing = None
+            if style_sharing:
+                click.echo('Style sharing', err=True)
+                sharing = bench_style_sharing(urls, repeats, options)
+            click.echo('Throughput', err=True)
+            throughput = bench_throughput([urls[name] for name in names], levels, pages, options)
+
+            font_datas = {name: analyze_fonts(urls[name], **options) for name in names}
+            click.echo('Formatting', err=True)
+            formatting = bench_formatting(font_datas, repeats)
+            ai_results = None
+            if ai:
+                click.echo('AI (mock endpoint)', err=True)
+                ai_results = bench_ai(font_datas, repeats, batch_size)
+
+    report = {
+        'version': _version(),
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'config': {'fixtures': names, 'repeats': repeats, 'concurrency': levels, 'pages': pages,
+                   'parseFonts': parse_fonts, 'mockLatencyMs': mock_latency_ms if ai else None,
+                   'batchSize': batch_size if ai else None},
+        'fixtures': {name: FIXTURES[name][1] for name in names},
+        'extraction': extraction,
+        'styleSharing': sharing,
+        'throughput': throughput,
+        'formatting': formatting,
+        'ai': ai_results,
+        'peakRss': sampler.result()
+    }
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        click.echo(f'Report written to {output}', err=True)
+    else:
+        click.echo(text)
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines = compare(baseline, report, threshold)
+        click.echo(f"\nCompared with {baseline_path} ({baseline.get('version', {}).get('commit') or 'unknown version'}):",
+                   err=True)
+        for line in lines or [f'no metric moved by more than {threshold:.0%}']:
+            click.echo(f'  {line}', err=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+from typing import Dict, Any
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+
+SITE_HEADER_REGEX = re.compile(r'^=== Site (\S+): .* ===$', re.MULTILINE)
+
+# A canned analysis shaped like a real model answer, so formatting and caching see realistic data
+MOCK_ANALYSIS = {
+    'analysis': {
+        'overallAssessment': 'Consistent type system with a clear hierarchy.',
+        'strengths': ['Limited set of families', 'Readable body size'],
+        'weaknesses': ['Several unused @font-face rules'],
+        'readability': 'Good',
+        'hierarchy': 'Clear'
+    },
+    'fontPairings': [{'primary': 'Bench Serif', 'secondary': 'Bench Sans', 'rating': 8,
+                      'reasoning': 'Serif headings contrast well with sans-serif body text.'}],
+    'recommendations': [{'category': 'Performance', 'priority': 'high', 'suggestion': 'Serve WOFF2',
+                         'implementation': 'Convert the TTF files and update the src descriptors.'}],
+    'issues': [{'type': 'performance', 'severity': 'medium', 'description': 'TTF files served',
+                'solution': 'Use WOFF2.'}]
+}
+
+
+class FixtureRequestHandler(SimpleHTTPRequestHandler):
+    """Serves the fixture corpus and answers POST /v1/chat/completions like the OpenAI API"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        if self.command == 'GET':
+            self.send_header('Cache-Control', 'public, max-age=31536000' if '/fonts/' in self.path else 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+        super().end_headers()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.server.mock_latency_ms / 1000)
+        body = json.dumps(mock_completion(request)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def mock_completion(request: Dict[str, Any]) -> Dict[str, Any]:
+    """A chat.completion answering a single-site or batched ('=== Site <id>: ...') analysis prompt"""
+    prompt = '\n'.join(m.get('content', '') for m in request.get('messages', []) if m.get('role') == 'user')
+    site_ids = SITE_HEADER_REGEX.findall(prompt)
+    answer = {'sites': {site_id: MOCK_ANALYSIS for site_id in site_ids}} if site_ids else MOCK_ANALYSIS
+    content = json.dumps(answer)
+    # Rough token counts; the analyzer only reports them
+    prompt_tokens = len(json.dumps(request.get('messages', []))) // 4
+    return {
+        'id': 'chatcmpl-bench',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'bench'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                  'total_tokens': prompt_tokens + len(content) // 4}
+    }
+
+
+@contextmanager
+def serve(directory: str, mock_latency_ms: float = 0, port: int = 0):
+    """Serves directory on 127.0.0.1 in a background thread; yields the base URL (no trailing slash)
+
+    The same server is the mock OpenAI endpoint: point the client at it with
+    OPENAI_BASE_URL=<base URL>/v1.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), partial(FixtureRequestHandler, directory=directory))
+    server.daemon_threads = True
+    server.mock_latency_ms = mock_latency_ms
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,364 @@
+from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Iterator, AsyncIterator
+import asyncio
+import os
+import time
+from profiling import Profiler, phase
+
+DEFAULT_VIEWPORT = {"width": 1920, "height": 1080}
+
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """Returns the combined resident memory (MB) of every descendant of root_pid, or None if /proc is unavailable"""
+    if not os.path.isdir('/proc'):
+        return None
+
+    children = {}
+    rss_pages = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read().decode(errors='replace')
+            with open(f'/proc/{entry}/statm', 'rb') as f:
+                statm = f.read().split()
+        except OSError:
+            # Process exited while we were scanning
+            continue
+        # The command name is wrapped in parentheses and may contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        ppid = int(fields[1])
+        children.setdefault(ppid, []).append(int(entry))
+        rss_pages[int(entry)] = int(statm[1])
+
+    total_pages = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total_pages += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+
+    return total_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class BrowserPool:
+    """Long-lived headless Chromium that hands out a fresh, isolated browser context per page.
+
+    The browser is started once and recycled after `max_pages_per_browser` pages or once the
+    browser processes grow past `max_memory_mb`; the old browser is closed right away and the
+    replacement is launched on the next page(), so a pool about to close never launches one.
+    Playwright's sync API is bound to the thread that started it, so use one pool per worker
+    thread/process.
+    """
+
+    def __init__(self, max_pages_per_browser: int = 100, max_memory_mb: Optional[float] = None,
+                 headless: bool = True, viewport: Optional[Dict[str, int]] = None,
+                 launch_options: Optional[Dict[str, Any]] = None, profiler: Optional[Profiler] = None):
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+        self.viewport = viewport or DEFAULT_VIEWPORT
+        self.launch_options = launch_options or {}
+        # Receives browser.launch, context.open, page.open and page.close timings
+        self.profiler = profiler
+
+        self._playwright_cm = None
+        self._playwright = None
+        self._browser = None
+        self._browser_pages = 0
+        self._browser_started_at = None
+        self._started_at = None
+        self._stats = {
+            'browsersLaunched': 0,
+            'pagesServed': 0,
+            'pagesFailed': 0,
+            'recycledForPageLimit': 0,
+            'recycledForMemory': 0,
+            'recycledForCrash': 0,
+            'activeContexts': 0,
+            'lastMemoryMb': None,
+            'peakMemoryMb': None
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """Starts Playwright and launches the first browser"""
+        if self._playwright is None:
+            self._playwright_cm = sync_playwright()
+            self._playwright = self._playwright_cm.__enter__()
+            self._started_at = time.monotonic()
+        if self._browser is None:
+            self._launch()
+
+    def close(self):
+        """Closes the browser and stops Playwright"""
+        self._close_browser()
+        if self._playwright_cm is not None:
+            self._playwright_cm.__exit__(None, None, None)
+        self._playwright_cm = None
+        self._playwright = None
+
+    def _launch(self):
+        with phase(self.profiler, 'browser.launch'):
+            self._browser = self._playwright.chromium.launch(headless=self.headless, **self.launch_options)
+        self._browser_pages = 0
+        self._browser_started_at = time.monotonic()
+        self._stats['browsersLaunched'] += 1
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                # Browser already gone (crashed or killed)
+                pass
+        self._browser = None
+
+    def _recycle(self, reason: str):
+        """Closes the browser now; the next page() launches its replacement"""
+        self._stats[reason] += 1
+        self._close_browser()
+        self._browser_pages = 0
+        self._browser_started_at = None
+
+    def _check_memory(self) -> bool:
+        """Samples browser memory and returns True if it is over the configured ceiling"""
+        memory_mb = _process_tree_rss_mb(os.getpid())
+        if memory_mb is None:
+            return False
+        self._stats['lastMemoryMb'] = round(memory_mb, 1)
+        if self._stats['peakMemoryMb'] is None or memory_mb > self._stats['peakMemoryMb']:
+            self._stats['peakMemoryMb'] = round(memory_mb, 1)
+        return self.max_memory_mb is not None and memory_mb > self.max_memory_mb
+
+    @contextmanager
+    def page(self) -> Iterator[Any]:
+        """Yields a page in a fresh browser context that is torn down afterwards"""
+        if self._browser is not None and not self._browser.is_connected():
+            self._recycle('recycledForCrash')
+        self.start()
+
+        with phase(self.profiler, 'context.open'):
+            context = self._browser.new_context(viewport=self.viewport)
+        self._stats['activeContexts'] += 1
+        failed = False
+        try:
+            with phase(self.profiler, 'page.open'):
+                page = context.new_page()
+            yield page
+        except Exception:
+            failed = True
+            raise
+        finally:
+            try:
+                with phase(self.profiler, 'page.close'):
+                    context.close()
+            except Exception:
+                # Context died with the browser; handled by the crash check below
+                pass
+            self._stats['activeContexts'] -= 1
+            self._stats['pagesServed'] += 1
+            if failed:
+                self._stats['pagesFailed'] += 1
+            self._browser_pages += 1
+
+            if not self._browser.is_connected():
+                self._recycle('recycledForCrash')
+            elif self._browser_pages >= self.max_pages_per_browser:
+                self._recycle('recycledForPageLimit')
+            elif self.max_memory_mb is not None and self._check_memory():
+                self._recycle('recycledForMemory')
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool statistics"""
+        now = time.monotonic()
+        stats = dict(self._stats)
+        stats['currentBrowserPages'] = self._browser_pages
+        stats['currentBrowserAgeSeconds'] = round(now - self._browser_started_at, 2) if self._browser_started_at else None
+        stats['uptimeSeconds'] = round(now - self._started_at, 2) if self._started_at else None
+        if stats['lastMemoryMb'] is None and self._browser is not None:
+            self._check_memory()
+            stats['lastMemoryMb'] = self._stats['lastMemoryMb']
+            stats['peakMemoryMb'] = self._stats['peakMemoryMb']
+        return stats
+
+
+class _AsyncBrowserSlot:
+    """A launched browser plus the bookkeeping needed to retire it once its pages finish"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = 0
+        self.active = 0
+        self.retiring = False
+        self.started_at = time.monotonic()
+
+
+class AsyncBrowserPool:
+    """asyncio counterpart of BrowserPool that serves many concurrent pages from one browser.
+
+    When the browser reaches its page or memory limit it is retired: new pages go to a freshly
+    launched browser while pages already running on the old one finish before it is closed.
+    """
+
+    def __init__(self, max_pages_per_browser: int = 100, max_memory_mb: Optional[float] = None,
+                 headless: bool = True, viewport: Optional[Dict[str, int]] = None,
+                 launch_options: Optional[Dict[str, Any]] = None, profiler: Optional[Profiler] = None):
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+        self.viewport = viewport or DEFAULT_VIEWPORT
+        self.launch_options = launch_options or {}
+        # Receives browser.launch, context.open, page.open and page.close timings
+        self.profiler = profiler
+
+        self._playwright_cm = None
+        self._playwright = None
+        self._current = None
+        self._retired = set()
+        self._lock = asyncio.Lock()
+        self._started_at = None
+        self._stats = {
+            'browsersLaunched': 0,
+            'pagesServed': 0,
+            'pagesFailed': 0,
+            'recycledForPageLimit': 0,
+            'recycledForMemory': 0,
+            'recycledForCrash': 0,
+            'activeContexts': 0,
+            'lastMemoryMb': None,
+            'peakMemoryMb': None
+        }
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Starts Playwright and launches the first browser"""
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright_cm = async_playwright()
+                self._playwright = await self._playwright_cm.__aenter__()
+                self._started_at = time.monotonic()
+            if self._current is None:
+                await self._launch()
+
+    async def close(self):
+        """Closes every browser and stops Playwright"""
+        slots = list(self._retired) + ([self._current] if self._current else [])
+        for slot in slots:
+            await self._close_slot(slot)
+        self._retired.clear()
+        self._current = None
+        if self._playwright_cm is not None:
+            await self._playwright_cm.__aexit__(None, None, None)
+        self._playwright_cm = None
+        self._playwright = None
+
+    async def _launch(self):
+        with phase(self.profiler, 'browser.launch'):
+            browser = await self._playwright.chromium.launch(headless=self.headless, **self.launch_options)
+        self._current = _AsyncBrowserSlot(browser)
+        self._stats['browsersLaunched'] += 1
+
+    async def _close_slot(self, slot: _AsyncBrowserSlot):
+        try:
+            await slot.browser.close()
+        except Exception:
+            # Browser already gone (crashed or killed)
+            pass
+
+    async def _retire_current(self, reason: str):
+        """Moves the current browser aside and launches a replacement; caller holds the lock"""
+        slot = self._current
+        self._stats[reason] += 1
+        slot.retiring = True
+        self._retired.add(slot)
+        await self._launch()
+        if slot.active == 0:
+            self._retired.discard(slot)
+            await self._close_slot(slot)
+
+    def _check_memory(self) -> bool:
+        memory_mb = _process_tree_rss_mb(os.getpid())
+        if memory_mb is None:
+            return False
+        self._stats['lastMemoryMb'] = round(memory_mb, 1)
+        if self._stats['peakMemoryMb'] is None or memory_mb > self._stats['peakMemoryMb']:
+            self._stats['peakMemoryMb'] = round(memory_mb, 1)
+        return self.max_memory_mb is not None and memory_mb > self.max_memory_mb
+
+    async def _acquire_slot(self) -> _AsyncBrowserSlot:
+        await self.start()
+        async with self._lock:
+            if not self._current.browser.is_connected():
+                await self._retire_current('recycledForCrash')
+            elif self._current.pages >= self.max_pages_per_browser:
+                await self._retire_current('recycledForPageLimit')
+            slot = self._current
+            slot.pages += 1
+            slot.active += 1
+            return slot
+
+    async def _release_slot(self, slot: _AsyncBrowserSlot):
+        async with self._lock:
+            slot.active -= 1
+            if slot.retiring and slot.active == 0 and slot in self._retired:
+                self._retired.discard(slot)
+                await self._close_slot(slot)
+            elif (slot is self._current and self.max_memory_mb is not None
+                  and await asyncio.get_running_loop().run_in_executor(None, self._check_memory)):
+                await self._retire_current('recycledForMemory')
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """Yields a page in a fresh browser context that is torn down afterwards"""
+        slot = await self._acquire_slot()
+        self._stats['activeContexts'] += 1
+        failed = False
+        try:
+            with phase(self.profiler, 'context.open'):
+                context = await slot.browser.new_context(viewport=self.viewport)
+            try:
+                with phase(self.profiler, 'page.open'):
+                    page = await context.new_page()
+                yield page
+            finally:
+                try:
+                    with phase(self.profiler, 'page.close'):
+                        await context.close()
+                except Exception:
+                    # Context died with the browser; handled on the next acquire
+                    pass
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._stats['activeContexts'] -= 1
+            self._stats['pagesServed'] += 1
+            if failed:
+                self._stats['pagesFailed'] += 1
+            await self._release_slot(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool statistics"""
+        now = time.monotonic()
+        stats = dict(self._stats)
+        stats['currentBrowserPages'] = self._current.pages if self._current else 0
+        stats['currentBrowserAgeSeconds'] = round(now - self._current.started_at, 2) if self._current else None
+        stats['retiringBrowsers'] = len(self._retired)
+        stats['uptimeSeconds'] = round(now - self._started_at, 2) if self._started_at else None
+        return stats
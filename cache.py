@@ -0,0 +1,297 @@
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.request import Request, urlopen
+from urllib.parse import urljoin
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'web-font-analyzer', 'cache.sqlite3')
+
+STYLESHEET_LINK_REGEX = re.compile(r'<link\b[^>]*\brel\s*=\s*["\']?[^"\'>]*stylesheet[^>]*>', re.IGNORECASE)
+HREF_REGEX = re.compile(r'\bhref\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+
+def _encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class SqliteCache:
+    """Compressed JSON values in a SQLite table with TTL and size-based LRU eviction.
+
+    Safe to share between threads; each namespace gets its own table in the same file.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, namespace: str = 'results',
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600, max_bytes: Optional[int] = 512 * 1024 * 1024):
+        if not re.match(r'^[a-z_]+$', namespace):
+            raise ValueError(f"Invalid cache namespace '{namespace}'")
+        self.path = path
+        self.table = f'cache_{namespace}'
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)')
+
+    def get(self, key: str, fingerprint: Optional[str] = None) -> Optional[Any]:
+        """Returns the cached value, or None when missing, expired or stored under another fingerprint"""
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT value, fingerprint, created_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            value, stored_fingerprint, created_at = row
+            if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+                self._db.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            if fingerprint is not None and stored_fingerprint != fingerprint:
+                self._stats['misses'] += 1
+                return None
+            self._db.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._stats['hits'] += 1
+        return _decode(value)
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored fingerprint and age of a key without counting a hit or miss"""
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT fingerprint, created_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'fingerprint': row[0], 'ageSeconds': time.time() - row[1]}
+
+    def record_miss(self):
+        """Counts a miss decided by the caller without touching the table"""
+        with self._lock:
+            self._stats['misses'] += 1
+
+    def touch(self, key: str):
+        """Restarts the TTL of an entry that was revalidated as unchanged"""
+        with self._lock:
+            now = time.time()
+            self._db.execute(f'UPDATE {self.table} SET created_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+
+    def put(self, key: str, value: Any, fingerprint: Optional[str] = None):
+        blob = _encode(value)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, fingerprint, value, size, created_at, accessed_at) '
+                f'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, fingerprint, blob, len(blob), now, now)
+            )
+            self._stats['stores'] += 1
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones until under max_bytes; caller holds the lock"""
+        if self.ttl_seconds is not None:
+            cursor = self._db.execute(f'DELETE FROM {self.table} WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+            self._stats['expired'] += cursor.rowcount
+        if self.max_bytes is None:
+            return
+        total = self._db.execute(f'SELECT COALESCE(SUM(size), 0) FROM {self.table}').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(f'SELECT key, size FROM {self.table} ORDER BY accessed_at').fetchall():
+            self._db.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            self._stats['evictions'] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._db.execute(f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}').fetchone()
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hitRate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['entries'] = entries
+        stats['bytes'] = total
+        return stats
+
+    def close(self):
+        self._db.close()
+
+
+def fetch_fingerprint(url: str, previous: Optional[Dict[str, Any]] = None, timeout: float = 15) -> Dict[str, Any]:
+    """Fetches the raw HTML of url and fingerprints it.
+
+    The fingerprint combines a hash of the HTML, the stylesheet URLs it links and the
+    ETag/Last-Modified validators. With a previous fingerprint the request is conditional,
+    and a 304 answer returns the previous fingerprint marked as not modified.
+    """
+    headers = {'User-Agent': 'Mozilla/5.0 (compatible; web-font-analyzer)'}
+    if previous:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('lastModified'):
+            headers['If-Modified-Since'] = previous['lastModified']
+
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+            html = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            final_url = response.geturl()
+    except Exception as e:
+        if previous and getattr(e, 'code', None) == 304:
+            return dict(previous, notModified=True)
+        raise
+
+    text = html.decode('utf-8', errors='replace')
+    stylesheets = []
+    for link in STYLESHEET_LINK_REGEX.findall(text):
+        match = HREF_REGEX.search(link)
+        if match:
+            stylesheets.append(urljoin(final_url, match.group(1)))
+
+    digest = hashlib.sha256()
+    digest.update(html)
+    for href in stylesheets:
+        digest.update(b'\0' + href.encode('utf-8'))
+
+    return {
+        'hash': digest.hexdigest(),
+        'etag': etag,
+        'lastModified': last_modified,
+        'stylesheets': stylesheets,
+        'notModified': False
+    }
+
+
+class ResultCache:
+    """Caches analyze_fonts results keyed by URL and validated against a page fingerprint.
+
+    A lookup revalidates cheaply with one plain HTTP request (conditional when validators are
+    known) instead of rendering the page. Pages whose HTML embeds per-request tokens never
+    match their fingerprint and simply fall through to a full render.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 max_bytes: Optional[int] = 512 * 1024 * 1024):
+        self.store = SqliteCache(path, 'results', ttl_seconds, max_bytes)
+
+    @staticmethod
+    def key(url: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Cache key for a URL plus the extraction options that change the result"""
+        if not options:
+            return url
+        return url + '#' + json.dumps(options, sort_keys=True, default=str)
+
+    def lookup(self, url: str, options: Optional[Dict[str, Any]] = None,
+               refresh: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Returns (cached result or None, current fingerprint or None)
+
+        With refresh the cached result is ignored but the fingerprint is still fetched so
+        the fresh result can be stored.
+        """
+        key = self.key(url, options)
+        entry = None if refresh else self.store.get_entry(key)
+        previous = json.loads(entry['fingerprint']) if entry and entry['fingerprint'] else None
+        try:
+            fingerprint = fetch_fingerprint(url, previous)
+        except Exception:
+            # Cannot revalidate; render the page
+            return None, None
+
+        unchanged = previous is not None and (fingerprint.get('notModified') or previous.get('hash') == fingerprint['hash'])
+        if not unchanged:
+            self.store.record_miss()
+            return None, fingerprint
+        result = self.store.get(key)
+        if result is not None:
+            # Revalidated as unchanged, so the entry is fresh again
+            self.store.touch(key)
+        return result, fingerprint
+
+    def store_result(self, url: str, result: Dict[str, Any], fingerprint: Optional[Dict[str, Any]],
+                     options: Optional[Dict[str, Any]] = None):
+        """Stores a freshly rendered result under the fingerprint returned by lookup"""
+        if fingerprint is None:
+            return
+        stored = {k: fingerprint.get(k) for k in ('hash', 'etag', 'lastModified')}
+        self.store.put(self.key(url, options), result, json.dumps(stored, sort_keys=True))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+    def close(self):
+        self.store.close()
+
+
+# analyze_fonts options that only observe or record a run and never change its result
+_OBSERVER_OPTIONS = {'profiler', 'font_store'}
+
+
+def options_key(extraction_options: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduces analyze_fonts keyword options to the plain values that change its result"""
+    key = {}
+    for name, value in sorted(extraction_options.items()):
+        if name in _OBSERVER_OPTIONS:
+            continue
+        if value is None or isinstance(value, (str, int, float, bool)):
+            key[name] = value
+        else:
+            key[name] = {k: sorted(v) if isinstance(v, set) else v
+                         for k, v in sorted(vars(value).items()) if not k.startswith('_') and k != 'byte_estimates'}
+    return key
+
+
+class ResponseCache:
+    """Caches parsed AI analyses keyed by a canonical hash of the model and request inputs"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 max_bytes: Optional[int] = 128 * 1024 * 1024):
+        self.store = SqliteCache(path, 'ai_responses', ttl_seconds, max_bytes)
+
+    @staticmethod
+    def key_for(model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        canonical = json.dumps({'model': model, 'messages': messages, 'temperature': temperature},
+                               sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(key)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        self.store.put(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,178 @@
+from typing import Dict, List, Any, Optional
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ['parquet', 'arrow']
+
+# Rows buffered per table before a chunk (a Parquet row group / Arrow record batch) is written
+DEFAULT_CHUNK_ROWS = 50000
+
+# Column name -> type name for each flattened table. 'dict' columns repeat a small set of
+# values (URLs, families, weights...) and are dictionary-encoded.
+TABLE_COLUMNS = {
+    'variations': {
+        'url': 'dict', 'family': 'dict', 'family_usage_count': 'int64', 'family_character_count': 'int64',
+        'font_size': 'dict', 'size_px': 'float64', 'weight': 'dict', 'style': 'dict',
+        'usage_count': 'int64', 'character_count': 'int64', 'line_height': 'dict', 'line_height_px': 'float64',
+        'letter_spacing': 'dict', 'letter_spacing_px': 'float64', 'text_transform': 'dict', 'color': 'dict',
+        'elements': 'list', 'sample_text': 'string'
+    },
+    'font_faces': {
+        'url': 'dict', 'family': 'dict', 'weight': 'dict', 'style': 'dict', 'stretch': 'dict', 'display': 'dict',
+        'unicode_range': 'string', 'src': 'string', 'variation_settings': 'dict'
+    },
+    'font_files': {
+        'url': 'dict', 'file_url': 'string', 'type': 'dict', 'status': 'int64'
+    }
+}
+
+
+def _arrow_type(name: str):
+    if name == 'dict':
+        return pa.dictionary(pa.int32(), pa.string())
+    if name == 'list':
+        return pa.list_(pa.string())
+    return getattr(pa, name)()
+
+
+def _schema(table: str):
+    return pa.schema([(column, _arrow_type(kind)) for column, kind in TABLE_COLUMNS[table].items()])
+
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def flatten_font_data(font_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Flattens one analyze_fonts result into rows for each table in TABLE_COLUMNS"""
+    url = font_data.get('url', '')
+    rows = {'variations': [], 'font_faces': [], 'font_files': []}
+
+    for font in font_data.get('fonts', []):
+        for v in font.get('variations', []):
+            rows['variations'].append({
+                'url': url,
+                'family': font.get('fontFamily', ''),
+                'family_usage_count': font.get('totalUsageCount', 0),
+                'family_character_count': font.get('totalCharacterCount'),
+                'font_size': v.get('fontSize'),
+                'size_px': _number(v.get('fontSizePx')),
+                'weight': str(v.get('fontWeight', '')),
+                'style': v.get('fontStyle'),
+                'usage_count': v.get('usageCount', 0),
+                'character_count': v.get('characterCount'),
+                'line_height': v.get('lineHeight'),
+                'line_height_px': _number(v.get('lineHeightValue')),
+                'letter_spacing': v.get('letterSpacing'),
+                'letter_spacing_px': _number(v.get('letterSpacingValue')),
+                'text_transform': v.get('textTransform'),
+                'color': v.get('color'),
+                'elements': list(v.get('elements', [])),
+                'sample_text': v.get('sampleText')
+            })
+
+    for face in font_data.get('fontFaces', []):
+        rows['font_faces'].append({
+            'url': url,
+            'family': face.get('fontFamily', '').strip('\'"'),
+            'weight': face.get('fontWeight'),
+            'style': face.get('fontStyle'),
+            'stretch': face.get('fontStretch'),
+            'display': face.get('fontDisplay'),
+            'unicode_range': face.get('unicodeRange'),
+            'src': face.get('src'),
+            'variation_settings': face.get('fontVariationSettings')
+        })
+
+    for font_file in font_data.get('fontFiles', []):
+        rows['font_files'].append({
+            'url': url,
+            'file_url': font_file.get('url'),
+            'type': font_file.get('type'),
+            'status': font_file.get('status')
+        })
+    return rows
+
+
+class ColumnarExporter:
+    """Appends flattened font data to one Parquet or Arrow file per table, in chunks.
+
+    Rows are buffered column-wise and written every chunk_rows rows, so memory stays bounded
+    during long batch runs. Each run writes its own part files, <table>-<run_id>.<ext>, into
+    directory, so a resumed batch adds to the tables of earlier runs instead of replacing
+    them; read a table as all of its parts. Arrow output uses the IPC stream format
+    (.arrows), which allows each chunk its own string dictionaries. Needs pyarrow.
+    """
+
+    def __init__(self, directory: str, format: str = 'parquet', chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 run_id: Optional[str] = None):
+        if pa is None:
+            raise Exception('Columnar export needs pyarrow: pip install pyarrow')
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.chunk_rows = chunk_rows
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.rows_written = {table: 0 for table in TABLE_COLUMNS}
+        self._buffers = {table: {column: [] for column in columns} for table, columns in TABLE_COLUMNS.items()}
+        self._writers = {}
+
+    def path_for(self, table: str) -> str:
+        extension = 'parquet' if self.format == 'parquet' else 'arrows'
+        return os.path.join(self.directory, f'{table}-{self.run_id}.{extension}')
+
+    def add(self, font_data: Dict[str, Any]):
+        for table, rows in flatten_font_data(font_data).items():
+            buffer = self._buffers[table]
+            for row in rows:
+                for column, values in buffer.items():
+                    values.append(row[column])
+            if len(buffer['url']) >= self.chunk_rows:
+                self._flush(table)
+
+    def _flush(self, table: str):
+        buffer = self._buffers[table]
+        if not buffer['url']:
+            return
+        schema = _schema(table)
+        batch = pa.RecordBatch.from_arrays([pa.array(buffer[field.name], type=field.type) for field in schema],
+                                           schema=schema)
+        writer = self._writers.get(table)
+        if writer is None:
+            if self.format == 'parquet':
+                writer = pq.ParquetWriter(self.path_for(table), schema, compression='zstd')
+            else:
+                writer = pa.ipc.new_stream(self.path_for(table), schema)
+            self._writers[table] = writer
+        if self.format == 'parquet':
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        self.rows_written[table] += batch.num_rows
+        for values in buffer.values():
+            values.clear()
+
+    def close(self):
+        """Writes the buffered rows and finalizes the files (the Parquet footer); safe to call twice"""
+        try:
+            for table in TABLE_COLUMNS:
+                self._flush(table)
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
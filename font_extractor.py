@@ -1,522 +1,957 @@
-from playwright.sync_api import sync_playwright
-from typing import Dict, List, Any
+from playwright.sync_api import Page
+from typing import Dict, List, Any, Iterator, Iterable, Optional, Tuple
+from browser_pool import BrowserPool
+from settle import SettlePolicy, settle_page
+from resource_blocking import ResourceBlocker
+from stylesheet_memo import StylesheetMemo
+from font_parser import analyze_font_binaries
+from font_store import FontStore
+from profiling import Profiler, phase
+from font_network import FontNetworkMonitor, FontBudget
+import asyncio
+import json
 import re
 
-def analyze_fonts(url: str, verbose: bool = False) -> Dict[str, Any]:
-    """Extracts comprehensive font information from a webpage using Chromium (Playwright)"""
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_viewport_size({"width": 1920, "height": 1080})
-        
-        # Track network requests for font files
-        font_files = []
-        
-        def handle_response(response):
-            content_type = response.headers.get('content-type', '').lower()
-            url_path = response.url.lower()
-            # Only track actual font files, not SVG images
-            if any(ext in url_path for ext in ['.woff', '.woff2', '.ttf', '.otf', '.eot']):
-                font_files.append({
-                    'url': response.url,
-                    'type': content_type or 'font',
-                    'status': response.status
-                })
-            elif ('font' in content_type and 'svg' not in content_type) or 'woff' in content_type or 'ttf' in content_type or 'opentype' in content_type:
-                font_files.append({
-                    'url': response.url,
-                    'type': content_type,
-                    'status': response.status
-                })
-        
-        page.on("response", handle_response)
-        
-        page.goto(url, wait_until="networkidle", timeout=60000)
-        
-        # Wait for fonts to actually load
-        page.wait_for_function("document.fonts && document.fonts.ready", timeout=10000)
-        
-        # Scroll to trigger lazy-loaded content
-        page.evaluate("""
-            () => {
-                window.scrollTo(0, document.body.scrollHeight);
-                return new Promise(resolve => setTimeout(resolve, 1000));
-            }
-        """)
-        
-        # Wait a bit more for any lazy-loaded fonts
-        page.wait_for_timeout(2000)
-        
-        # Extract font information using JavaScript
-        fonts_data = page.evaluate("""
-            () => {
-                const fontsByFamily = new Map();
-                const allElements = document.querySelectorAll('*');
-                
-                allElements.forEach(element => {
-                    const computedStyle = window.getComputedStyle(element);
-                    const fontFamily = computedStyle.fontFamily;
-                    const fontSize = computedStyle.fontSize;
-                    const fontWeight = computedStyle.fontWeight;
-                    const fontStyle = computedStyle.fontStyle;
-                    const lineHeight = computedStyle.lineHeight;
-                    const letterSpacing = computedStyle.letterSpacing;
-                    const textTransform = computedStyle.textTransform;
-                    const color = computedStyle.color;
-                    const tagName = element.tagName.toLowerCase();
-                    
-                    if (!element.textContent || element.textContent.trim().length === 0) {
-                        return;
-                    }
+# Usage collectors understood by PAGE_EXTRACTION_SCRIPT:
+#   elements  - every element whose subtree contains text counts once (the original behaviour)
+#   textnodes - only elements that directly own a text node count, and only those are styled
+COLLECTORS = ['elements', 'textnodes']
 
-                    const cleanFontFamily = fontFamily.split(',')[0].replace(/['"]/g, '').trim();
-                    
-                    if (!fontsByFamily.has(cleanFontFamily)) {
-                        fontsByFamily.set(cleanFontFamily, {
-                            fontFamily: cleanFontFamily,
-                            variations: new Map(),
-                            allElements: new Set(),
-                            totalUsageCount: 0
-                        });
-                    }
-                    
-                    const fontFamilyInfo = fontsByFamily.get(cleanFontFamily);
-                    fontFamilyInfo.allElements.add(tagName);
-                    fontFamilyInfo.totalUsageCount++;
-                    
-                    const variationKey = `${fontSize}|${fontWeight}|${fontStyle}`;
-                    
-                    if (!fontFamilyInfo.variations.has(variationKey)) {
-                        fontFamilyInfo.variations.set(variationKey, {
-                            fontSize: fontSize,
-                            fontSizePx: parseFloat(fontSize),
-                            fontWeight: fontWeight,
-                            fontStyle: fontStyle,
-                            lineHeight: lineHeight,
-                            lineHeightValue: lineHeight === 'normal' ? null : parseFloat(lineHeight),
-                            letterSpacing: letterSpacing,
-                            letterSpacingValue: letterSpacing === 'normal' ? 0 : parseFloat(letterSpacing),
-                            textTransform: textTransform,
-                            color: color,
-                            usageCount: 0,
-                            elements: [],
-                            sampleText: element.textContent.trim().substring(0, 100)
-                        });
-                    }
-                    
-                    const variation = fontFamilyInfo.variations.get(variationKey);
-                    variation.usageCount++;
-                    
-                    if (!variation.elements.includes(tagName)) {
-                        variation.elements.push(tagName);
+
+class SamplingBudget:
+    """Caps the usage collection of PAGE_EXTRACTION_SCRIPT on huge DOMs.
+
+    At most max_elements usage candidates are styled, and styling stops after max_ms. The
+    styled elements are a stratified random sample (by tag and <body> subtree), drawn with
+    `seed`, and usage and character counts are scaled up to estimates with a
+    usageCountStdError. result['sampling'] reports the coverage.
+    """
+
+    def __init__(self, max_elements: Optional[int] = None, max_ms: Optional[float] = None, seed: int = 1):
+        if not max_elements and not max_ms:
+            raise ValueError('A sampling budget needs max_elements or max_ms')
+        self.max_elements = max_elements
+        self.max_ms = max_ms
+        self.seed = seed
+
+    def script_options(self) -> Dict[str, Any]:
+        return {'maxElements': self.max_elements, 'maxMs': self.max_ms, 'seed': self.seed}
+
+
+# Extracts every section of the report in one evaluation: the stylesheets are walked once
+# and the DOM is walked once, with getComputedStyle called a single time per element.
+# options.collector picks how usage is counted (see COLLECTORS). options.knownSheets turns on
+# stylesheet memoization: linked sheets are keyed by href, rule count and the cssText lengths
+# of their first and last rules, inline sheets by a hash of their text, and only sheets whose
+# key is not listed are extracted (see stylesheet_memo.StylesheetMemo). The same script runs
+# in child frames (see frame_script_options). options.sample styles only a stratified sample
+# of the usage candidates and scales the counts up (see SamplingBudget).
+# options.styleSharing reuses resolved font properties between elements with the same style key.
+PAGE_EXTRACTION_SCRIPT = """
+    (options) => {
+        const collector = (options && options.collector) || 'elements';
+        const NON_RENDERED_TAGS = ['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'TITLE'];
+        const GENERIC_FAMILIES = ['inherit', 'initial', 'unset', 'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy'];
+        const fontFamilyRegex = /font-family\\s*:\\s*([^;]+)/gi;
+        const declaredFontFamilies = new Set();
+        // Stylesheets already extracted on an earlier page of the site (see StylesheetMemo)
+        const knownSheets = options && options.knownSheets ? new Set(options.knownSheets) : null;
+        // options.codepoints collects the distinct characters rendered in each family (see font_parser)
+        const collectCodepoints = !!(options && options.codepoints);
+        // options.usageOnly skips the stylesheet pass, for child frames whose fonts section is all that is merged
+        const usageOnly = !!(options && options.usageOnly);
+        const sample = options && options.sample ? options.sample : null;
+        const SUBTREE_BUCKETS = 8;
+        let styleSharing = !!(options && options.styleSharing);
+        // The properties recordUsage reads, copied out of a live CSSStyleDeclaration when shared
+        const SHARED_STYLE_PROPERTIES = ['fontFamily', 'fontSize', 'fontWeight', 'fontStyle', 'lineHeight',
+                                         'letterSpacing', 'textTransform', 'color'];
+
+        const addDeclaredFamilies = (cssText, target) => {
+            let match;
+            while ((match = fontFamilyRegex.exec(cssText)) !== null) {
+                const fontFamilies = match[1].split(',').map(f => f.trim().replace(/['"]/g, ''));
+                fontFamilies.forEach(f => {
+                    if (f && f !== 'inherit' && f !== 'initial' && f !== 'unset') {
+                        target.add(f);
                     }
                 });
+            }
+        };
 
-                return Array.from(fontsByFamily.values())
-                    .map(font => ({
-                        fontFamily: font.fontFamily,
-                        totalUsageCount: font.totalUsageCount,
-                        elements: Array.from(font.allElements),
-                        variations: Array.from(font.variations.values())
-                            .sort((a, b) => b.usageCount - a.usageCount)
-                    }))
-                    .sort((a, b) => b.totalUsageCount - a.totalUsageCount);
+        // FNV-1a over an inline stylesheet's text, only computed when memoizing stylesheets
+        const hashText = (text) => {
+            let hash = 0x811c9dc5;
+            for (let i = 0; i < text.length; i++) {
+                hash ^= text.charCodeAt(i);
+                hash = Math.imul(hash, 0x01000193);
             }
-        """)
-        
-        # Get @font-face declarations
-        font_faces = page.evaluate("""
-            () => {
-                const faces = [];
-                const styleSheets = Array.from(document.styleSheets);
-                
-                styleSheets.forEach(sheet => {
-                    try {
-                        const rules = Array.from(sheet.cssRules || []);
-                        rules.forEach(rule => {
-                            if (rule instanceof CSSFontFaceRule) {
-                                faces.push({
-                                    fontFamily: rule.style.fontFamily,
-                                    fontStyle: rule.style.fontStyle || 'normal',
-                                    fontWeight: rule.style.fontWeight || 'normal',
-                                    src: rule.style.src
-                                });
-                            }
-                        });
-                    } catch (e) {
-                        // Cross-origin stylesheets may throw errors
+            return (hash >>> 0).toString(16);
+        };
+
+        // Single pass over the stylesheets: @font-face, variable fonts, @import and declared families
+        const fontFaces = [];
+        const variableFonts = [];
+        const cssImports = [];
+        const sheetKeys = [];
+        const extractedSheets = [];
+        // Size of the work done, reported to a Profiler (see profiling)
+        const pageStats = { domNodes: 0, stylesheets: document.styleSheets.length, cssRules: 0, textNodes: 0, styledElements: 0 };
+
+        // Sharing needs an element's style to follow from its style key. Sibling combinators and
+        // positional or state pseudo-classes other than first/last/only-child can't be keyed, so a
+        // page using them is extracted without sharing. Attributes named in attribute selectors
+        // join the key; with a sheet that can't be read (cross-origin), every attribute does.
+        const UNKEYABLE_SELECTOR = /[+~]|:(nth-|first-of-type|last-of-type|only-of-type|empty|has\(|target|checked|disabled|enabled|required|optional|read-|placeholder-shown|invalid|valid|default|indeterminate|in-range|out-of-range|user-)/i;
+        const keyAttributes = new Set(['lang', 'dir', 'href']);
+        let keyAllAttributes = false;
+        const scanSelectors = (sheet) => {
+            let rules;
+            try {
+                rules = sheet.cssRules || [];
+            } catch (e) {
+                keyAllAttributes = true;
+                return;
+            }
+            for (const rule of Array.from(rules)) {
+                if (!styleSharing) {
+                    return;
+                }
+                if (rule.selectorText) {
+                    const selector = rule.selectorText.replace(/\[\s*(?:[\w-]*\|)?([\w-]+)[^\]]*\]/g, (match, name) => {
+                        keyAttributes.add(name.toLowerCase());
+                        return '';
+                    });
+                    if (UNKEYABLE_SELECTOR.test(selector)) {
+                        styleSharing = false;
+                        pageStats.styleSharingOff = 1;
                     }
-                });
-                
-                return faces;
+                }
+                if (rule.styleSheet) {
+                    scanSelectors(rule.styleSheet);
+                }
+                if (rule.cssRules) {
+                    scanSelectors(rule);
+                }
             }
-        """)
-        
-        # Get external font links and preloads
-        external_fonts = page.evaluate("""
-            () => {
-                const fonts = [];
-                const links = document.querySelectorAll('link');
-                
-                links.forEach(link => {
-                    const href = link.href;
-                    const rel = link.rel || '';
-                    const asAttr = link.getAttribute('as') || '';
-                    
-                    // Check for font preloading
-                    if (rel.includes('preload') && (asAttr === 'font' || href.match(/\\.(woff|woff2|ttf|otf|eot)/i))) {
-                        fonts.push({
-                            source: 'Preloaded Font',
-                            url: href,
-                            type: asAttr || 'font'
-                        });
+        };
+        if (styleSharing) {
+            Array.from(document.styleSheets).forEach(scanSelectors);
+        }
+        if (styleSharing) {
+            pageStats.sharedStyles = 0;
+        }
+        const keyedAttributes = (el) => {
+            const parts = [];
+            for (const attr of Array.from(el.attributes || [])) {
+                const name = attr.name.toLowerCase();
+                if (name !== 'class' && name !== 'id' && name !== 'style' && (keyAllAttributes || keyAttributes.has(name))) {
+                    parts.push(`${name}=${attr.value}`);
+                }
+            }
+            return parts.join('&');
+        };
+
+        // Style keys: tag, id, class list, inline style, the keyed attributes and whether the element
+        // is a first/last child, chained through the parent's key and interned to small integers,
+        // so elements of repeated components end up with equal keys
+        const styleKeyOf = new Map();
+        const styleKeyIds = new Map();
+        const sharedStyles = new Map();
+        const styleKey = (element) => {
+            const path = [];
+            let key = 0;
+            for (let el = element; el; el = el.parentElement) {
+                if (styleKeyOf.has(el)) {
+                    key = styleKeyOf.get(el);
+                    break;
+                }
+                path.push(el);
+            }
+            for (let i = path.length - 1; i >= 0; i--) {
+                const el = path[i];
+                const position = `${el.previousElementSibling ? '' : 'f'}${el.nextElementSibling ? '' : 'l'}`;
+                const text = `${key}>${el.tagName}#${el.id}.${el.getAttribute('class') || ''}|${el.getAttribute('style') || ''}` +
+                    `|${position}|${keyedAttributes(el)}`;
+                if (!styleKeyIds.has(text)) {
+                    styleKeyIds.set(text, styleKeyIds.size + 1);
+                }
+                key = styleKeyIds.get(text);
+                styleKeyOf.set(el, key);
+            }
+            return key;
+        };
+
+        // getComputedStyle, or with styleSharing the font properties already resolved for the style key
+        const resolveStyle = (element) => {
+            if (!styleSharing) {
+                pageStats.styledElements++;
+                return window.getComputedStyle(element);
+            }
+            const key = styleKey(element);
+            let style = sharedStyles.get(key);
+            if (style) {
+                pageStats.sharedStyles++;
+                return style;
+            }
+            const computedStyle = window.getComputedStyle(element);
+            pageStats.styledElements++;
+            style = {};
+            SHARED_STYLE_PROPERTIES.forEach(name => {
+                style[name] = computedStyle[name];
+            });
+            sharedStyles.set(key, style);
+            return style;
+        };
+
+        Array.from(usageOnly ? [] : document.styleSheets).forEach(sheet => {
+            try {
+                const rules = Array.from(sheet.cssRules || []);
+                pageStats.cssRules += rules.length;
+                let target = { fontFaces, variableFonts, cssImports, declaredFonts: declaredFontFamilies };
+                if (knownSheets) {
+                    let key;
+                    if (sheet.href) {
+                        // Two rules' cssText is a cheap fingerprint that catches most edits keeping the rule
+                        // count; a sheet whose other rules change at the same URL and sizes is still reused
+                        const first = rules.length ? (rules[0].cssText || '').length : 0;
+                        const last = rules.length ? (rules[rules.length - 1].cssText || '').length : 0;
+                        key = `${sheet.href}#${rules.length}:${first}-${last}`;
+                    } else {
+                        // A <style> element's text is cheap to read; rules inserted by script only exist in the CSSOM
+                        const ownerText = (sheet.ownerNode && sheet.ownerNode.textContent) || '';
+                        const ruleText = ownerText || rules.map(rule => rule.cssText || '').join('\\n');
+                        key = `inline#${rules.length}:${hashText(ruleText)}`;
                     }
-                    // Google Fonts
-                    else if (href.includes('fonts.googleapis.com') || href.includes('fonts.gstatic.com')) {
-                        fonts.push({
-                            source: 'Google Fonts',
-                            url: href
-                        });
+                    sheetKeys.push(key);
+                    if (knownSheets.has(key)) {
+                        return;
                     }
-                    // Adobe Fonts
-                    else if (href.includes('use.typekit.net') || href.includes('adobe.com/fonts')) {
-                        fonts.push({
-                            source: 'Adobe Fonts',
-                            url: href
+                    knownSheets.add(key);
+                    target = { key, href: sheet.href || null, fontFaces: [], variableFonts: [], cssImports: [], declaredFonts: new Set() };
+                    extractedSheets.push(target);
+                }
+                rules.forEach(rule => {
+                    if (rule instanceof CSSFontFaceRule) {
+                        const style = rule.style;
+                        const src = style.src || '';
+                        target.fontFaces.push({
+                            fontFamily: style.fontFamily || 'unknown',
+                            fontStyle: style.fontStyle || 'normal',
+                            fontWeight: style.fontWeight || 'normal',
+                            fontStretch: style.fontStretch || 'normal',
+                            fontDisplay: style.fontDisplay || 'auto',
+                            unicodeRange: style.unicodeRange || '',
+                            src: src,
+                            fontVariationSettings: style.fontVariationSettings || ''
                         });
-                    }
-                    // Fonts.com
-                    else if (href.includes('fonts.com') || href.includes('fast.fonts.net')) {
-                        fonts.push({
-                            source: 'Fonts.com',
-                            url: href
+                        // Check for variable font indicators
+                        if (src.includes('variable') ||
+                            src.includes('VF') ||
+                            style.fontVariationSettings ||
+                            (style.fontWeight && style.fontWeight.includes(' '))) {
+                            target.variableFonts.push({
+                                fontFamily: style.fontFamily || 'unknown',
+                                src: src,
+                                hasVariationSettings: !!style.fontVariationSettings
+                            });
+                        }
+                    } else if (rule instanceof CSSImportRule) {
+                        target.cssImports.push({
+                            url: rule.href,
+                            media: rule.media.mediaText || 'all'
                         });
                     }
-                    // Other font-related links
-                    else if (rel.includes('stylesheet') && (href.includes('font') || href.includes('typeface'))) {
-                        fonts.push({
-                            source: 'External Stylesheet',
-                            url: href
-                        });
+
+                    let cssText = '';
+                    if (rule.cssText) {
+                        cssText = rule.cssText;
+                    } else if (rule.style && rule.style.cssText) {
+                        cssText = rule.style.cssText;
                     }
+                    addDeclaredFamilies(cssText, target.declaredFonts);
                 });
-                
-                return fonts;
+            } catch (e) {
+                // Cross-origin stylesheets may throw errors
             }
-        """)
-        
-        # Discover all fonts declared in CSS (even if not used)
-        declared_fonts = page.evaluate("""
-            () => {
-                const declaredFontFamilies = new Set();
-                const fontFamilyRegex = /font-family\\s*:\\s*([^;]+)/gi;
-                const styleSheets = Array.from(document.styleSheets);
-                
-                styleSheets.forEach(sheet => {
-                    try {
-                        const rules = Array.from(sheet.cssRules || []);
-                        rules.forEach(rule => {
-                            let cssText = '';
-                            if (rule.cssText) {
-                                cssText = rule.cssText;
-                            } else if (rule.style && rule.style.cssText) {
-                                cssText = rule.style.cssText;
-                            }
-                            
-                            // Extract font-family declarations
-                            let match;
-                            while ((match = fontFamilyRegex.exec(cssText)) !== null) {
-                                const fontFamilies = match[1].split(',').map(f => f.trim().replace(/['"]/g, ''));
-                                fontFamilies.forEach(f => {
-                                    if (f && f !== 'inherit' && f !== 'initial' && f !== 'unset') {
-                                        declaredFontFamilies.add(f);
-                                    }
-                                });
-                            }
-                        });
-                    } catch (e) {
-                        // Cross-origin stylesheets may throw errors
-                    }
-                });
-                
-                // Also check inline styles
-                const allElements = document.querySelectorAll('*');
-                allElements.forEach(element => {
-                    const inlineStyle = element.getAttribute('style');
-                    if (inlineStyle) {
-                        let match;
-                        while ((match = fontFamilyRegex.exec(inlineStyle)) !== null) {
-                            const fontFamilies = match[1].split(',').map(f => f.trim().replace(/['"]/g, ''));
-                            fontFamilies.forEach(f => {
-                                if (f && f !== 'inherit' && f !== 'initial' && f !== 'unset') {
-                                    declaredFontFamilies.add(f);
-                                }
-                            });
-                        }
-                    }
-                });
-                
-                return Array.from(declaredFontFamilies);
+        });
+
+        // Attribute every non-blank text node to its parent element. This replaces per-element
+        // textContent scans, which copy whole subtrees and are quadratic on deep DOMs.
+        const ownChars = new Map();
+        const ownText = collectCodepoints ? new Map() : null;
+        const textWalker = document.createTreeWalker(document, NodeFilter.SHOW_TEXT);
+        let textNode;
+        while ((textNode = textWalker.nextNode())) {
+            const parent = textNode.parentElement;
+            if (!parent || !/\\S/.test(textNode.data)) {
+                continue;
             }
-        """)
-        
-        # Get all font-face rules with more details
-        detailed_font_faces = page.evaluate("""
-            () => {
-                const faces = [];
-                const styleSheets = Array.from(document.styleSheets);
-                
-                styleSheets.forEach(sheet => {
-                    try {
-                        const rules = Array.from(sheet.cssRules || []);
-                        rules.forEach(rule => {
-                            if (rule instanceof CSSFontFaceRule) {
-                                const style = rule.style;
-                                faces.push({
-                                    fontFamily: style.fontFamily || 'unknown',
-                                    fontStyle: style.fontStyle || 'normal',
-                                    fontWeight: style.fontWeight || 'normal',
-                                    fontStretch: style.fontStretch || 'normal',
-                                    fontDisplay: style.fontDisplay || 'auto',
-                                    unicodeRange: style.unicodeRange || '',
-                                    src: style.src || '',
-                                    fontVariationSettings: style.fontVariationSettings || ''
-                                });
-                            }
-                        });
-                    } catch (e) {
-                        // Cross-origin stylesheets may throw errors
-                    }
+            const chars = textNode.data.replace(/\\s+/g, ' ').trim().length;
+            pageStats.textNodes++;
+            ownChars.set(parent, (ownChars.get(parent) || 0) + chars);
+            if (ownText) {
+                ownText.set(parent, (ownText.get(parent) || '') + textNode.data);
+            }
+        }
+
+        const fontsByFamily = new Map();
+        const renderedFamilies = new Set();
+        const externalFonts = [];
+        // Elements that would be styled and counted, when sampling defers that to runSample
+        const candidates = [];
+        // Sampled [count, characters] per stratum for each font family and variation
+        const stratumCounts = sample ? new Map() : null;
+
+        const countInStratum = (target, stratum, chars) => {
+            let byStratum = stratumCounts.get(target);
+            if (!byStratum) {
+                byStratum = new Map();
+                stratumCounts.set(target, byStratum);
+            }
+            const counts = byStratum.get(stratum) || [0, 0];
+            counts[0]++;
+            counts[1] += chars;
+            byStratum.set(stratum, counts);
+        };
+
+        const addRenderedFamilies = (fontFamily) => {
+            fontFamily.split(',').forEach(f => {
+                const clean = f.trim().replace(/['"]/g, '');
+                if (clean && !GENERIC_FAMILIES.includes(clean)) {
+                    renderedFamilies.add(clean);
+                }
+            });
+        };
+
+        const recordUsage = (element, computedStyle, stratum) => {
+            const tagName = element.tagName.toLowerCase();
+            const fontSize = computedStyle.fontSize;
+            const fontWeight = computedStyle.fontWeight;
+            const fontStyle = computedStyle.fontStyle;
+            const chars = ownChars.get(element) || 0;
+            const cleanFontFamily = computedStyle.fontFamily.split(',')[0].replace(/['"]/g, '').trim();
+
+            if (!fontsByFamily.has(cleanFontFamily)) {
+                fontsByFamily.set(cleanFontFamily, {
+                    fontFamily: cleanFontFamily,
+                    variations: new Map(),
+                    allElements: new Set(),
+                    totalUsageCount: 0,
+                    totalCharacterCount: 0,
+                    codepoints: collectCodepoints ? new Set() : null
                 });
-                
-                return faces;
             }
-        """)
-        
-        # Check for variable fonts
-        variable_fonts = page.evaluate("""
-            () => {
-                const variableFonts = [];
-                const styleSheets = Array.from(document.styleSheets);
-                
-                styleSheets.forEach(sheet => {
-                    try {
-                        const rules = Array.from(sheet.cssRules || []);
-                        rules.forEach(rule => {
-                            if (rule instanceof CSSFontFaceRule) {
-                                const style = rule.style;
-                                const src = style.src || '';
-                                // Check for variable font indicators
-                                if (src.includes('variable') || 
-                                    src.includes('VF') || 
-                                    style.fontVariationSettings ||
-                                    (style.fontWeight && style.fontWeight.includes(' '))) {
-                                    variableFonts.push({
-                                        fontFamily: style.fontFamily || 'unknown',
-                                        src: src,
-                                        hasVariationSettings: !!style.fontVariationSettings
-                                    });
-                                }
-                            }
-                        });
-                    } catch (e) {
-                        // Cross-origin stylesheets may throw errors
+
+            const fontFamilyInfo = fontsByFamily.get(cleanFontFamily);
+            fontFamilyInfo.allElements.add(tagName);
+            fontFamilyInfo.totalUsageCount++;
+            fontFamilyInfo.totalCharacterCount += chars;
+            if (ownText && ownText.has(element)) {
+                for (const ch of ownText.get(element)) {
+                    if (!/\s/.test(ch)) {
+                        fontFamilyInfo.codepoints.add(ch);
                     }
+                }
+            }
+
+            const lineHeight = computedStyle.lineHeight;
+            const color = computedStyle.color;
+            // Same fields as VARIATION_MERGE_FIELDS, which merges the variations of several frames
+            const variationKey = `${fontSize}|${fontWeight}|${fontStyle}|${lineHeight}|${color}`;
+
+            if (!fontFamilyInfo.variations.has(variationKey)) {
+                const letterSpacing = computedStyle.letterSpacing;
+                fontFamilyInfo.variations.set(variationKey, {
+                    fontSize: fontSize,
+                    fontSizePx: parseFloat(fontSize),
+                    fontWeight: fontWeight,
+                    fontStyle: fontStyle,
+                    lineHeight: lineHeight,
+                    lineHeightValue: lineHeight === 'normal' ? null : parseFloat(lineHeight),
+                    letterSpacing: letterSpacing,
+                    letterSpacingValue: letterSpacing === 'normal' ? 0 : parseFloat(letterSpacing),
+                    textTransform: computedStyle.textTransform,
+                    color: color,
+                    usageCount: 0,
+                    characterCount: 0,
+                    elements: new Set(),
+                    sampleText: element.textContent.trim().substring(0, 100)
                 });
-                
-                return variableFonts;
             }
-        """)
-        
-        # Get CSS @import statements that might load fonts
-        css_imports = page.evaluate("""
-            () => {
-                const imports = [];
-                const styleSheets = Array.from(document.styleSheets);
-                
-                styleSheets.forEach(sheet => {
-                    try {
-                        const rules = Array.from(sheet.cssRules || []);
-                        rules.forEach(rule => {
-                            if (rule instanceof CSSImportRule) {
-                                imports.push({
-                                    url: rule.href,
-                                    media: rule.media.mediaText || 'all'
-                                });
-                            }
-                        });
-                    } catch (e) {
-                        // Cross-origin stylesheets may throw errors
+
+            const variation = fontFamilyInfo.variations.get(variationKey);
+            variation.usageCount++;
+            variation.characterCount += chars;
+
+            variation.elements.add(tagName);
+            if (stratumCounts) {
+                countInStratum(fontFamilyInfo, stratum, chars);
+                countInStratum(variation, stratum, chars);
+            }
+        };
+
+        // Deterministic PRNG (mulberry32) so a sampled extraction is reproducible for a seed
+        let seed = sample ? (sample.seed || 1) >>> 0 : 0;
+        const random = () => {
+            seed = (seed + 0x6D2B79F5) >>> 0;
+            let t = seed;
+            t = Math.imul(t ^ (t >>> 15), t | 1);
+            t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+            return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+        };
+        const shuffle = (items) => {
+            for (let i = items.length - 1; i > 0; i--) {
+                const j = Math.floor(random() * (i + 1));
+                [items[i], items[j]] = [items[j], items[i]];
+            }
+            return items;
+        };
+
+        // Stratified sample of the candidates. A stratum is a tag name within one of SUBTREE_BUCKETS
+        // ranges of <body> children. Every stratum gets one element first, largest strata first,
+        // then the rest are styled in seeded random order until sample.maxElements or sample.maxMs
+        // is reached. Counts are scaled up per stratum (N / n) with a standard error.
+        const runSample = () => {
+            const started = performance.now();
+            const bodyChildren = document.body ? Array.from(document.body.children) : [];
+            const bucketOf = new Map();
+            bodyChildren.forEach((child, i) => bucketOf.set(child, Math.floor(i * SUBTREE_BUCKETS / bodyChildren.length)));
+            const subtreeBucket = (element) => {
+                const path = [];
+                let bucket = -1;
+                for (let el = element; el; el = el.parentElement) {
+                    if (bucketOf.has(el)) {
+                        bucket = bucketOf.get(el);
+                        break;
+                    }
+                    path.push(el);
+                }
+                path.forEach(el => bucketOf.set(el, bucket));
+                return bucket;
+            };
+
+            const strata = new Map();
+            candidates.forEach(element => {
+                const key = `${element.tagName}|${subtreeBucket(element)}`;
+                if (!strata.has(key)) {
+                    strata.set(key, []);
+                }
+                strata.get(key).push(element);
+            });
+            const firsts = [];
+            const rest = [];
+            Array.from(strata.entries())
+                .sort((a, b) => b[1].length - a[1].length)
+                .forEach(([key, elements]) => {
+                    shuffle(elements);
+                    firsts.push([key, elements[0]]);
+                    for (let i = 1; i < elements.length; i++) {
+                        rest.push([key, elements[i]]);
                     }
                 });
-                
-                return imports;
-            }
-        """)
-        
-        # Check document.fonts API for loaded fonts
-        loaded_fonts = page.evaluate("""
-            () => {
-                if (!document.fonts || !document.fonts.check) {
-                    return [];
+            const order = firsts.concat(shuffle(rest));
+
+            // maxMs bounds the styling; grouping the candidates above is linear and cheap by comparison
+            const stylingStarted = performance.now();
+            const sampled = new Map();
+            let budgetHit = null;
+            for (let i = 0; i < order.length; i++) {
+                if (sample.maxElements && i >= sample.maxElements) {
+                    budgetHit = 'elements';
+                    break;
                 }
-                
-                const loaded = [];
-                const fontFamilies = new Set();
-                
-                // Get all unique font families from the page
-                const allElements = document.querySelectorAll('*');
-                allElements.forEach(element => {
-                    const style = window.getComputedStyle(element);
-                    const families = style.fontFamily.split(',');
-                    families.forEach(f => {
-                        const clean = f.trim().replace(/['"]/g, '');
-                        if (clean && !['inherit', 'initial', 'unset', 'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy'].includes(clean)) {
-                            fontFamilies.add(clean);
-                        }
-                    });
+                if (sample.maxMs && i % 32 === 0 && performance.now() - stylingStarted > sample.maxMs) {
+                    budgetHit = 'time';
+                    break;
+                }
+                const [stratum, element] = order[i];
+                const computedStyle = resolveStyle(element);
+                addRenderedFamilies(computedStyle.fontFamily);
+                recordUsage(element, computedStyle, stratum);
+                sampled.set(stratum, (sampled.get(stratum) || 0) + 1);
+            }
+
+            // Stratified estimate of a total, with the finite-population variance of each stratum's
+            // proportion; a stratum with one styled element has unknown spread, taken as the widest
+            const estimate = (target) => {
+                const byStratum = stratumCounts.get(target);
+                let count = 0;
+                let chars = 0;
+                let variance = 0;
+                sampled.forEach((n, stratum) => {
+                    const size = strata.get(stratum).length;
+                    const [hits, hitChars] = (byStratum && byStratum.get(stratum)) || [0, 0];
+                    const p = hits / n;
+                    count += hits * size / n;
+                    chars += hitChars * size / n;
+                    variance += size * size * (1 - n / size) * (n > 1 ? p * (1 - p) / (n - 1) : 0.25);
                 });
-                
-                // Check which fonts are actually loaded
-                fontFamilies.forEach(family => {
-                    try {
-                        // Try different weights/styles
-                        for (let weight of ['400', '700']) {
-                            for (let style of ['normal', 'italic']) {
-                                if (document.fonts.check(`12px "${family}"`, weight)) {
-                                    loaded.push({
-                                        fontFamily: family,
-                                        weight: weight,
-                                        style: style,
-                                        status: 'loaded'
-                                    });
-                                    break;
-                                }
-                            }
-                        }
-                    } catch (e) {
-                        // Font check failed
-                    }
+                return { count: Math.round(count), chars: Math.round(chars), stdError: Math.round(Math.sqrt(variance) * 10) / 10 };
+            };
+            fontsByFamily.forEach(font => {
+                const total = estimate(font);
+                font.totalUsageCount = total.count;
+                font.totalCharacterCount = total.chars;
+                font.usageCountStdError = total.stdError;
+                font.variations.forEach(variation => {
+                    const part = estimate(variation);
+                    variation.usageCount = part.count;
+                    variation.characterCount = part.chars;
+                    variation.usageCountStdError = part.stdError;
                 });
-                
-                return loaded;
+            });
+
+            let styled = 0;
+            let represented = 0;
+            sampled.forEach((n, stratum) => {
+                styled += n;
+                represented += strata.get(stratum).length;
+            });
+            return {
+                candidates: candidates.length,
+                sampled: styled,
+                coverage: candidates.length ? Math.round(styled / candidates.length * 1000) / 1000 : 1,
+                strata: strata.size,
+                sampledStrata: sampled.size,
+                // Candidates in strata that ran out of budget before one element was styled
+                unrepresentedCandidates: candidates.length - represented,
+                budgetHit: budgetHit,
+                elapsedMs: Math.round(performance.now() - started),
+                maxElements: sample.maxElements || null,
+                maxMs: sample.maxMs || null,
+                seed: sample.seed || 1
+            };
+        };
+
+        // In 'elements' mode every element containing text counts, as before: mark the
+        // ancestors of each text owner once instead of testing textContent per element
+        const hasText = new Set();
+        if (collector === 'elements') {
+            ownChars.forEach((chars, owner) => {
+                for (let el = owner; el && !hasText.has(el); el = el.parentElement) {
+                    hasText.add(el);
+                }
+            });
+        }
+
+        // Single pass over the DOM: inline declarations, font links and (in 'elements' mode) usage
+        document.querySelectorAll('*').forEach(element => {
+            pageStats.domNodes++;
+            const inlineStyle = element.getAttribute('style');
+            if (inlineStyle) {
+                addDeclaredFamilies(inlineStyle, declaredFontFamilies);
             }
-        """)
-        
-        # Extract fonts from iframes (if accessible)
-        iframe_fonts = []
-        try:
-            for frame in page.frames:
-                if frame != page.main_frame:  # Skip main frame (already processed)
-                    try:
-                        iframe_font_data = frame.evaluate("""
-                            () => {
-                                const fontsByFamily = new Map();
-                                const allElements = document.querySelectorAll('*');
-                                
-                                allElements.forEach(element => {
-                                    const computedStyle = window.getComputedStyle(element);
-                                    const fontFamily = computedStyle.fontFamily;
-                                    const fontSize = computedStyle.fontSize;
-                                    const fontWeight = computedStyle.fontWeight;
-                                    const fontStyle = computedStyle.fontStyle;
-                                    const tagName = element.tagName.toLowerCase();
-                                    
-                                    if (!element.textContent || element.textContent.trim().length === 0) {
-                                        return;
-                                    }
-                                    
-                                    const cleanFontFamily = fontFamily.split(',')[0].replace(/['"]/g, '').trim();
-                                    
-                                    if (!fontsByFamily.has(cleanFontFamily)) {
-                                        fontsByFamily.set(cleanFontFamily, {
-                                            fontFamily: cleanFontFamily,
-                                            variations: new Map(),
-                                            allElements: new Set(),
-                                            totalUsageCount: 0
-                                        });
-                                    }
-                                    
-                                    const fontFamilyInfo = fontsByFamily.get(cleanFontFamily);
-                                    fontFamilyInfo.allElements.add(tagName);
-                                    fontFamilyInfo.totalUsageCount++;
-                                    
-                                    const variationKey = `${fontSize}|${fontWeight}|${fontStyle}`;
-                                    
-                                    if (!fontFamilyInfo.variations.has(variationKey)) {
-                                        fontFamilyInfo.variations.set(variationKey, {
-                                            fontSize: fontSize,
-                                            fontSizePx: parseFloat(fontSize),
-                                            fontWeight: fontWeight,
-                                            fontStyle: fontStyle,
-                                            usageCount: 0,
-                                            elements: [],
-                                            sampleText: element.textContent.trim().substring(0, 100)
-                                        });
-                                    }
-                                    
-                                    const variation = fontFamilyInfo.variations.get(variationKey);
-                                    variation.usageCount++;
-                                    
-                                    if (!variation.elements.includes(tagName)) {
-                                        variation.elements.push(tagName);
-                                    }
+
+            if (element.tagName === 'LINK') {
+                const href = element.href;
+                const rel = element.rel || '';
+                const asAttr = element.getAttribute('as') || '';
+
+                // Check for font preloading
+                if (rel.includes('preload') && (asAttr === 'font' || href.match(/\\.(woff|woff2|ttf|otf|eot)/i))) {
+                    externalFonts.push({ source: 'Preloaded Font', url: href, type: asAttr || 'font' });
+                }
+                else if (href.includes('fonts.googleapis.com') || href.includes('fonts.gstatic.com')) {
+                    externalFonts.push({ source: 'Google Fonts', url: href });
+                }
+                else if (href.includes('use.typekit.net') || href.includes('adobe.com/fonts')) {
+                    externalFonts.push({ source: 'Adobe Fonts', url: href });
+                }
+                else if (href.includes('fonts.com') || href.includes('fast.fonts.net')) {
+                    externalFonts.push({ source: 'Fonts.com', url: href });
+                }
+                // Other font-related links
+                else if (rel.includes('stylesheet') && (href.includes('font') || href.includes('typeface'))) {
+                    externalFonts.push({ source: 'External Stylesheet', url: href });
+                }
+            }
+
+            if (collector !== 'elements') {
+                return;
+            }
+            if (sample) {
+                if (hasText.has(element)) {
+                    candidates.push(element);
+                }
+                return;
+            }
+
+            const computedStyle = resolveStyle(element);
+            addRenderedFamilies(computedStyle.fontFamily);
+            if (hasText.has(element)) {
+                recordUsage(element, computedStyle);
+            }
+        });
+
+        // In 'textnodes' mode only elements that directly own rendered text are styled and counted
+        if (collector === 'textnodes') {
+            ownChars.forEach((chars, owner) => {
+                if (NON_RENDERED_TAGS.includes(owner.tagName)) {
+                    return;
+                }
+                if (sample) {
+                    candidates.push(owner);
+                    return;
+                }
+                const computedStyle = resolveStyle(owner);
+                addRenderedFamilies(computedStyle.fontFamily);
+                recordUsage(owner, computedStyle);
+            });
+        }
+
+        const sampling = sample ? runSample() : null;
+
+        // Check which rendered families are actually loaded
+        const loadedFonts = [];
+        if (document.fonts && document.fonts.check) {
+            renderedFamilies.forEach(family => {
+                try {
+                    // Try different weights/styles
+                    for (let weight of ['400', '700']) {
+                        for (let style of ['normal', 'italic']) {
+                            if (document.fonts.check(`12px "${family}"`, weight)) {
+                                loadedFonts.push({
+                                    fontFamily: family,
+                                    weight: weight,
+                                    style: style,
+                                    status: 'loaded'
                                 });
-                                
-                                return Array.from(fontsByFamily.values())
-                                    .map(font => ({
-                                        fontFamily: font.fontFamily,
-                                        totalUsageCount: font.totalUsageCount,
-                                        elements: Array.from(font.allElements),
-                                        variations: Array.from(font.variations.values())
-                                            .sort((a, b) => b.usageCount - a.usageCount)
-                                    }))
-                                    .sort((a, b) => b.totalUsageCount - a.totalUsageCount);
+                                break;
                             }
-                        """)
-                        if iframe_font_data:
-                            iframe_fonts.extend(iframe_font_data)
-                    except Exception:
-                        # Cross-origin iframes or other errors - skip silently
-                        pass
-        except Exception:
-            # Iframe access failed - continue without iframe fonts
-            pass
-        
-        # Merge iframe fonts with main page fonts
-        all_fonts = fonts_data or []
-        if iframe_fonts:
-            # Create a map to merge fonts by family
-            fonts_dict = {f['fontFamily']: f for f in all_fonts}
-            for iframe_font in iframe_fonts:
-                family = iframe_font['fontFamily']
-                if family in fonts_dict:
-                    # Merge variations and update counts
-                    existing = fonts_dict[family]
-                    existing['totalUsageCount'] += iframe_font['totalUsageCount']
-                    existing_variations = {f"{v['fontSize']}|{v['fontWeight']}|{v['fontStyle']}": v 
-                                          for v in existing['variations']}
-                    for var in iframe_font['variations']:
-                        var_key = f"{var['fontSize']}|{var['fontWeight']}|{var['fontStyle']}"
-                        if var_key in existing_variations:
-                            existing_variations[var_key]['usageCount'] += var['usageCount']
-                        else:
-                            existing['variations'].append(var)
-                    existing['elements'] = list(set(existing['elements'] + iframe_font['elements']))
-                else:
-                    all_fonts.append(iframe_font)
-        
-        browser.close()
-        
-        return {
-            'fonts': all_fonts,
-            'fontFaces': detailed_font_faces or [],
-            'externalFonts': external_fonts or [],
-            'fontFiles': font_files,
-            'declaredFonts': declared_fonts or [],
-            'variableFonts': variable_fonts or [],
-            'cssImports': css_imports or [],
-            'loadedFonts': loaded_fonts or [],
-            'url': url
+                        }
+                    }
+                } catch (e) {
+                    // Font check failed
+                }
+            });
         }
+
+        const fonts = Array.from(fontsByFamily.values())
+            .map(font => ({
+                fontFamily: font.fontFamily,
+                totalUsageCount: font.totalUsageCount,
+                totalCharacterCount: font.totalCharacterCount,
+                ...(sample ? { usageCountStdError: font.usageCountStdError } : {}),
+                elements: Array.from(font.allElements),
+                variations: Array.from(font.variations.values())
+                    .map(variation => Object.assign(variation, { elements: Array.from(variation.elements) }))
+                    .sort((a, b) => b.usageCount - a.usageCount),
+                ...(font.codepoints ? { codepoints: Array.from(font.codepoints).join('') } : {})
+            }))
+            .sort((a, b) => b.totalUsageCount - a.totalUsageCount);
+
+        const sections = {
+            fonts: fonts,
+            fontFaces: fontFaces,
+            externalFonts: externalFonts,
+            declaredFonts: Array.from(declaredFontFamilies),
+            variableFonts: variableFonts,
+            cssImports: cssImports,
+            loadedFonts: loadedFonts,
+            pageStats: pageStats
+        };
+        if (sampling) {
+            sections.sampling = sampling;
+        }
+        // With a memo, stylesheet sections come back per sheet and only for sheets not seen before
+        if (knownSheets) {
+            sections.sheets = {
+                keys: sheetKeys,
+                extracted: extractedSheets.map(sheet => Object.assign({}, sheet, { declaredFonts: Array.from(sheet.declaredFonts) }))
+            };
+        }
+        return sections;
+    }
+"""
+
+# Variations from different frames are the same variation when these match, as within a frame
+# (the script's variationKey); the other fields are taken from the first frame seen
+VARIATION_MERGE_FIELDS = ('fontSize', 'fontWeight', 'fontStyle', 'lineHeight', 'color')
+
+def frame_script_options(collector: str, parse_fonts: bool, sampling: Optional[SamplingBudget] = None,
+                         style_sharing: bool = False) -> Dict[str, Any]:
+    """PAGE_EXTRACTION_SCRIPT options for child frames: usage only, as only usage is merged"""
+    options = {'collector': collector, 'usageOnly': True}
+    if parse_fonts:
+        options['codepoints'] = True
+    if sampling is not None:
+        options['sample'] = sampling.script_options()
+    if style_sharing:
+        options['styleSharing'] = True
+    return options
+
+def child_frames(page) -> List[Any]:
+    """Every frame of the page except the main frame, nested frames included"""
+    return [frame for frame in page.frames if frame != page.main_frame]
+
+def frame_results(frames: List[Any], results: List[Any]) -> List[Dict[str, Any]]:
+    """Pairs each frame with its evaluation result or the exception it raised"""
+    entries = []
+    for frame, result in zip(frames, results):
+        entry = {'url': frame.url, 'name': frame.name}
+        if isinstance(result, BaseException):
+            # Detached frames, frames that navigated meanwhile, or frames not yet scriptable
+            entry['error'] = str(result).splitlines()[0] if str(result) else type(result).__name__
+        else:
+            entry['sections'] = result or {}
+        entries.append(entry)
+    return entries
+
+def _add_std_error(target: Dict[str, Any], part: Dict[str, Any]):
+    """Combines the standard errors of independently sampled usage estimates"""
+    if 'usageCountStdError' in part:
+        combined = target.get('usageCountStdError', 0) ** 2 + part['usageCountStdError'] ** 2
+        target['usageCountStdError'] = round(combined ** 0.5, 1)
+
+def merge_frame_fonts(frames: List[Tuple[str, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """Merges the fonts sections of several frames, given as (frame url, fonts) with the main frame first
+
+    Fonts are merged by family and variations by VARIATION_MERGE_FIELDS, the same key the
+    page script merges variations by within a frame. Each variation is visited once. When
+    more than one frame contributed, every font and variation gets `sources`: usage count
+    per frame URL. Sampled estimates (see SamplingBudget) combine their standard errors in
+    quadrature.
+    """
+    contributing = [(frame_url, fonts) for frame_url, fonts in frames if fonts]
+    if len(contributing) <= 1:
+        return contributing[0][1] if contributing else []
+
+    merged = {}
+    for frame_url, fonts in contributing:
+        for font in fonts:
+            entry = merged.get(font['fontFamily'])
+            if entry is None:
+                target = dict(font, totalUsageCount=0, totalCharacterCount=0, elements=[], variations=[], sources={})
+                target.pop('usageCountStdError', None)
+                entry = merged[font['fontFamily']] = {'font': target, 'variations': {}, 'elements': set(),
+                                                      'codepoints': {} if 'codepoints' in font else None}
+            target = entry['font']
+            target['totalUsageCount'] += font['totalUsageCount']
+            target['totalCharacterCount'] += font.get('totalCharacterCount', 0)
+            _add_std_error(target, font)
+            target['sources'][frame_url] = target['sources'].get(frame_url, 0) + font['totalUsageCount']
+            for tag in font['elements']:
+                if tag not in entry['elements']:
+                    entry['elements'].add(tag)
+                    target['elements'].append(tag)
+            if entry['codepoints'] is not None:
+                # Ordered union of the characters rendered in each frame
+                entry['codepoints'].update(dict.fromkeys(font.get('codepoints', '')))
+                target['codepoints'] = ''.join(entry['codepoints'])
+
+            for variation in font['variations']:
+                key = tuple(variation.get(field) for field in VARIATION_MERGE_FIELDS)
+                existing = entry['variations'].get(key)
+                if existing is None:
+                    existing = entry['variations'][key] = dict(variation, elements=list(variation['elements']), sources={})
+                    target['variations'].append(existing)
+                else:
+                    existing['usageCount'] += variation['usageCount']
+                    existing['characterCount'] = existing.get('characterCount', 0) + variation.get('characterCount', 0)
+                    _add_std_error(existing, variation)
+                    existing['elements'] += [tag for tag in variation['elements'] if tag not in existing['elements']]
+                existing['sources'][frame_url] = existing['sources'].get(frame_url, 0) + variation['usageCount']
+
+    fonts = [entry['font'] for entry in merged.values()]
+    for font in fonts:
+        font['variations'].sort(key=lambda v: -v['usageCount'])
+    return sorted(fonts, key=lambda f: -f['totalUsageCount'])
+
+def build_font_data(url: str, sections: Dict[str, Any], frames: List[Dict[str, Any]],
+                    font_files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assembles the analyze_fonts result from the evaluated page sections and child frame results"""
+    fonts = merge_frame_fonts([(url, sections.get('fonts'))] +
+                              [(frame['url'], frame['sections'].get('fonts')) for frame in frames if 'sections' in frame])
+    font_data = {
+        'fonts': fonts,
+        'fontFaces': sections.get('fontFaces') or [],
+        'externalFonts': sections.get('externalFonts') or [],
+        'fontFiles': font_files,
+        'declaredFonts': sections.get('declaredFonts') or [],
+        'variableFonts': sections.get('variableFonts') or [],
+        'cssImports': sections.get('cssImports') or [],
+        'loadedFonts': sections.get('loadedFonts') or [],
+        'url': url
+    }
+    if 'sampling' in sections:
+        font_data['sampling'] = sections['sampling']
+    if frames:
+        font_data['frames'] = [
+            {'url': frame['url'], 'name': frame['name'], 'error': frame['error']} if 'error' in frame else
+            {'url': frame['url'], 'name': frame['name'], 'fonts': len(frame['sections'].get('fonts') or []),
+             'usageCount': sum(f['totalUsageCount'] for f in frame['sections'].get('fonts') or [])}
+            for frame in frames
+        ]
+    return font_data
+
+def record_page_counters(profiler: Profiler, url: str, sections: Dict[str, Any]):
+    """Reports the page size counters of an extraction result to profiler"""
+    for name, value in (sections.get('pageStats') or {}).items():
+        profiler.count(name, value, url)
+    profiler.count('payloadBytes', len(json.dumps(sections, separators=(',', ':'))), url)
+
+def analyze_fonts(url: str, verbose: bool = False, pool: Optional[BrowserPool] = None,
+                  collector: str = 'elements', settle: Optional[SettlePolicy] = None,
+                  blocker: Optional[ResourceBlocker] = None,
+                  sheet_memo: Optional[StylesheetMemo] = None,
+                  font_budget: Optional[FontBudget] = None,
+                  parse_fonts: bool = False,
+                  font_store: Optional[FontStore] = None,
+                  profiler: Optional[Profiler] = None,
+                  sampling: Optional[SamplingBudget] = None,
+                  style_sharing: bool = False) -> Dict[str, Any]:
+    """Extracts comprehensive font information from a webpage using Chromium (Playwright)
+
+    Pass a long-lived BrowserPool to reuse one browser across many calls; without one a
+    browser is launched for this call only, on the asyncio engine (see async_extractor) so
+    that every child frame is evaluated at once. With a BrowserPool the sync API evaluates
+    the frames one after another. `collector` is one of COLLECTORS, `settle`
+    decides how long to wait for the page before extracting (adaptive by default),
+    `blocker` aborts requests that cannot affect fonts and a `sheet_memo` shared by the
+    pages of one site skips stylesheets already extracted on an earlier page. Font
+    downloads are measured into result['fontNetwork'] and checked against `font_budget`;
+    with `parse_fonts` the downloaded files are also parsed into result['fontBinaries']
+    (real axes, weights and glyph coverage of the page text, see font_parser). A
+    `font_store` keeps every downloaded font file once per unique binary (see font_store).
+    A `profiler` receives the time spent in each phase and page counters (see profiling).
+    A `sampling` budget bounds the usage collection on huge DOMs (see SamplingBudget).
+    `style_sharing` resolves styles once per style key (tag, id, class list, inline style,
+    first/last-child position, the attributes named in attribute selectors and the parent's
+    key), which saves getComputedStyle calls on component-heavy pages. A page whose selectors
+    cannot be keyed (sibling combinators, :nth-*, :has() or state pseudo-classes) is
+    extracted without sharing and reports pageStats.styleSharingOff.
+    """
+    
+    if collector not in COLLECTORS:
+        raise ValueError(f"Unknown collector '{collector}', expected one of: {', '.join(COLLECTORS)}")
+    
+    options = {'collector': collector, 'settle': settle, 'blocker': blocker, 'sheet_memo': sheet_memo,
+               'font_budget': font_budget, 'parse_fonts': parse_fonts, 'font_store': font_store, 'profiler': profiler,
+               'sampling': sampling, 'style_sharing': style_sharing}
+    
+    if pool is None:
+        from async_extractor import analyze_fonts_async
+        return asyncio.run(analyze_fonts_async(url, verbose, **options))
+    
+    with phase(profiler, 'analyze', url):
+        with pool.page() as page:
+            return _extract_page(page, url, **options)
+
+def analyze_fonts_batch(urls: Iterable[str], verbose: bool = False, pool: Optional[BrowserPool] = None,
+                        pool_options: Optional[Dict[str, Any]] = None,
+                        **options) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Analyzes many URLs with one browser, yielding (url, font_data, error) per URL
+
+    If no pool is given the URLs run one at a time on the asyncio engine, with a browser
+    created from pool_options and closed when the batch ends, so each page's frames are
+    evaluated at once. Remaining keyword options are passed to analyze_fonts. A failing URL
+    yields an error message instead of aborting the batch.
+    """
+    
+    if pool is None:
+        from async_extractor import analyze_fonts_concurrent
+        loop = asyncio.new_event_loop()
+        results = analyze_fonts_concurrent(urls, 1, 1, verbose, pool_options=pool_options, **options)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # A caller that stops early leaves the next page in flight
+            leftover = asyncio.all_tasks(loop)
+            for task in leftover:
+                task.cancel()
+            if leftover:
+                loop.run_until_complete(asyncio.wait(leftover))
+            loop.run_until_complete(results.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+    
+    for url in urls:
+        try:
+            yield url, analyze_fonts(url, verbose, pool, **options), None
+        except Exception as e:
+            yield url, None, str(e)
+
+def _extract_page(page: Page, url: str, collector: str = 'elements', settle: Optional[SettlePolicy] = None,
+                  blocker: Optional[ResourceBlocker] = None,
+                  sheet_memo: Optional[StylesheetMemo] = None,
+                  font_budget: Optional[FontBudget] = None,
+                  parse_fonts: bool = False,
+                  font_store: Optional[FontStore] = None,
+                  profiler: Optional[Profiler] = None,
+                  sampling: Optional[SamplingBudget] = None,
+                  style_sharing: bool = False) -> Dict[str, Any]:
+    """Loads url in page and extracts font information from it"""
+    
+    blocking_report = blocker.attach(page) if blocker else None
+    
+    # Track font file requests with their size, timing and cache details
+    network = FontNetworkMonitor(capture_bodies=parse_fonts or font_store is not None)
+    network.attach(page)
+    
+    # Navigate, then wait for fonts and lazy-loaded content as the settle policy dictates
+    with phase(profiler, 'settle', url):
+        settle_info = settle_page(page, url, settle)
+    if profiler is not None:
+        profiler.record_settle(settle_info, url)
+    
+    # Extract every section in a single round trip
+    script_options = {'collector': collector}
+    if sheet_memo is not None:
+        script_options['knownSheets'] = sheet_memo.known_keys()
+    if parse_fonts:
+        script_options['codepoints'] = True
+    if sampling is not None:
+        script_options['sample'] = sampling.script_options()
+    if style_sharing:
+        script_options['styleSharing'] = True
+    with phase(profiler, 'evaluate', url):
+        sections = page.evaluate(PAGE_EXTRACTION_SCRIPT, script_options)
+    if profiler is not None:
+        record_page_counters(profiler, url, sections)
+    if sheet_memo is not None:
+        sections = sheet_memo.expand(sections)
+    
+    # The same script runs in every child frame
+    with phase(profiler, 'iframes', url):
+        frames = _evaluate_frames(page, frame_script_options(collector, parse_fonts, sampling, style_sharing))
+    if profiler is not None:
+        profiler.count('frames', len(frames), url)
+    
+    font_data = build_font_data(url, sections, frames, network.files)
+    font_data['settle'] = settle_info
+    font_data['fontNetwork'] = network.report(font_data, font_budget)
+    with phase(profiler, 'fontFiles', url):
+        if parse_fonts:
+            font_data['fontBinaries'] = analyze_font_binaries(network.bodies, font_data, font_store)
+        elif font_store is not None:
+            for file_url, body in network.bodies.items():
+                font_store.add(file_url, body)
+    if profiler is not None:
+        profiler.count('fontFiles', font_data['fontNetwork']['totals']['files'], url)
+        profiler.count('fontTransferBytes', font_data['fontNetwork']['totals']['transferBytes'], url)
+    if blocking_report is not None:
+        font_data['resourceBlocking'] = blocking_report
+    if 'stylesheetMemo' in sections:
+        font_data['stylesheetMemo'] = sections['stylesheetMemo']
+    return font_data
+
+def _evaluate_frames(page: Page, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Runs PAGE_EXTRACTION_SCRIPT in every child frame, one after another, and returns frame_results
+
+    The sync API waits for each call, so this is only used with a caller's BrowserPool;
+    analyze_fonts without one, batches and worker processes use async_extractor, which
+    evaluates the frames concurrently.
+    """
+    frames = child_frames(page)
+    results = []
+    for frame in frames:
+        try:
+            results.append(frame.evaluate(PAGE_EXTRACTION_SCRIPT, options))
+        except Exception as e:
+            results.append(e)
+    return frame_results(frames, results)
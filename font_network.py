@@ -0,0 +1,283 @@
+from typing import Dict, List, Any, Optional
+from urllib.parse import urljoin, urlsplit
+import re
+
+FONT_FILE_EXTENSIONS = ['.woff', '.woff2', '.ttf', '.otf', '.eot']
+
+# Headers CDNs use to say whether they served the file from their cache
+CDN_CACHE_HEADERS = ['cf-cache-status', 'x-cache', 'x-cache-status', 'x-proxy-cache', 'cdn-cache']
+
+MAX_AGE_REGEX = re.compile(r'max-age\s*=\s*(\d+)', re.IGNORECASE)
+SRC_URL_REGEX = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+
+def is_font_file(url: str, content_type: str) -> bool:
+    """True for font file responses; SVG images are not counted even with a font-ish type"""
+    url_path = url.lower()
+    content_type = content_type.lower()
+    if any(ext in url_path for ext in FONT_FILE_EXTENSIONS):
+        return True
+    return (('font' in content_type and 'svg' not in content_type) or 'woff' in content_type
+            or 'ttf' in content_type or 'opentype' in content_type)
+
+
+def font_file_entry(response) -> Optional[Dict[str, Any]]:
+    """Returns a fontFiles entry for a network response, or None if it is not a font file"""
+    content_type = response.headers.get('content-type', '').lower()
+    if not is_font_file(response.url, content_type):
+        return None
+    return {
+        'url': response.url,
+        'type': content_type or 'font',
+        'status': response.status
+    }
+
+
+class FontBudget:
+    """Weight and latency limits that produce warnings in the font network report"""
+
+    def __init__(self, max_page_bytes: int = 300 * 1024, max_family_bytes: int = 150 * 1024, max_files: int = 8,
+                 max_file_latency_ms: float = 1000, max_load_window_ms: float = 3000,
+                 min_cache_seconds: int = 7 * 24 * 3600):
+        self.max_page_bytes = max_page_bytes
+        self.max_family_bytes = max_family_bytes
+        self.max_files = max_files
+        self.max_file_latency_ms = max_file_latency_ms
+        self.max_load_window_ms = max_load_window_ms
+        self.min_cache_seconds = min_cache_seconds
+
+
+def _phase(timing: Dict[str, float], start: str, end: str) -> Optional[float]:
+    """Duration between two Resource Timing marks, or None when either was not recorded (-1)"""
+    a, b = timing.get(start, -1), timing.get(end, -1)
+    if a is None or b is None or a < 0 or b < 0:
+        return None
+    return round(b - a, 1)
+
+
+def _timing_phases(timing: Dict[str, float]) -> Dict[str, Optional[float]]:
+    return {
+        'dnsMs': _phase(timing, 'domainLookupStart', 'domainLookupEnd'),
+        'connectMs': _phase(timing, 'connectStart', 'connectEnd'),
+        'tlsMs': _phase(timing, 'secureConnectionStart', 'connectEnd'),
+        'ttfbMs': _phase(timing, 'requestStart', 'responseStart'),
+        'downloadMs': _phase(timing, 'responseStart', 'responseEnd'),
+        'totalMs': round(timing['responseEnd'], 1) if timing.get('responseEnd', -1) >= 0 else None
+    }
+
+
+def _cache_status(headers: Dict[str, str]) -> Optional[str]:
+    for name in CDN_CACHE_HEADERS:
+        value = headers.get(name, '').lower()
+        if 'hit' in value:
+            return 'hit'
+        if 'miss' in value or 'expired' in value:
+            return 'miss'
+    return None
+
+
+class FontNetworkMonitor:
+    """Records transfer size, timing phases, cache headers and Referer of every font request on a page.
+
+    Attach before navigation. Answered requests are also listed in `files` as fontFiles
+    entries, so no separate response listener is needed. With capture_bodies the decoded font bytes are kept in
+    `bodies` (url -> bytes) for later parsing; otherwise a body is only read when the
+    response was content-encoded and its decoded size cannot be known any other way.
+    """
+
+    def __init__(self, capture_bodies: bool = False):
+        self.capture_bodies = capture_bodies
+        self.entries = []
+        self.files = []
+        self.bodies = {}
+        self._first_start = None
+
+    def _entry(self, request, response, sizes: Dict[str, int], timing: Dict[str, float]) -> Dict[str, Any]:
+        headers = response.headers
+        start = timing.get('startTime')
+        if start is not None and (self._first_start is None or start < self._first_start):
+            self._first_start = start
+        body_bytes = sizes.get('responseBodySize', 0)
+        max_age = MAX_AGE_REGEX.search(headers.get('cache-control', ''))
+        return {
+            'url': request.url,
+            'status': response.status,
+            'type': headers.get('content-type', ''),
+            'transferBytes': body_bytes + sizes.get('responseHeadersSize', 0),
+            'bodyBytes': body_bytes,
+            'decodedBytes': body_bytes,
+            'contentEncoding': headers.get('content-encoding'),
+            'cacheControl': headers.get('cache-control'),
+            'maxAgeSeconds': int(max_age.group(1)) if max_age else None,
+            'cacheStatus': _cache_status(headers),
+            'age': headers.get('age'),
+            'fromServiceWorker': response.from_service_worker,
+            # Usually the stylesheet that declared the font; only its origin under a strict referrer policy
+            'referer': request.headers.get('referer'),
+            'startTime': start,
+            'timing': _timing_phases(timing)
+        }
+
+    def _needs_body(self, entry: Dict[str, Any]) -> bool:
+        return self.capture_bodies or bool(entry['contentEncoding'])
+
+    def _store_body(self, entry: Dict[str, Any], body: bytes):
+        entry['decodedBytes'] = len(body)
+        if self.capture_bodies:
+            self.bodies[entry['url']] = body
+
+    def _failed(self, request) -> Dict[str, Any]:
+        return {'url': request.url, 'status': None, 'failure': request.failure, 'transferBytes': 0,
+                'bodyBytes': 0, 'decodedBytes': 0, 'referer': request.headers.get('referer'),
+                'startTime': None, 'timing': {}}
+
+    def attach(self, page):
+        """Installs the listeners on a sync page"""
+
+        def on_finished(request):
+            response = request.response()
+            file_entry = font_file_entry(response) if response is not None else None
+            if file_entry is None:
+                return
+            self.files.append(file_entry)
+            entry = self._entry(request, response, request.sizes(), request.timing)
+            if self._needs_body(entry):
+                try:
+                    self._store_body(entry, response.body())
+                except Exception:
+                    # Body no longer available (e.g. the page navigated away)
+                    pass
+            self.entries.append(entry)
+
+        def on_failed(request):
+            if is_font_file(request.url, ''):
+                self.entries.append(self._failed(request))
+
+        page.on('requestfinished', on_finished)
+        page.on('requestfailed', on_failed)
+
+    def attach_async(self, page):
+        """Installs the listeners on an async page"""
+
+        async def on_finished(request):
+            response = await request.response()
+            file_entry = font_file_entry(response) if response is not None else None
+            if file_entry is None:
+                return
+            self.files.append(file_entry)
+            entry = self._entry(request, response, await request.sizes(), request.timing)
+            if self._needs_body(entry):
+                try:
+                    self._store_body(entry, await response.body())
+                except Exception:
+                    pass
+            self.entries.append(entry)
+
+        def on_failed(request):
+            if is_font_file(request.url, ''):
+                self.entries.append(self._failed(request))
+
+        page.on('requestfinished', on_finished)
+        page.on('requestfailed', on_failed)
+
+    def report(self, font_data: Dict[str, Any], budget: Optional[FontBudget] = None) -> Dict[str, Any]:
+        """Builds the fontNetwork report section for a page from the recorded requests"""
+        return build_font_network_report(self.entries, font_data, budget, self._first_start)
+
+
+def families_by_url(font_data: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Maps each font file URL named in an @font-face src to the declared families"""
+    families = {}
+    for face in font_data.get('fontFaces', []):
+        family = face.get('fontFamily', '').strip('\'"')
+        for src in SRC_URL_REGEX.findall(face.get('src', '')):
+            src_url = urljoin(font_data.get('url', ''), src.strip())
+            families.setdefault(src_url, [])
+            if family not in families[src_url]:
+                families[src_url].append(family)
+    return families
+
+
+def match_families(url: str, file_families: Dict[str, List[str]]) -> List[str]:
+    """Families declared for a downloaded font file, given the families_by_url mapping"""
+    if url in file_families:
+        return file_families[url]
+    # src URLs may be relative to a stylesheet rather than the page; fall back to the path
+    path = urlsplit(url).path
+    for src_url, families in file_families.items():
+        if path and urlsplit(src_url).path == path:
+            return families
+    return []
+
+
+def build_font_network_report(entries: List[Dict[str, Any]], font_data: Dict[str, Any],
+                              budget: Optional[FontBudget] = None,
+                              first_start: Optional[float] = None) -> Dict[str, Any]:
+    """Aggregates recorded font requests into per-page and per-family budgets with warnings
+
+    fontLoadWindowMs runs from the start of the first font request to the end of the last.
+    """
+    budget = budget or FontBudget()
+    file_families = families_by_url(font_data)
+    used_families = {f.get('fontFamily', '') for f in font_data.get('fonts', [])}
+
+    files = []
+    by_family = {}
+    for entry in entries:
+        entry = dict(entry)
+        entry['families'] = match_families(entry['url'], file_families)
+        # A file that maps to no @font-face family is counted as used: it was requested for something
+        entry['used'] = not entry['families'] or any(f in used_families for f in entry['families'])
+        total_ms = entry.get('timing', {}).get('totalMs')
+        if first_start is not None and entry.get('startTime') is not None and total_ms is not None:
+            entry['completeMs'] = round(entry['startTime'] - first_start + total_ms, 1)
+        files.append(entry)
+        for family in entry['families'] or ['(unmatched)']:
+            stats = by_family.setdefault(family, {'files': 0, 'transferBytes': 0, 'decodedBytes': 0, 'maxLatencyMs': 0})
+            stats['files'] += 1
+            stats['transferBytes'] += entry['transferBytes']
+            stats['decodedBytes'] += entry['decodedBytes']
+            stats['maxLatencyMs'] = max(stats['maxLatencyMs'], total_ms or 0)
+
+    loaded = [f for f in files if f.get('status')]
+    totals = {
+        'files': len(files),
+        'failed': len(files) - len(loaded),
+        'transferBytes': sum(f['transferBytes'] for f in files),
+        'decodedBytes': sum(f['decodedBytes'] for f in files),
+        'unusedFiles': sum(1 for f in files if not f['used']),
+        'unusedBytes': sum(f['transferBytes'] for f in files if not f['used']),
+        'slowestMs': max((f['timing'].get('totalMs') or 0 for f in loaded), default=0),
+        'fontLoadWindowMs': max((f.get('completeMs', 0) for f in loaded), default=0)
+    }
+
+    warnings = []
+    if totals['transferBytes'] > budget.max_page_bytes:
+        warnings.append(f"Fonts weigh {totals['transferBytes'] // 1024} KB, over the {budget.max_page_bytes // 1024} KB page budget")
+    if totals['files'] > budget.max_files:
+        warnings.append(f"{totals['files']} font files requested, over the budget of {budget.max_files}")
+    if totals['fontLoadWindowMs'] > budget.max_load_window_ms:
+        warnings.append(f"Fonts took {totals['fontLoadWindowMs']:.0f} ms from first request to last byte, "
+                        f"over the {budget.max_load_window_ms:.0f} ms budget")
+    for family, stats in by_family.items():
+        if stats['transferBytes'] > budget.max_family_bytes:
+            warnings.append(f"{family}: {stats['transferBytes'] // 1024} KB across {stats['files']} file(s), "
+                            f"over the {budget.max_family_bytes // 1024} KB family budget")
+    for f in files:
+        name = f['url'].rsplit('/', 1)[-1].split('?')[0] or f['url']
+        if not f.get('status'):
+            warnings.append(f"{name}: request failed ({f.get('failure')})")
+            continue
+        if not f['used']:
+            warnings.append(f"{name}: downloaded but its family is not rendered ({f['transferBytes'] / 1024:.1f} KB wasted)")
+        total_ms = f['timing'].get('totalMs')
+        if total_ms and total_ms > budget.max_file_latency_ms:
+            warnings.append(f"{name}: took {total_ms:.0f} ms")
+        if f.get('maxAgeSeconds') is not None and f['maxAgeSeconds'] < budget.min_cache_seconds:
+            warnings.append(f"{name}: cached for only {f['maxAgeSeconds']} s")
+        elif not f.get('cacheControl'):
+            warnings.append(f"{name}: no Cache-Control header")
+        if re.search(r'\.(ttf|otf|eot)(\?|$)', f['url'].lower()):
+            warnings.append(f"{name}: served as {name.rsplit('.', 1)[-1].split('?')[0].upper()}; WOFF2 would be smaller")
+
+    return {'files': files, 'totals': totals, 'byFamily': by_family, 'warnings': warnings}
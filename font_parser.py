@@ -0,0 +1,384 @@
+from typing import Dict, List, Any, Optional, Tuple, Union, TYPE_CHECKING
+from collections import OrderedDict
+from bisect import bisect_right
+import hashlib
+import mmap
+import struct
+import threading
+import zlib
+from font_network import families_by_url, match_families
+
+if TYPE_CHECKING:
+    from font_store import FontStore
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# WOFF2 table directory entries name their tag by index into this list (63 means explicit tag)
+WOFF2_KNOWN_TAGS = [
+    'cmap', 'head', 'hhea', 'hmtx', 'maxp', 'name', 'OS/2', 'post', 'cvt ', 'fpgm', 'glyf', 'loca', 'prep',
+    'CFF ', 'VORG', 'EBDT', 'EBLC', 'gasp', 'hdmx', 'kern', 'LTSH', 'PCLT', 'VDMX', 'vhea', 'vmtx', 'BASE',
+    'GDEF', 'GPOS', 'GSUB', 'EBSC', 'JSTF', 'MATH', 'CBDT', 'CBLC', 'COLR', 'CPAL', 'SVG ', 'sbix', 'acnt',
+    'avar', 'bdat', 'bloc', 'bsln', 'cvar', 'fdsc', 'feat', 'fmtx', 'fvar', 'gvar', 'hsty', 'just', 'lcar',
+    'mort', 'morx', 'opbd', 'prop', 'trak', 'Zapf', 'Silf', 'Glat', 'Gloc', 'Feat', 'Sill'
+]
+
+# Only these tables are read; everything else is skipped without copying
+PARSED_TABLES = {'cmap', 'maxp', 'name', 'OS/2', 'fvar'}
+GLYPH_TABLES = {'glyf', 'CFF ', 'CFF2'}
+
+NAME_IDS = {1: 'familyName', 2: 'subfamilyName', 4: 'fullName', 5: 'version', 16: 'typographicFamily'}
+
+# Parsed results kept per run, keyed by SHA-256 of the font bytes
+PARSE_CACHE_SIZE = 512
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+_parse_stats = {'parsed': 0, 'cacheHits': 0, 'errors': 0}
+
+
+def _read_base128(data: memoryview, pos: int) -> Tuple[int, int]:
+    """Reads a WOFF2 UIntBase128, returning (value, new position)"""
+    value = 0
+    for i in range(5):
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+    raise ValueError('Invalid UIntBase128')
+
+
+def _sfnt_tables(data: memoryview) -> Tuple[str, Dict[str, memoryview], Dict[str, int]]:
+    """Returns (flavor, tables, table lengths) of a TrueType/OpenType font or the first font of a collection"""
+    offset = 0
+    if bytes(data[0:4]) == b'ttcf':
+        offset = struct.unpack_from('>I', data, 12)[0]
+    flavor = 'cff' if bytes(data[offset:offset + 4]) == b'OTTO' else 'truetype'
+    num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+    tables, lengths = {}, {}
+    for i in range(num_tables):
+        tag, _, table_offset, length = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+        tag = tag.decode('latin-1')
+        lengths[tag] = length
+        if tag in PARSED_TABLES:
+            tables[tag] = data[table_offset:table_offset + length]
+    return flavor, tables, lengths
+
+
+def _woff_tables(data: memoryview) -> Tuple[str, Dict[str, memoryview], Dict[str, int]]:
+    flavor = 'cff' if bytes(data[4:8]) == b'OTTO' else 'truetype'
+    num_tables = struct.unpack_from('>H', data, 12)[0]
+    tables, lengths = {}, {}
+    for i in range(num_tables):
+        tag, offset, comp_length, orig_length, _ = struct.unpack_from('>4sIIII', data, 44 + 20 * i)
+        tag = tag.decode('latin-1')
+        lengths[tag] = orig_length
+        if tag in PARSED_TABLES:
+            table = data[offset:offset + comp_length]
+            tables[tag] = memoryview(zlib.decompress(table)) if comp_length < orig_length else table
+    return flavor, tables, lengths
+
+
+def _woff2_tables(data: memoryview) -> Tuple[str, Dict[str, memoryview], Dict[str, int]]:
+    if brotli is None:
+        raise ValueError('WOFF2 parsing needs brotli: pip install brotli')
+    flavor_tag = bytes(data[4:8])
+    if flavor_tag == b'ttcf':
+        raise ValueError('WOFF2 font collections are not supported')
+    flavor = 'cff' if flavor_tag == b'OTTO' else 'truetype'
+    num_tables = struct.unpack_from('>H', data, 12)[0]
+    total_compressed = struct.unpack_from('>I', data, 20)[0]
+
+    entries = []
+    pos = 48
+    for _ in range(num_tables):
+        flags = data[pos]
+        pos += 1
+        if flags & 0x3F == 63:
+            tag = bytes(data[pos:pos + 4]).decode('latin-1')
+            pos += 4
+        else:
+            tag = WOFF2_KNOWN_TAGS[flags & 0x3F]
+        transform = flags >> 6
+        orig_length, pos = _read_base128(data, pos)
+        stored_length = orig_length
+        # glyf/loca are transformed at version 0; every other table at any non-zero version
+        if (tag in ('glyf', 'loca') and transform == 0) or (tag not in ('glyf', 'loca') and transform != 0):
+            stored_length, pos = _read_base128(data, pos)
+        entries.append((tag, orig_length, stored_length))
+
+    stream = memoryview(brotli.decompress(bytes(data[pos:pos + total_compressed])))
+    tables, lengths = {}, {}
+    offset = 0
+    for tag, orig_length, stored_length in entries:
+        lengths[tag] = orig_length
+        if tag in PARSED_TABLES:
+            tables[tag] = stream[offset:offset + stored_length]
+        offset += stored_length
+    return flavor, tables, lengths
+
+
+def _names(table: memoryview, wanted: Dict[int, str]) -> Dict[int, str]:
+    """Reads name records, preferring Windows English (UTF-16BE) over Mac Roman entries"""
+    count, string_offset = struct.unpack_from('>HH', table, 2)
+    found = {}
+    for i in range(count):
+        platform, encoding, language, name_id, length, offset = struct.unpack_from('>HHHHHH', table, 6 + 12 * i)
+        if name_id not in wanted:
+            continue
+        raw = bytes(table[string_offset + offset:string_offset + offset + length])
+        if platform == 3 or platform == 0:
+            rank = 0 if platform == 3 and language == 0x409 else 1
+            text = raw.decode('utf-16-be', errors='replace')
+        elif platform == 1 and encoding == 0:
+            rank = 2
+            text = raw.decode('mac-roman', errors='replace')
+        else:
+            continue
+        if name_id not in found or rank < found[name_id][0]:
+            found[name_id] = (rank, text)
+    return {name_id: text for name_id, (_, text) in found.items()}
+
+
+def _fvar(table: memoryview) -> Tuple[List[Dict[str, Any]], int]:
+    axes_offset, _, axis_count, axis_size, instance_count = struct.unpack_from('>HHHHH', table, 4)
+    axes = []
+    for i in range(axis_count):
+        tag, min_value, default_value, max_value, _, name_id = struct.unpack_from('>4siiiHH', table, axes_offset + i * axis_size)
+        axes.append({
+            'tag': tag.decode('latin-1'),
+            'min': round(min_value / 65536, 3),
+            'default': round(default_value / 65536, 3),
+            'max': round(max_value / 65536, 3),
+            'nameId': name_id
+        })
+    return axes, instance_count
+
+
+def _cmap_ranges(table: memoryview) -> Optional[List[List[int]]]:
+    """Returns the mapped code points of the best Unicode subtable as sorted [start, end] ranges"""
+    num_subtables = struct.unpack_from('>H', table, 2)[0]
+    best = None
+    for i in range(num_subtables):
+        platform, encoding, offset = struct.unpack_from('>HHI', table, 4 + 8 * i)
+        fmt = struct.unpack_from('>H', table, offset)[0]
+        unicode_subtable = platform == 0 or (platform == 3 and encoding in (1, 10))
+        if not unicode_subtable or fmt not in (4, 12):
+            continue
+        if best is None or (fmt == 12 and best[0] == 4):
+            best = (fmt, offset)
+    if best is None:
+        return None
+
+    fmt, offset = best
+    ranges = []
+    if fmt == 12:
+        groups = struct.unpack_from('>I', table, offset + 12)[0]
+        for i in range(groups):
+            start, end, _ = struct.unpack_from('>III', table, offset + 16 + 12 * i)
+            ranges.append((start, end))
+    else:
+        seg_count = struct.unpack_from('>H', table, offset + 6)[0] // 2
+        ends = struct.unpack_from(f'>{seg_count}H', table, offset + 14)
+        starts_at = offset + 16 + 2 * seg_count
+        starts = struct.unpack_from(f'>{seg_count}H', table, starts_at)
+        deltas = struct.unpack_from(f'>{seg_count}h', table, starts_at + 2 * seg_count)
+        range_offsets_at = starts_at + 4 * seg_count
+        range_offsets = struct.unpack_from(f'>{seg_count}H', table, range_offsets_at)
+        for seg in range(seg_count):
+            start, end = starts[seg], min(ends[seg], 0xFFFE)
+            if start > end:
+                continue
+            if range_offsets[seg] == 0:
+                ranges.append((start, end))
+                continue
+            # Glyph ids come from glyphIdArray; a zero id means the code point is unmapped
+            run_start = None
+            for code in range(start, end + 1):
+                glyph_at = range_offsets_at + 2 * seg + range_offsets[seg] + 2 * (code - start)
+                mapped = glyph_at + 2 <= len(table) and struct.unpack_from('>H', table, glyph_at)[0] != 0
+                if mapped and run_start is None:
+                    run_start = code
+                elif not mapped and run_start is not None:
+                    ranges.append((run_start, code - 1))
+                    run_start = None
+            if run_start is not None:
+                ranges.append((run_start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _parse(data: memoryview) -> Dict[str, Any]:
+    signature = bytes(data[0:4])
+    if signature == b'wOFF':
+        container = 'woff'
+        flavor, tables, lengths = _woff_tables(data)
+    elif signature == b'wOF2':
+        container = 'woff2'
+        flavor, tables, lengths = _woff2_tables(data)
+    elif signature in (b'\x00\x01\x00\x00', b'OTTO', b'true', b'ttcf'):
+        container = 'sfnt'
+        flavor, tables, lengths = _sfnt_tables(data)
+    else:
+        raise ValueError(f'Not a font file (signature {signature!r})')
+
+    info = {'container': container, 'outlines': flavor, 'bytes': len(data)}
+    if 'maxp' in tables:
+        info['glyphCount'] = struct.unpack_from('>H', tables['maxp'], 4)[0]
+    if 'OS/2' in tables:
+        info['weightClass'], info['widthClass'] = struct.unpack_from('>HH', tables['OS/2'], 4)
+
+    axes, instances = [], 0
+    if 'fvar' in tables:
+        axes, instances = _fvar(tables['fvar'])
+    wanted = dict(NAME_IDS)
+    wanted.update({axis['nameId']: axis['tag'] for axis in axes})
+    names = _names(tables['name'], wanted) if 'name' in tables else {}
+    for name_id, key in NAME_IDS.items():
+        if name_id in names:
+            info[key] = names[name_id]
+    for axis in axes:
+        axis['name'] = names.get(axis.pop('nameId'), axis['tag'])
+    info['isVariable'] = bool(axes)
+    info['axes'] = axes
+    info['namedInstances'] = instances
+
+    ranges = _cmap_ranges(tables['cmap']) if 'cmap' in tables else None
+    info['cmapRanges'] = ranges
+    info['mappedCodepoints'] = sum(end - start + 1 for start, end in ranges) if ranges else 0
+
+    # Share of the uncompressed font taken by outlines, used to estimate wasted glyph bytes
+    total = sum(lengths.values()) or 1
+    info['glyphDataShare'] = round(sum(lengths.get(tag, 0) for tag in GLYPH_TABLES) / total, 3)
+    return info
+
+
+def parse_font(data: Buffer, digest: Optional[str] = None) -> Dict[str, Any]:
+    """Parses the fvar, OS/2, cmap, maxp and name tables of a TTF/OTF/WOFF/WOFF2 font
+
+    Tables are sliced from a memoryview of data without copying (WOFF/WOFF2 tables are
+    decompressed first). Results are cached by SHA-256 of the bytes, so one file fetched by
+    many pages is parsed once; the returned dict is shared and must not be modified.
+    """
+    view = memoryview(data)
+    digest = digest or hashlib.sha256(view).hexdigest()
+    with _parse_cache_lock:
+        cached = _parse_cache.get(digest)
+        if cached is not None:
+            _parse_cache.move_to_end(digest)
+            _parse_stats['cacheHits'] += 1
+            return cached
+    try:
+        info = _parse(view)
+    except Exception as e:
+        with _parse_cache_lock:
+            _parse_stats['errors'] += 1
+        info = {'error': str(e), 'bytes': len(view)}
+    info['sha256'] = digest
+    with _parse_cache_lock:
+        _parse_stats['parsed'] += 1
+        _parse_cache[digest] = info
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return info
+
+
+def parse_font_file(path: str) -> Dict[str, Any]:
+    """Parses a font file on disk through a read-only memory map"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            info = parse_font(mapped)
+            return info
+
+
+def parse_cache_stats() -> Dict[str, Any]:
+    with _parse_cache_lock:
+        return dict(_parse_stats, entries=len(_parse_cache))
+
+
+def covers(ranges: Optional[List[List[int]]], codepoint: int) -> bool:
+    if not ranges:
+        return False
+    i = bisect_right(ranges, [codepoint, float('inf')]) - 1
+    return i >= 0 and ranges[i][0] <= codepoint <= ranges[i][1]
+
+
+def analyze_font_binaries(bodies: Dict[str, Buffer], font_data: Dict[str, Any],
+                          store: Optional['FontStore'] = None) -> Dict[str, Any]:
+    """Builds the fontBinaries report section from downloaded font bytes (url -> bytes)
+
+    Each file is matched to its @font-face families; a family's rendered characters (the
+    'codepoints' string of its fonts entry) are checked against the file's cmap. Glyphs
+    mapped but never rendered are estimated as wasted bytes, in proportion to the outline
+    tables' share of the font. The 'codepoints' strings are removed from font_data['fonts'].
+    With a FontStore the files are stored and their parse results reused across runs.
+    """
+    file_families = families_by_url(font_data)
+    rendered = {font['fontFamily']: font.pop('codepoints', '') for font in font_data.get('fonts', [])}
+
+    files = []
+    by_family = {}
+    for url, body in bodies.items():
+        if store is not None:
+            digest = store.add(url, body)
+            # Errors such as a missing brotli are not kept, so the file is parsed again once fixed
+            info = store.metadata(digest, 'parse', lambda: parse_font(body, digest),
+                                  keep=lambda result: 'error' not in result)
+        else:
+            info = parse_font(body)
+        families = match_families(url, file_families)
+        entry = {'url': url, 'families': families}
+        entry.update({key: value for key, value in info.items() if key != 'cmapRanges'})
+        ranges = info.get('cmapRanges')
+        if ranges:
+            chars = set().union(*(rendered.get(family, '') for family in families))
+            used = sum(1 for ch in chars if covers(ranges, ord(ch)))
+            mapped = info['mappedCodepoints']
+            entry['renderedCodepoints'] = used
+            entry['glyphUsage'] = round(used / mapped, 4) if mapped else None
+            entry['wastedGlyphBytes'] = int(len(body) * info['glyphDataShare'] * (1 - used / mapped)) if mapped else 0
+        files.append(entry)
+
+        for family in families:
+            stats = by_family.setdefault(family, {'files': 0, 'isVariable': False, 'axes': [], 'weights': [], 'ranges': []})
+            stats['files'] += 1
+            if info.get('isVariable'):
+                stats['isVariable'] = True
+                stats['axes'].extend(axis for axis in info['axes'] if axis not in stats['axes'])
+            if info.get('weightClass') and info['weightClass'] not in stats['weights']:
+                stats['weights'].append(info['weightClass'])
+            if ranges:
+                stats['ranges'].append(ranges)
+
+    for family, stats in by_family.items():
+        all_ranges = stats.pop('ranges')
+        stats['weights'].sort()
+        chars = rendered.get(family, '')
+        if not chars or not all_ranges:
+            continue
+        # Covered when any of the family's files (e.g. unicode-range subsets) maps the character
+        missing = [ch for ch in chars if not any(covers(ranges, ord(ch)) for ranges in all_ranges)]
+        stats['renderedCodepoints'] = len(chars)
+        stats['missingCodepoints'] = ''.join(missing)
+        stats['coverage'] = round(1 - len(missing) / len(chars), 4)
+
+    parsed = [f for f in files if 'error' not in f]
+    totals = {
+        'files': len(files),
+        'parsed': len(parsed),
+        'variableFiles': sum(1 for f in parsed if f['isVariable']),
+        'bytes': sum(f['bytes'] for f in files),
+        'wastedGlyphBytes': sum(f.get('wastedGlyphBytes', 0) for f in parsed)
+    }
+    return {'files': files, 'byFamily': by_family, 'totals': totals, 'parseCache': parse_cache_stats()}
@@ -0,0 +1,203 @@
+from typing import Dict, List, Any, Optional, Callable
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from cache import DEFAULT_CACHE_PATH
+
+DEFAULT_FONT_STORE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), 'fonts')
+
+
+class FontStore:
+    """Content-addressed store of font files, keyed by the SHA-256 of their bytes.
+
+    Each unique binary is written once under objects/<2 hex>/<62 hex>; a SQLite index maps
+    every URL it was served from (aliases) to the digest and keeps per-digest metadata
+    computed by font-level analyses (e.g. the font_parser result), so that work is done
+    once per binary across pages and runs. When max_bytes is exceeded the least recently
+    used binaries are evicted together with their aliases and metadata. Safe to share
+    between threads.
+    """
+
+    def __init__(self, directory: str = DEFAULT_FONT_STORE_PATH, max_bytes: Optional[int] = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._run = {'observations': 0, 'observedBytes': 0, 'newBinaries': 0, 'duplicateObservations': 0,
+                     'duplicateBytes': 0, 'metadataHits': 0, 'metadataMisses': 0, 'evictions': 0}
+        self._seen_this_run = set()
+
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS fonts (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                observations INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS aliases (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                observations INTEGER NOT NULL,
+                last_seen REAL NOT NULL
+            )
+        ''')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS metadata (
+                sha256 TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (sha256, kind)
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS fonts_accessed ON fonts (accessed_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS aliases_sha256 ON aliases (sha256)')
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.directory, 'objects', digest[:2], digest[2:])
+
+    def add(self, url: str, data: bytes) -> str:
+        """Records that url served data, storing the bytes if they are new; returns the SHA-256"""
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            known = self._db.execute('SELECT 1 FROM fonts WHERE sha256 = ?', (digest,)).fetchone() is not None
+            if not known or not os.path.exists(self.path_for(digest)):
+                self._write_object(digest, data)
+            if known:
+                self._db.execute('UPDATE fonts SET observations = observations + 1, accessed_at = ? WHERE sha256 = ?',
+                                 (now, digest))
+            else:
+                self._db.execute('INSERT INTO fonts (sha256, size, observations, created_at, accessed_at) '
+                                 'VALUES (?, ?, 1, ?, ?)', (digest, len(data), now, now))
+                self._run['newBinaries'] += 1
+            self._db.execute(
+                'INSERT INTO aliases (url, sha256, observations, last_seen) VALUES (?, ?, 1, ?) '
+                'ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, observations = observations + 1, '
+                'last_seen = excluded.last_seen', (url, digest, now)
+            )
+            self._run['observations'] += 1
+            self._run['observedBytes'] += len(data)
+            # A duplicate is a binary already seen earlier in the run or stored by a previous run
+            if known or digest in self._seen_this_run:
+                self._run['duplicateObservations'] += 1
+                self._run['duplicateBytes'] += len(data)
+            self._seen_this_run.add(digest)
+            if not known:
+                self._evict(keep=digest)
+        return digest
+
+    def _write_object(self, digest: str, data: bytes):
+        """Writes a binary atomically, so a crash never leaves a truncated object; caller holds the lock"""
+        path = self.path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def digest_for_url(self, url: str) -> Optional[str]:
+        """SHA-256 of the binary last served from url, or None if url was never seen"""
+        with self._lock:
+            row = self._db.execute('SELECT sha256 FROM aliases WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def aliases(self, digest: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT url FROM aliases WHERE sha256 = ? ORDER BY observations DESC',
+                                    (digest,)).fetchall()
+        return [row[0] for row in rows]
+
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._db.execute('UPDATE fonts SET accessed_at = ? WHERE sha256 = ?', (time.time(), digest))
+        return data
+
+    def get_metadata(self, digest: str, kind: str) -> Optional[Any]:
+        """Returns the stored result of analysis `kind` for a binary, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT value FROM metadata WHERE sha256 = ? AND kind = ?', (digest, kind)).fetchone()
+            self._run['metadataHits' if row else 'metadataMisses'] += 1
+        return json.loads(row[0]) if row else None
+
+    def put_metadata(self, digest: str, kind: str, value: Any):
+        with self._lock:
+            if self._db.execute('SELECT 1 FROM fonts WHERE sha256 = ?', (digest,)).fetchone() is None:
+                # Evicted meanwhile; metadata without its binary would never be cleaned up
+                return
+            self._db.execute('INSERT OR REPLACE INTO metadata (sha256, kind, value) VALUES (?, ?, ?)',
+                             (digest, kind, json.dumps(value, separators=(',', ':'))))
+
+    def metadata(self, digest: str, kind: str, compute: Callable[[], Any],
+                 keep: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Returns the stored result of analysis `kind`, computing and storing it on a miss
+
+        Results that `keep` rejects, such as errors a later run may not hit, are returned but
+        not stored, and a stored one counts as a miss.
+        """
+        value = self.get_metadata(digest, kind)
+        if value is None or (keep is not None and not keep(value)):
+            value = compute()
+            if keep is None or keep(value):
+                self.put_metadata(digest, kind, value)
+        return value
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drops least recently used binaries until under max_bytes; caller holds the lock"""
+        if self.max_bytes is None:
+            return
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM fonts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self._db.execute('SELECT sha256, size FROM fonts ORDER BY accessed_at').fetchall():
+            if digest == keep:
+                continue
+            self._db.execute('DELETE FROM fonts WHERE sha256 = ?', (digest,))
+            self._db.execute('DELETE FROM aliases WHERE sha256 = ?', (digest,))
+            self._db.execute('DELETE FROM metadata WHERE sha256 = ?', (digest,))
+            try:
+                os.remove(self.path_for(digest))
+                os.rmdir(os.path.dirname(self.path_for(digest)))
+            except OSError:
+                # Missing object, or its directory still holds other binaries
+                pass
+            self._run['evictions'] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        """Store contents plus this run's duplication figures"""
+        with self._lock:
+            binaries, stored_bytes, observations = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(observations), 0) FROM fonts').fetchone()
+            aliases = self._db.execute('SELECT COUNT(*) FROM aliases').fetchone()[0]
+            run = dict(self._run)
+        run['uniqueBinaries'] = len(self._seen_this_run)
+        run['duplicateRate'] = round(run['duplicateObservations'] / run['observations'], 3) if run['observations'] else None
+        return {
+            'binaries': binaries,
+            'bytes': stored_bytes,
+            'aliases': aliases,
+            'observations': observations,
+            # Average number of times each stored binary has been downloaded, across all runs
+            'observationsPerBinary': round(observations / binaries, 2) if binaries else None,
+            'run': run
+        }
+
+    def close(self):
+        self._db.close()
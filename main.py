@@ -1,25 +1,166 @@
 #!/usr/bin/env python3
 
+import asyncio
 import click
+import json as jsonlib
 import os
+import signal
 import sys
 from rich.console import Console
 from rich.panel import Panel
-from font_extractor import analyze_fonts
+from font_extractor import analyze_fonts, COLLECTORS, SamplingBudget
+from settle import SettlePolicy, SETTLE_POLICIES
+from resource_blocking import ResourceBlocker, DEFAULT_BLOCKED_TYPES
+from font_network import FontBudget
+from font_store import FontStore
 from ai_analyzer import get_ai_analysis
-from output_formatter import format_output
+from ai_batch import DEFAULT_BATCH_TOKEN_CEILING
+from batch import read_url_list, run_batch, JsonlWriter
+from site_profile import crawl_site
+from cache import ResultCache, ResponseCache, DEFAULT_CACHE_PATH, options_key
+from prompt_builder import DEFAULT_TOKEN_BUDGET
+from output_formatter import format_output, NdjsonWriter
+from typography_metrics import page_metrics, reaches_score
+from columnar_export import ColumnarExporter, EXPORT_FORMATS
+from profiling import Profiler
+from worker_pool import WorkerPool, DEFAULT_URL_TIMEOUT
 
 console = Console()
 
 @click.command()
-@click.argument('url')
+@click.argument('url', required=False)
 @click.option('--api-key', envvar='OPENAI_API_KEY', help='OpenAI API key (or set OPENAI_API_KEY env var)')
 @click.option('--model', default='gpt-4o-mini', help='OpenAI model to use')
 @click.option('--json', is_flag=True, help='Output results as JSON')
+@click.option('--ndjson', is_flag=True, help='Stream results to stdout as newline-delimited JSON (progress goes to stderr)')
+@click.option('--by-section', is_flag=True, help='With --ndjson: one record per font family, @font-face rule, ... instead of per page (not with --input)')
+@click.option('--compact', is_flag=True, help='With --ndjson or batch mode: leave empty sections out of records')
 @click.option('--verbose', is_flag=True, help='Show verbose output')
-def main(url, api_key, model, json, verbose):
+@click.option('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET, show_default=True,
+              help='Maximum prompt tokens sent to the AI; the font data is trimmed to fit')
+@click.option('--collector', type=click.Choice(COLLECTORS), default='elements', show_default=True,
+              help='How font usage is counted: every element containing text, or only elements owning text nodes')
+@click.option('--sample-elements', type=int, default=None,
+              help='On huge pages, style at most this many elements (a stratified sample) and estimate usage counts')
+@click.option('--sample-ms', type=float, default=None,
+              help='On huge pages, stop styling elements after this many milliseconds and estimate usage counts')
+@click.option('--sample-seed', type=int, default=1, show_default=True, help='Random seed for --sample-elements/--sample-ms')
+@click.option('--style-sharing', is_flag=True,
+              help='Resolve styles once per tag, id, class list, inline style, first/last-child position, selector '
+                   'attributes and parent; faster on component-heavy pages. Pages with sibling, :nth-* or state '
+                   'selectors are extracted without sharing')
+@click.option('--settle', 'settle_policy', type=click.Choice(SETTLE_POLICIES), default='adaptive', show_default=True,
+              help='How to wait for the page to settle before extracting fonts')
+@click.option('--settle-budget', type=int, default=None,
+              help='Maximum milliseconds to spend settling after navigation (default depends on policy)')
+@click.option('--block-resources', is_flag=True, help='Block images, media and trackers while extracting')
+@click.option('--block-types', default=','.join(DEFAULT_BLOCKED_TYPES), show_default=True,
+              help='Comma-separated resource types to block with --block-resources')
+@click.option('--allow', multiple=True, help='Host or URL glob that is never blocked (repeatable)')
+@click.option('--deny', multiple=True, help='Host or URL glob that is always blocked (repeatable)')
+@click.option('--font-budget-kb', type=int, default=300, show_default=True,
+              help='Warn when a page downloads more font data than this')
+@click.option('--font-budget-ms', type=int, default=3000, show_default=True,
+              help='Warn when font downloads take longer than this from first request to last byte')
+@click.option('--parse-fonts', is_flag=True,
+              help='Parse downloaded font files for real axes, weights and glyph coverage of the page text '
+                   '(WOFF2 needs brotli)')
+@click.option('--font-store', 'font_store_dir',
+              help='Keep every downloaded font file once per unique binary in this directory, '
+                   'reusing parse results across pages and runs')
+@click.option('--font-store-max-mb', type=int, default=1024, show_default=True,
+              help='Evict least recently used font files from --font-store beyond this size')
+@click.option('--metrics', is_flag=True, help='Compute local type-scale, size, weight and line-height metrics (needs numpy)')
+@click.option('--skip-ai-above', type=float, default=None,
+              help='Skip the AI analysis of pages whose local consistency score (0-100) reaches this value')
+@click.option('--export', 'export_dir', help='Also write flattened variations, @font-face rules and font files '
+                                              'as columnar tables to this directory (needs pyarrow)')
+@click.option('--export-format', type=click.Choice(EXPORT_FORMATS), default='parquet', show_default=True,
+              help='Columnar table format for --export')
+@click.option('--input', 'input_path', help='Batch mode: file with one URL per line, or a sitemap.xml path/URL')
+@click.option('--output', 'output_path', default='results.jsonl', show_default=True,
+              help='Batch mode: JSONL file that results are streamed to')
+@click.option('--concurrency', type=int, default=4, show_default=True, help='Batch mode: pages analyzed at once')
+@click.option('--per-host', type=int, default=2, show_default=True, help='Batch mode: pages of one host analyzed at once')
+@click.option('--workers', type=int, default=0,
+              help='Batch mode: extract in this many separate processes, each with its own browser, so a page '
+                   'that crashes or hangs only takes down its worker (replaces --concurrency)')
+@click.option('--url-timeout', type=float, default=DEFAULT_URL_TIMEOUT, show_default=True,
+              help='Batch mode with --workers: fail a page and restart its worker after this many seconds')
+@click.option('--worker-memory-mb', type=int, default=None,
+              help='Batch mode with --workers: restart a worker once it and its browser use more memory than this')
+@click.option('--site-profile', 'site_profile_path',
+              help='Site mode: analyze the --input pages of one site in turn, reusing stylesheet results, '
+                   'and write the merged site-wide profile to this JSON file')
+@click.option('--no-resume', is_flag=True, help='Batch mode: re-analyze URLs already present in the output file')
+@click.option('--ai-concurrency', type=int, default=2, show_default=True, help='Batch mode: AI requests in flight at once')
+@click.option('--queue-size', type=int, default=8, show_default=True,
+              help='Batch mode: extracted pages allowed to wait for AI analysis before extraction pauses')
+@click.option('--rpm', type=int, default=None, help='Batch mode: maximum OpenAI requests per minute')
+@click.option('--tpm', type=int, default=None, help='Batch mode: maximum OpenAI prompt tokens per minute')
+@click.option('--ai-batch-size', type=int, default=1, show_default=True,
+              help='Batch mode: pack up to this many waiting pages into one AI request')
+@click.option('--ai-batch-tokens', type=int, default=DEFAULT_BATCH_TOKEN_CEILING, show_default=True,
+              help='Batch mode: prompt token ceiling for a packed AI request')
+@click.option('--profile', is_flag=True, help='Print where the time went: per-phase timings and page counters')
+@click.option('--profile-trace', 'profile_trace',
+              help='Write the phase timings to this Chrome trace file (open in chrome://tracing or Perfetto)')
+@click.option('--no-cache', is_flag=True, help='Neither read nor write the result cache')
+@click.option('--refresh', is_flag=True, help='Ignore cached results but store the fresh ones')
+@click.option('--cache-path', default=DEFAULT_CACHE_PATH, show_default=True, help='SQLite result cache file')
+@click.option('--cache-ttl', type=float, default=7 * 24, show_default=True, help='Hours before a cached result expires')
+def main(url, api_key, model, json, ndjson, by_section, compact, verbose, token_budget, collector, sample_elements, sample_ms, sample_seed, style_sharing, settle_policy, settle_budget,
+         block_resources, block_types, allow, deny, font_budget_kb, font_budget_ms, parse_fonts, font_store_dir, font_store_max_mb, metrics, skip_ai_above, export_dir, export_format, input_path, output_path, concurrency, per_host, workers, url_timeout, worker_memory_mb, site_profile_path, no_resume,
+         ai_concurrency, queue_size, rpm, tpm, ai_batch_size, ai_batch_tokens, profile, profile_trace, no_cache, refresh, cache_path, cache_ttl):
     """AI-powered web font analyzer using Chromium (Playwright for Python)"""
+    profiler = Profiler() if profile or profile_trace else None
+    exporter = None
     try:
+        if not url and not input_path:
+            raise click.UsageError('Provide a URL or --input with a URL list or sitemap')
+        if by_section and input_path:
+            raise click.UsageError('--by-section applies to --ndjson output of a single URL, not to --input')
+        if ndjson or output_path == '-':
+            # stdout carries only the records
+            console.stderr = True
+        
+        settle = SettlePolicy(settle_policy, max_budget_ms=settle_budget)
+        blocker = None
+        if block_resources or deny:
+            blocker = ResourceBlocker(block_types=[t.strip() for t in block_types.split(',') if t.strip()] if block_resources else [],
+                                      block_trackers=block_resources, allow=list(allow), deny=list(deny))
+        font_budget = FontBudget(max_page_bytes=font_budget_kb * 1024, max_load_window_ms=font_budget_ms)
+        font_store = FontStore(font_store_dir, max_bytes=font_store_max_mb * 1024 * 1024) if font_store_dir else None
+        sampling = SamplingBudget(sample_elements, sample_ms, sample_seed) if sample_elements or sample_ms else None
+        extraction_options = {'collector': collector, 'settle': settle, 'blocker': blocker, 'font_budget': font_budget,
+                              'parse_fonts': parse_fonts, 'font_store': font_store, 'profiler': profiler,
+                              'sampling': sampling, 'style_sharing': style_sharing}
+        if export_dir:
+            exporter = ColumnarExporter(export_dir, export_format)
+            # Unwind on SIGTERM too, so the finally below still finalizes the export files
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        cache = None if no_cache else ResultCache(cache_path, ttl_seconds=cache_ttl * 3600)
+        ai_cache = None if no_cache else ResponseCache(cache_path)
+        
+        if site_profile_path:
+            if not input_path:
+                raise click.UsageError('--site-profile needs --input with the pages of the site')
+            run_site_mode(input_path, output_path, site_profile_path, api_key, model, json, verbose,
+                          extraction_options, ai_cache, token_budget, exporter)
+            return
+        
+        if input_path:
+            pipeline_options = {'ai_concurrency': ai_concurrency, 'queue_size': queue_size,
+                                'requests_per_minute': rpm, 'tokens_per_minute': tpm,
+                                'ai_batch_size': ai_batch_size, 'ai_batch_tokens': ai_batch_tokens}
+            pipeline_options.update(compact=compact, metrics=metrics, skip_ai_above=skip_ai_above)
+            worker_options = {'workers': workers, 'url_timeout': url_timeout,
+                              'max_memory_mb': worker_memory_mb} if workers else None
+            run_batch_mode(input_path, output_path, concurrency, per_host, not no_resume,
+                           api_key, model, verbose, extraction_options, cache, refresh, ai_cache, token_budget,
+                           pipeline_options, exporter, worker_options)
+            return
+        
         console.print("[blue]🔍 Starting font analysis...[/]\n")
         
         if verbose:
@@ -28,7 +169,28 @@ def main(url, api_key, model, json, verbose):
         
         # Extract fonts from the webpage
         console.print("[yellow]📊 Extracting font information from webpage...[/]")
-        font_data = analyze_fonts(url, verbose)
+        font_data, fingerprint = None, None
+        if cache is not None:
+            font_data, fingerprint = cache.lookup(url, options_key(extraction_options), refresh)
+            if font_data is not None:
+                console.print("[gray]Page unchanged since last run, using cached result[/]")
+        if font_data is None:
+            font_data = analyze_fonts(url, verbose, **extraction_options)
+            if cache is not None:
+                cache.store_result(url, font_data, fingerprint, options_key(extraction_options))
+        
+        if verbose and font_data.get('settle'):
+            phases = ', '.join(f"{p['name']} {p['ms']}ms" for p in font_data['settle']['phases'])
+            console.print(f"[gray]Settle ({font_data['settle']['policy']}): {phases}[/]")
+        if verbose and font_data.get('frames'):
+            failed = sum(1 for frame in font_data['frames'] if 'error' in frame)
+            console.print(f"[gray]Frames: {len(font_data['frames'])} extracted alongside the page, {failed} failed[/]")
+        if verbose and font_store is not None:
+            print_font_store_stats(font_store.stats())
+        
+        if exporter is not None:
+            exporter.add(font_data)
+            exporter.close()
         
         if not font_data or not font_data.get('fonts') or len(font_data['fonts']) == 0:
             console.print("[red]❌ No fonts found on this webpage.[/]")
@@ -36,25 +198,184 @@ def main(url, api_key, model, json, verbose):
         
         console.print(f"[green]✓ Found {len(font_data['fonts'])} unique font usage(s)[/]\n")
         
+        if metrics or skip_ai_above is not None:
+            font_data['metrics'] = page_metrics(font_data)
+            if skip_ai_above is not None and reaches_score(font_data['metrics'], skip_ai_above):
+                console.print(f"[green]✓ Consistency score {font_data['metrics']['consistencyScore']} "
+                              f"reaches {skip_ai_above}, skipping AI analysis[/]\n")
+                emit_output(font_data, None, json, ndjson, by_section, compact)
+                return
+        
         # Get AI analysis
         if not api_key:
             console.print("[yellow]⚠️  No OpenAI API key provided. Showing raw font data only.[/]\n")
-            format_output(font_data, None, json)
+            emit_output(font_data, None, json, ndjson, by_section, compact)
             return
         
         console.print("[yellow]🤖 Analyzing typography with AI...[/]")
-        ai_analysis = get_ai_analysis(font_data, api_key, model)
+        ai_analysis = get_ai_analysis(font_data, api_key, model, ai_cache, token_budget, profiler=profiler)
         console.print("[green]✓ AI analysis complete[/]\n")
+        if verbose and ai_cache is not None:
+            console.print(f"[gray]AI response cache: {'hit' if ai_cache.stats()['hits'] else 'miss'}[/]\n")
         
         # Format and display results
-        format_output(font_data, ai_analysis, json)
+        emit_output(font_data, ai_analysis, json, ndjson, by_section, compact)
         
+    except click.UsageError:
+        raise
     except Exception as e:
         console.print(f"[red]❌ Error: {str(e)}[/]")
         if verbose:
             import traceback
             console.print_exception()
         sys.exit(1)
+    finally:
+        if exporter is not None:
+            exporter.close()
+        if profiler is not None:
+            report_profile(profiler, profile, profile_trace)
+
+def report_profile(profiler, print_breakdown, trace_path):
+    """Prints the per-phase breakdown to stderr and/or writes the Chrome trace file"""
+    if trace_path:
+        profiler.write_trace(trace_path)
+    if not print_breakdown:
+        return
+    summary = profiler.summary()
+    err = Console(stderr=True)
+    err.print(f"\n[bold yellow]⏱️  PROFILE ({summary['wallMs'] / 1000:.1f}s wall clock):[/]")
+    err.print(f"[gray]   {'phase':<28}{'count':>7}{'total ms':>12}{'mean':>10}{'p95':>10}{'max':>10}[/]")
+    for name, stats in summary['phases'].items():
+        err.print(f"[white]   {name:<28}{stats['count']:>7}{stats['totalMs']:>12.0f}{stats['meanMs']:>10.1f}"
+                  f"{stats['p95Ms']:>10.1f}{stats['maxMs']:>10.1f}[/]")
+    for name, counter in summary['counters'].items():
+        err.print(f"[gray]   {name}: {counter['total']:.0f} total, {counter['mean']:.1f} mean, {counter['max']:.0f} max[/]")
+    if trace_path:
+        err.print(f"[gray]   Trace written to {trace_path}[/]")
+
+def emit_output(font_data, ai_analysis, json_output, ndjson, by_section, compact):
+    """Streams NDJSON records to stdout with --ndjson, otherwise prints the formatted report"""
+    if ndjson:
+        NdjsonWriter(sys.stdout, compact, by_section).write(font_data, ai_analysis)
+    else:
+        format_output(font_data, ai_analysis, json_output)
+
+def run_batch_mode(input_path, output_path, concurrency, per_host, resume, api_key, model, verbose,
+                   extraction_options, cache=None, refresh=False, ai_cache=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                   pipeline_options=None, exporter=None, worker_options=None):
+    """Analyzes every URL in input_path, streaming one JSON line per URL to output_path
+
+    With worker_options (WorkerPool arguments), pages are extracted in separate processes.
+    """
+    urls = read_url_list(input_path)
+    console.print(f"[blue]🔍 Batch analysis of {len(urls)} URL(s) -> {output_path}[/]")
+    if not api_key:
+        console.print("[yellow]⚠️  No OpenAI API key provided. Extracting font data only.[/]")
+    
+    done = [0]
+    def on_result(record):
+        done[0] += 1
+        if exporter is not None and not record['error']:
+            exporter.add(record['fontData'])
+        if record['error']:
+            console.print(f"[red]✗ {record['url']}: {record['error']}[/]")
+        elif verbose:
+            fonts = len(record['fontData'].get('fonts', []))
+            console.print(f"[green]✓ {record['url']} ({fonts} font famil{'y' if fonts == 1 else 'ies'}) [{done[0]}][/]")
+    
+    pool_options = {'profiler': extraction_options['profiler']} if extraction_options.get('profiler') else None
+    worker_pool = None
+    if worker_options:
+        worker_pool = WorkerPool(per_host_limit=per_host, pool_options=pool_options, **worker_options,
+                                 **extraction_options)
+        console.print(f"[gray]Extracting in {worker_pool.workers} worker process(es)[/]")
+    try:
+        summary = asyncio.run(run_batch(urls, output_path, concurrency, per_host, api_key, model, resume, verbose,
+                                        pool_options=pool_options,
+                                        on_result=on_result, cache=cache, refresh=refresh, ai_cache=ai_cache,
+                                        token_budget=token_budget, worker_pool=worker_pool,
+                                        **(pipeline_options or {}), **extraction_options))
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
+    if exporter is not None:
+        exporter.close()
+        console.print(f"[gray]Exported {exporter.rows_written['variations']} variation row(s) to {exporter.directory}[/]")
+    
+    if summary['skipped']:
+        console.print(f"[gray]Skipped {summary['skipped']} URL(s) already in {output_path}[/]")
+    if summary['pipeline']['aiSkipped']:
+        console.print(f"[gray]{summary['pipeline']['aiSkipped']} page(s) passed the local metrics and skipped AI analysis[/]")
+    if summary['cached']:
+        console.print(f"[gray]{summary['cached']} unchanged page(s) served from the cache[/]")
+    if verbose:
+        stages = summary['pipeline']
+        console.print(f"[gray]Pipeline: {stages['extracted']} extracted, {stages['analyzed']} analyzed, "
+                      f"queue high-water {stages['queueHighWater']}, extraction paused {stages['extractionBlockedSeconds']}s, "
+                      f"rate-limit wait {stages['rateLimitWaitSeconds']}s, {stages['aiRetries']} AI retries, "
+                      f"{stages['aiBatches']} packed AI requests[/]")
+    worker_stats = summary['pipeline'].get('workers')
+    if worker_stats and (verbose or worker_stats['timeouts'] or worker_stats['crashes']):
+        console.print(f"[gray]Workers: {worker_stats['workers']} process(es), {worker_stats['timeouts']} timed-out and "
+                      f"{worker_stats['crashes']} crashed page(s), {worker_stats['recycled']} restarted for memory[/]")
+    if summary.get('fontStore'):
+        print_font_store_stats(summary['fontStore'])
+    ai_stats = summary.get('aiCache')
+    if ai_stats and ai_stats['hitRate'] is not None:
+        console.print(f"[gray]AI response cache: {ai_stats['hits']} hit(s), {ai_stats['misses']} miss(es), hit rate {ai_stats['hitRate']:.0%}[/]")
+    console.print(f"[green]✓ {summary['succeeded']} succeeded, {summary['failed']} failed in {summary['elapsedSeconds']}s[/]")
+
+def print_font_store_stats(stats):
+    run = stats['run']
+    if not run['observations']:
+        return
+    console.print(f"[gray]Font store: {run['observations']} font download(s), {run['uniqueBinaries']} unique, "
+                  f"{run['duplicateObservations']} duplicate(s) ({run['duplicateBytes'] / 1024:.0f} KB), "
+                  f"{stats['binaries']} binaries stored ({stats['bytes'] / 1024 / 1024:.1f} MB)[/]")
+
+def run_site_mode(input_path, output_path, profile_path, api_key, model, json_output, verbose,
+                  extraction_options, ai_cache=None, token_budget=DEFAULT_TOKEN_BUDGET, exporter=None):
+    """Crawls the pages in input_path as one site and analyzes the merged site-wide profile"""
+    urls = read_url_list(input_path)
+    console.print(f"[blue]🔍 Site analysis of {len(urls)} page(s)[/]")
+    
+    with JsonlWriter(output_path) as writer:
+        def on_page(url, font_data, error):
+            writer.write({'url': url, 'error': error, 'fontData': font_data, 'aiAnalysis': None})
+            if exporter is not None and not error:
+                exporter.add(font_data)
+            if error:
+                console.print(f"[red]✗ {url}: {error}[/]")
+            elif verbose:
+                memo = font_data.get('stylesheetMemo', {})
+                console.print(f"[green]✓ {url} ({memo.get('reused', 0)} of {memo.get('sheets', 0)} stylesheet(s) reused)[/]")
+        
+        pool_options = {'profiler': extraction_options['profiler']} if extraction_options.get('profiler') else None
+        profile = crawl_site(urls, verbose, pool_options=pool_options, on_page=on_page, **extraction_options)
+    if exporter is not None:
+        exporter.close()
+    
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        jsonlib.dump(profile, f, indent=2, ensure_ascii=False)
+    
+    if extraction_options.get('font_store') is not None:
+        print_font_store_stats(extraction_options['font_store'].stats())
+    memo_stats = profile['site']['stylesheetMemo']
+    console.print(f"[gray]Stylesheets: {memo_stats['sheetsExtracted']} extracted, {memo_stats['sheetsReused']} reused "
+                  f"(~{memo_stats['payloadBytesSaved'] // 1024} KB of results not re-sent)[/]")
+    console.print(f"[green]✓ Site profile of {profile['site']['pages']} page(s) written to {profile_path}[/]\n")
+    
+    if not profile['fonts']:
+        console.print("[red]❌ No fonts found on this site.[/]")
+        sys.exit(1)
+    
+    ai_analysis = None
+    if api_key:
+        console.print("[yellow]🤖 Analyzing site-wide typography with AI...[/]")
+        ai_analysis = get_ai_analysis(profile, api_key, model, ai_cache, token_budget,
+                                      profiler=extraction_options.get('profiler'))
+        console.print("[green]✓ AI analysis complete[/]\n")
+    format_output(profile, ai_analysis, json_output)
 
 if __name__ == '__main__':
     main()
@@ -1,25 +1,90 @@
 from rich.console import Console
 from rich.panel import Panel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, TextIO
 import json
+import sys
 
 console = Console()
 
+# Top-level sections of font_data included in JSON output, in output order
+JSON_SECTIONS = ['fonts', 'fontFaces', 'externalFonts', 'fontFiles', 'declaredFonts', 'variableFonts',
+                 'cssImports', 'loadedFonts', 'frames', 'sampling', 'settle', 'resourceBlocking',
+                 'fontNetwork', 'fontBinaries', 'site', 'metrics']
+
+# Sections that are always present in --json output, as lists
+LIST_SECTIONS = ['fonts', 'fontFaces', 'externalFonts', 'fontFiles', 'declaredFonts', 'variableFonts',
+                 'cssImports', 'loadedFonts']
+
+def json_sections(font_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The sections of font_data for JSON output: every list section, and the others only when present"""
+    return {name: font_data.get(name, []) for name in JSON_SECTIONS
+            if name in LIST_SECTIONS or font_data.get(name) is not None}
+
+def compact_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops keys whose value is None or an empty list/dict"""
+    return {k: v for k, v in record.items() if v is not None and v != [] and v != {}}
+
+def iter_ndjson_records(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any]],
+                        by_section: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yields the NDJSON records for one page
+
+    By default a page is one record holding every section. With by_section each entry of a
+    list section (one font family, one @font-face rule, ...) and each other section becomes
+    its own small {url, section, [index,] data} record.
+    """
+    url = font_data.get('url')
+    if not by_section:
+        record = {'url': url, **json_sections(font_data)}
+        record['aiAnalysis'] = ai_analysis
+        yield record
+        return
+    
+    for name in JSON_SECTIONS:
+        value = font_data.get(name)
+        if isinstance(value, list):
+            for index, item in enumerate(value):
+                yield {'url': url, 'section': name, 'index': index, 'data': item}
+        elif value is not None:
+            yield {'url': url, 'section': name, 'data': value}
+    if ai_analysis is not None:
+        yield {'url': url, 'section': 'aiAnalysis', 'data': ai_analysis}
+
+class NdjsonWriter:
+    """Writes one JSON record per line and flushes each, so a consumer can start before the run ends
+
+    compact drops empty sections from every record. Nothing is kept after a record is written.
+    """
+    
+    def __init__(self, stream: Optional[TextIO] = None, compact: bool = False, by_section: bool = False):
+        self.stream = stream or sys.stdout
+        self.compact = compact
+        self.by_section = by_section
+        self.records_written = 0
+    
+    def write_record(self, record: Dict[str, Any]):
+        if self.compact:
+            record = compact_record(record)
+            if self.by_section and 'data' not in record:
+                return
+        self.stream.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+        self.stream.flush()
+        self.records_written += 1
+    
+    def write(self, font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any]] = None):
+        for record in iter_ndjson_records(font_data, ai_analysis, self.by_section):
+            self.write_record(record)
+
+def _margin(entry: Dict[str, Any]) -> str:
+    """' ± n' for a sampled usage estimate (95% interval), '' for an exact count"""
+    std_error = entry.get('usageCountStdError')
+    return f" ± {1.96 * std_error:.0f}" if std_error else ''
+
 def format_output(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any]], json_output: bool = False):
     """Formats and displays the analysis results"""
     
     if json_output:
-        output = {
-            'fonts': font_data.get('fonts', []),
-            'fontFaces': font_data.get('fontFaces', []),
-            'externalFonts': font_data.get('externalFonts', []),
-            'fontFiles': font_data.get('fontFiles', []),
-            'declaredFonts': font_data.get('declaredFonts', []),
-            'variableFonts': font_data.get('variableFonts', []),
-            'cssImports': font_data.get('cssImports', []),
-            'loadedFonts': font_data.get('loadedFonts', []),
-            'aiAnalysis': ai_analysis
-        }
+        output = json_sections(font_data)
+        output['aiAnalysis'] = ai_analysis
         print(json.dumps(output, indent=2))
         return
     
@@ -32,10 +97,17 @@ def format_output(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any
     console.print("[bold yellow]📝 FONT USAGE:[/]")
     console.print("[gray]─[/]" * 55)
     
+    sampling = font_data.get('sampling')
+    if sampling:
+        console.print(f"[gray]Sampled {sampling['sampled']} of {sampling['candidates']} elements "
+                      f"({sampling['coverage']:.0%}); usage counts are estimates ± 95% interval[/]")
+    
     fonts = font_data.get('fonts', [])
     for index, font in enumerate(fonts[:10], 1):
         console.print(f"\n[white]{index}. [bold]{font.get('fontFamily', 'Unknown')}[/][/]")
-        console.print(f"[gray]   Total Usage: {font.get('totalUsageCount', 0)} time(s)[/]")
+        console.print(f"[gray]   Total Usage: {font.get('totalUsageCount', 0)}{_margin(font)} time(s)[/]")
+        if font.get('pageCount'):
+            console.print(f"[gray]   Pages: {font['pageCount']} of {font_data['site']['pages']}[/]")
         console.print(f"[gray]   Used in: {', '.join(font.get('elements', []))}[/]")
         
         variations = font.get('variations', [])
@@ -43,7 +115,9 @@ def format_output(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any
             console.print("[gray]   Variations:[/]")
             for variation in variations:
                 console.print(f"[gray]     • Size: {variation.get('fontSize', '')} ({variation.get('fontSizePx', 0)}px) | Weight: {variation.get('fontWeight', '')} | Style: {variation.get('fontStyle', '')}[/]")
-                console.print(f"[gray]       Used {variation.get('usageCount', 0)} time(s) in: {', '.join(variation.get('elements', []))}[/]")
+                console.print(f"[gray]       Used {variation.get('usageCount', 0)}{_margin(variation)} time(s) in: {', '.join(variation.get('elements', []))}[/]")
+                if variation.get('characterCount'):
+                    console.print(f"[gray]       Characters: {variation.get('characterCount')}[/]")
                 sample_text = variation.get('sampleText', '')
                 if sample_text:
                     console.print(f"[gray]       Sample: \"{sample_text[:50]}...\"[/]")
@@ -76,6 +150,43 @@ def format_output(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any
         if len(font_files) > 15:
             console.print(f"[gray]   ... and {len(font_files) - 15} more font files[/]")
     
+    # Font network cost
+    network = font_data.get('fontNetwork')
+    if network and network.get('files'):
+        totals = network['totals']
+        console.print("\n\n[bold yellow]⏱️  FONT NETWORK COST:[/]")
+        console.print("[gray]─[/]" * 55)
+        console.print(f"[white]   {totals['files']} file(s), {totals['transferBytes'] / 1024:.0f} KB transferred "
+                      f"({totals['decodedBytes'] / 1024:.0f} KB decoded), load window {totals['fontLoadWindowMs']:.0f} ms[/]")
+        if totals['unusedFiles']:
+            console.print(f"[white]   {totals['unusedFiles']} unused file(s), {totals['unusedBytes'] / 1024:.0f} KB wasted[/]")
+        for family, stats in sorted(network['byFamily'].items(), key=lambda item: -item[1]['transferBytes'])[:10]:
+            console.print(f"[gray]   • {family}: {stats['files']} file(s), {stats['transferBytes'] / 1024:.0f} KB, "
+                          f"slowest {stats['maxLatencyMs']:.0f} ms[/]")
+        for warning in network.get('warnings', [])[:10]:
+            console.print(f"[red]   ⚠ {warning}[/]")
+        if len(network.get('warnings', [])) > 10:
+            console.print(f"[gray]   ... and {len(network['warnings']) - 10} more warning(s)[/]")
+    
+    # Parsed font binaries
+    binaries = font_data.get('fontBinaries')
+    if binaries and binaries.get('files'):
+        totals = binaries['totals']
+        console.print("\n\n[bold yellow]🔬 FONT FILES PARSED:[/]")
+        console.print("[gray]─[/]" * 55)
+        console.print(f"[white]   {totals['parsed']} of {totals['files']} file(s) parsed, {totals['variableFiles']} variable, "
+                      f"~{totals['wastedGlyphBytes'] / 1024:.0f} KB of glyphs never rendered[/]")
+        for family, stats in binaries['byFamily'].items():
+            axes = ', '.join(f"{a['tag']} {a['min']:g}-{a['max']:g}" for a in stats['axes'])
+            details = f"axes {axes}" if axes else f"weights {', '.join(str(w) for w in stats['weights']) or 'unknown'}"
+            coverage = f", {stats['coverage'] * 100:.1f}% of rendered characters covered" if 'coverage' in stats else ''
+            console.print(f"[white]   • {family}: {details}{coverage}[/]")
+            if stats.get('missingCodepoints'):
+                console.print(f"[red]     Missing glyphs for: {stats['missingCodepoints'][:40]}[/]")
+        for f in binaries['files']:
+            if 'error' in f:
+                console.print(f"[gray]   {f['url'].rsplit('/', 1)[-1]}: not parsed ({f['error']})[/]")
+    
     # External Font Sources
     external_fonts = font_data.get('externalFonts', [])
     if external_fonts:
@@ -120,11 +231,48 @@ def format_output(font_data: Dict[str, Any], ai_analysis: Optional[Dict[str, Any
         if len(loaded_by_family) > 10:
             console.print(f"[gray]   ... and {len(loaded_by_family) - 10} more font families[/]")
     
+    # Resource blocking
+    blocking = font_data.get('resourceBlocking')
+    if blocking and blocking.get('blockedRequests'):
+        console.print("\n\n[bold yellow]🚫 BLOCKED RESOURCES:[/]")
+        console.print("[gray]─[/]" * 55)
+        console.print(f"[white]   Blocked {blocking.get('blockedRequests', 0)} of {blocking.get('blockedRequests', 0) + blocking.get('allowedRequests', 0)} request(s), ~{blocking.get('estimatedBytesSaved', 0) / 1024:.0f} KB saved (estimated)[/]")
+        by_type = ', '.join(f"{t}: {n}" for t, n in sorted(blocking.get('blockedByType', {}).items(), key=lambda item: -item[1]))
+        if by_type:
+            console.print(f"[gray]   By type: {by_type}[/]")
+    
+    # Local typography metrics
+    metrics = font_data.get('metrics')
+    if metrics and metrics.get('consistencyScore') is not None:
+        console.print("\n\n[bold yellow]📐 TYPOGRAPHY METRICS:[/]")
+        console.print("[gray]─[/]" * 55)
+        console.print(f"[white]   Consistency score: {metrics['consistencyScore']}/100 ({'pass' if metrics['passes'] else 'review'})[/]")
+        scale = metrics.get('typeScale')
+        if scale:
+            console.print(f"[white]   Type scale: {scale['name']} ({scale['ratio']}) from {scale['baseSizePx']}px, fit {scale['fit']:.0%}[/]")
+        console.print(f"[white]   Sizes: {metrics['distinctSizes']} distinct in {metrics['sizeClusters']} cluster(s)[/]")
+        duplicates = metrics.get('nearDuplicateSizes', [])
+        if duplicates:
+            console.print(f"[gray]   Near-duplicate sizes: {', '.join(f'{a:g}/{b:g}px' for a, b in duplicates[:8])}[/]")
+        weights = ', '.join(f"{w}: {share:.0%}" for w, share in metrics.get('weightDistribution', {}).items())
+        console.print(f"[white]   Weights: {weights}[/]")
+        line_height = metrics.get('lineHeightRatio', {})
+        if line_height.get('mean') is not None:
+            comfortable = line_height.get('bodyComfortableShare')
+            comfortable_text = f", body text comfortable {comfortable:.0%}" if comfortable is not None else ''
+            console.print(f"[white]   Line height / size: {line_height['mean']} on average{comfortable_text}[/]")
+    
     # AI Analysis Section
     if ai_analysis:
         console.print("\n\n[bold yellow]🤖 AI TYPOGRAPHY ANALYSIS:[/]")
         console.print("[gray]─[/]" * 55)
         
+        usage = ai_analysis.get('usage', {})
+        if usage.get('promptTokens'):
+            completion = f", {usage['completionTokens']} completion" if usage.get('completionTokens') else ''
+            cached = ' (cached)' if usage.get('cached') else ''
+            console.print(f"[gray]   Prompt: {usage['promptTokens']} of {usage.get('tokenBudget')} token budget{completion}{cached}[/]")
+        
         analysis = ai_analysis.get('analysis', {})
         if analysis:
             console.print("\n[bold white]📊 Overall Assessment:[/]")
@@ -0,0 +1,223 @@
+from typing import Dict, Any, Iterable, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import time
+from async_extractor import analyze_fonts_concurrent
+from ai_analyzer import get_ai_analysis
+from ai_batch import get_ai_analyses, DEFAULT_BATCH_TOKEN_CEILING
+from cache import ResponseCache
+from prompt_builder import DEFAULT_TOKEN_BUDGET
+from typography_metrics import page_metrics, reaches_score
+from worker_pool import WorkerPool
+
+# Marks the end of the extraction stream on the AI queue
+_DONE = object()
+
+
+class RateLimiter:
+    """Sliding one-minute window limiting requests and tokens sent to the API"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events = []
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self, tokens: int = 0):
+        """Waits until one more request of `tokens` tokens fits in the last minute's limits"""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._events = [(t, n) for t, n in self._events if now - t < 60]
+                request_ok = not self.requests_per_minute or len(self._events) < self.requests_per_minute
+                used_tokens = sum(n for _, n in self._events)
+                # A single request larger than the whole limit is let through on an empty window
+                token_ok = (not self.tokens_per_minute or used_tokens + tokens <= self.tokens_per_minute
+                            or not self._events)
+                if request_ok and token_ok:
+                    self._events.append((now, tokens))
+                    return
+                wait = 60 - (now - self._events[0][0]) + 0.01
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+
+async def run_pipeline(urls: Iterable[str], on_record: Callable[[Dict[str, Any]], None],
+                       api_key: Optional[str] = None, model: str = 'gpt-4o-mini',
+                       concurrency: int = 4, per_host_limit: int = 2, ai_concurrency: int = 2,
+                       queue_size: int = 8, requests_per_minute: Optional[int] = None,
+                       tokens_per_minute: Optional[int] = None, ai_cache: Optional[ResponseCache] = None,
+                       token_budget: int = DEFAULT_TOKEN_BUDGET, verbose: bool = False,
+                       pool_options: Optional[Dict[str, Any]] = None,
+                       lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                       on_extracted: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                       ai_batch_size: int = 1, ai_batch_tokens: int = DEFAULT_BATCH_TOKEN_CEILING,
+                       metrics: bool = False, skip_ai_above: Optional[float] = None,
+                       worker_pool: Optional[WorkerPool] = None, **extraction_options) -> Dict[str, Any]:
+    """Runs extraction and AI analysis as two overlapping stages joined by a bounded queue
+
+    Extraction keeps up to `concurrency` pages in flight and hands each result to a queue of
+    `queue_size`; when the queue is full extraction pauses, so slow AI calls apply backpressure
+    instead of piling up results in memory. `ai_concurrency` workers drain the queue within the
+    optional per-minute request/token limits. `lookup`, e.g. a result cache check, runs per
+    URL inside the extraction stage under its host limit; a result it returns skips rendering.
+    on_record receives one record per URL in completion order.
+
+    With ai_batch_size above 1 a worker takes every page already waiting in the queue, up to
+    that many, and packs them into shared requests of at most ai_batch_tokens (see
+    ai_batch.get_ai_analyses). Batches only form when AI analysis is the bottleneck.
+
+    With metrics, local typography metrics are added to each page as font_data['metrics'];
+    with skip_ai_above, pages whose consistency score reaches it are not sent to the AI.
+
+    With a worker_pool, pages are extracted in its worker processes instead (concurrency and
+    extraction_options are then the pool's) and records follow the input order.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+    profiler = extraction_options.get('profiler')
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    loop = asyncio.get_running_loop()
+    stats = {
+        'extracted': 0,
+        'extractionFailed': 0,
+        'analyzed': 0,
+        'analysisFailed': 0,
+        'aiRetries': 0,
+        'aiBatches': 0,
+        'aiSkipped': 0,
+        'queueHighWater': 0,
+        'extractionBlockedSeconds': 0.0,
+        'rateLimitWaitSeconds': 0.0
+    }
+
+    def emit(url, font_data, error, ai_analysis=None, cached=False):
+        record = {'url': url, 'error': error, 'fontData': font_data, 'aiAnalysis': ai_analysis}
+        if cached:
+            record['cached'] = True
+        on_record(record)
+
+    async def enqueue(url, font_data, cached):
+        started = time.monotonic()
+        await queue.put((url, font_data, cached))
+        stats['extractionBlockedSeconds'] += time.monotonic() - started
+        stats['queueHighWater'] = max(stats['queueHighWater'], queue.qsize())
+
+    hits = set()
+
+    def lookup_url(url):
+        result = lookup(url)
+        if result is not None:
+            hits.add(url)
+        return result
+
+    async def extract():
+        try:
+            url_lookup = lookup_url if lookup is not None else None
+            if worker_pool is not None:
+                extracted = worker_pool.imap_async(urls, lookup=url_lookup)
+            else:
+                extracted = analyze_fonts_concurrent(urls, concurrency, per_host_limit, verbose,
+                                                     pool_options=pool_options, lookup=url_lookup,
+                                                     **extraction_options)
+            async for url, font_data, error in extracted:
+                if url in hits:
+                    hits.discard(url)
+                    await enqueue(url, font_data, True)
+                    continue
+                if error:
+                    stats['extractionFailed'] += 1
+                    emit(url, None, error)
+                    continue
+                stats['extracted'] += 1
+                if on_extracted:
+                    on_extracted(url, font_data)
+                await enqueue(url, font_data, False)
+        finally:
+            for _ in range(ai_concurrency):
+                await queue.put(_DONE)
+
+    async def next_items():
+        """Waits for one queued item, then takes what else is already waiting, up to ai_batch_size"""
+        items = [await queue.get()]
+        while len(items) < ai_batch_size and items[-1] is not _DONE and not queue.empty():
+            items.append(queue.get_nowait())
+        return items
+
+    def rate_limit(tokens):
+        # Called from an AI worker thread right before a request goes to the API, so cache hits
+        # are free and the prompt is built once, off the loop
+        asyncio.run_coroutine_threadsafe(limiter.acquire(tokens), loop).result()
+
+    async def analyze_one(executor, url, font_data, cached):
+        try:
+            ai_analysis = await loop.run_in_executor(
+                executor, functools.partial(get_ai_analysis, font_data, api_key, model, ai_cache, token_budget,
+                                            profiler=profiler, before_request=rate_limit)
+            )
+            stats['analyzed'] += 1
+            stats['aiRetries'] += ai_analysis.get('usage', {}).get('retries', 0)
+            emit(url, font_data, None, ai_analysis, cached)
+        except Exception as e:
+            stats['analysisFailed'] += 1
+            emit(url, font_data, str(e), cached=cached)
+
+    async def analyze_many(executor, items):
+        try:
+            results = await loop.run_in_executor(
+                executor, functools.partial(get_ai_analyses, [font_data for _, font_data, _ in items], api_key, model,
+                                            ai_cache, token_budget, ai_batch_size, ai_batch_tokens, profiler=profiler,
+                                            before_request=rate_limit)
+            )
+        except Exception as e:
+            results = [(None, str(e))] * len(items)
+        else:
+            stats['aiBatches'] += 1
+        for (url, font_data, cached), (ai_analysis, error) in zip(items, results):
+            if error:
+                stats['analysisFailed'] += 1
+                emit(url, font_data, error, cached=cached)
+                continue
+            stats['analyzed'] += 1
+            usage = ai_analysis['usage']
+            # A shared request's retries are split over its pages so a batch counts them once
+            stats['aiRetries'] += usage.get('retries', 0) + usage.get('batchRetries', 0) / usage.get('batchSize', 1)
+            emit(url, font_data, None, ai_analysis, cached)
+
+    async def analyze(executor):
+        while True:
+            items = await next_items()
+            done = items[-1] is _DONE
+            to_analyze = []
+            for item in items:
+                if item is _DONE:
+                    continue
+                url, font_data, cached = item
+                if font_data.get('fonts') and (metrics or skip_ai_above is not None):
+                    font_data['metrics'] = page_metrics(font_data)
+                if not api_key or not font_data.get('fonts'):
+                    emit(url, font_data, None, cached=cached)
+                elif skip_ai_above is not None and reaches_score(font_data['metrics'], skip_ai_above):
+                    stats['aiSkipped'] += 1
+                    emit(url, font_data, None, cached=cached)
+                else:
+                    to_analyze.append(item)
+            if len(to_analyze) == 1:
+                await analyze_one(executor, *to_analyze[0])
+            elif to_analyze:
+                await analyze_many(executor, to_analyze)
+            if done:
+                return
+
+    with ThreadPoolExecutor(max_workers=ai_concurrency) as executor:
+        await asyncio.gather(extract(), *(analyze(executor) for _ in range(ai_concurrency)))
+
+    stats['extractionBlockedSeconds'] = round(stats['extractionBlockedSeconds'], 2)
+    stats['rateLimitWaitSeconds'] = round(limiter.waited_seconds, 2)
+    stats['aiRetries'] = round(stats['aiRetries'])
+    if worker_pool is not None:
+        stats['workers'] = worker_pool.stats()
+    return stats
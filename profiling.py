@@ -0,0 +1,104 @@
+from typing import Dict, Any, Optional, Callable
+from contextlib import contextmanager, nullcontext
+import json
+import threading
+import time
+
+
+class Profiler:
+    """Collects phase timings and counters from the browser pools, analyze_fonts and get_ai_analysis.
+
+    Phases are wall-clock spans (nested phases such as settle.goto inside settle are kept
+    as separate names); counters are numbers summed per name, such as domNodes or
+    promptTokens. `hook`, when given, receives every event dict as it is recorded, e.g. to
+    forward it to a metrics system. One profiler can be shared by concurrent pages and threads.
+    """
+
+    def __init__(self, hook: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.hook = hook
+        self.events = []
+        self.counters = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, url: Optional[str] = None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, url, started)
+
+    def record(self, name: str, ms: float, url: Optional[str] = None, started: Optional[float] = None):
+        """Records a phase that took ms milliseconds; started is its time.perf_counter() start"""
+        if started is None:
+            started = time.perf_counter() - ms / 1000
+        event = {'type': 'phase', 'name': name, 'url': url, 'ms': round(ms, 3),
+                 'startMs': round((started - self._origin) * 1000, 3), 'thread': threading.get_ident()}
+        with self._lock:
+            self.events.append(event)
+        if self.hook:
+            self.hook(event)
+
+    def record_settle(self, settle_info: Dict[str, Any], url: Optional[str] = None):
+        """Records the phases just measured by settle_page as settle.<name>, laid end to end"""
+        offset = time.perf_counter() - settle_info.get('totalMs', 0) / 1000
+        for phase in settle_info.get('phases', []):
+            self.record(f"settle.{phase['name']}", phase['ms'], url, offset)
+            offset += phase['ms'] / 1000
+
+    def count(self, name: str, value: float = 1, url: Optional[str] = None):
+        with self._lock:
+            counter = self.counters.setdefault(name, {'total': 0, 'samples': 0, 'max': 0})
+            counter['total'] += value
+            counter['samples'] += 1
+            counter['max'] = max(counter['max'], value)
+        if self.hook:
+            self.hook({'type': 'counter', 'name': name, 'url': url, 'value': value})
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-phase count, total, mean, p95 and max milliseconds (slowest total first) plus counters"""
+        with self._lock:
+            events = list(self.events)
+            counters = {name: dict(c) for name, c in self.counters.items()}
+        durations = {}
+        for event in events:
+            durations.setdefault(event['name'], []).append(event['ms'])
+        phases = {}
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            values.sort()
+            phases[name] = {
+                'count': len(values),
+                'totalMs': round(sum(values), 1),
+                'meanMs': round(sum(values) / len(values), 1),
+                'p95Ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+                'maxMs': round(values[-1], 1)
+            }
+        for counter in counters.values():
+            counter['mean'] = round(counter['total'] / counter['samples'], 1) if counter['samples'] else 0
+        return {
+            'wallMs': round((time.perf_counter() - self._origin) * 1000, 1),
+            'phases': phases,
+            'counters': counters
+        }
+
+    def write_trace(self, path: str):
+        """Writes the phases in Chrome trace event format (chrome://tracing, Perfetto), one track per URL"""
+        with self._lock:
+            events = list(self.events)
+        tracks = {}
+        trace_events = []
+        for event in events:
+            track = tracks.setdefault(event['url'] or f"thread {event['thread']}", len(tracks) + 1)
+            trace_events.append({'name': event['name'], 'ph': 'X', 'pid': 1, 'tid': track,
+                                 'ts': round(event['startMs'] * 1000), 'dur': round(event['ms'] * 1000),
+                                 'args': {'url': event['url']}})
+        for label, track in tracks.items():
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': track, 'args': {'name': label}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+def phase(profiler: Optional[Profiler], name: str, url: Optional[str] = None):
+    """profiler.phase(name, url), or a no-op context when profiling is off"""
+    return profiler.phase(name, url) if profiler is not None else nullcontext()
@@ -0,0 +1,274 @@
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlsplit
+import math
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+INSTRUCTIONS = """You are a typography expert. Analyze the following font usage data from a website and provide:
+
+1. **Typography Analysis**:
+   - Overall typography quality and consistency
+   - Font hierarchy assessment
+   - Readability evaluation
+   - Design style classification (modern, classic, minimalist, etc.)
+
+2. **Font Pairing Suggestions**:
+   - Suggest 3-5 complementary font pairings that would work well with the existing fonts
+   - Explain why each pairing works
+   - Include both serif/sans-serif combinations and alternative options
+
+3. **Recommendations**:
+   - Specific improvements for font sizes, weights, and spacing
+   - Suggestions for better typography hierarchy
+   - Any issues or inconsistencies found
+
+The data below is in pipe-separated tables; the first line of each table names its columns."""
+
+RESPONSE_FORMAT = """Provide your analysis in a structured JSON format with the following structure:
+{
+  "analysis": {
+    "overallQuality": "rating and brief description",
+    "hierarchy": "assessment of font hierarchy",
+    "readability": "readability evaluation",
+    "style": "design style classification"
+  },
+  "fontPairings": [
+    {
+      "primary": "font name",
+      "secondary": "font name",
+      "reason": "why this pairing works",
+      "useCase": "best use case for this pairing"
+    }
+  ],
+  "recommendations": [
+    "specific recommendation 1",
+    "specific recommendation 2"
+  ],
+  "issues": [
+    "issue 1 if any",
+    "issue 2 if any"
+  ]
+}"""
+
+BATCH_INSTRUCTIONS = ("You are a typography expert. The font usage data below covers several websites, each introduced by "
+                      "a line '=== Site <id>: <url> ==='. Analyze every site independently and provide for each:\n\n"
+                      + INSTRUCTIONS.split('\n\n', 1)[1])
+
+BATCH_RESPONSE_FORMAT = ('Provide your analysis as one JSON object of the form {"sites": {"<id>": {...}}} with one entry '
+                         'per site id, where each entry has the following structure:\n' + RESPONSE_FORMAT.split('\n', 1)[1])
+
+# Tokens taken by the '=== Site <id>: <url> ===' header and blank lines around each site
+BATCH_SITE_OVERHEAD_TOKENS = 24
+
+# Successively tighter encodings tried until the prompt fits the token budget.
+# min_share drops variations below that share of their family's usage.
+TRIM_LEVELS = [
+    {'max_fonts': 20, 'min_share': 0.0, 'sample_chars': 60, 'max_faces': 60, 'max_files': 20, 'max_external': 20},
+    {'max_fonts': 20, 'min_share': 0.01, 'sample_chars': 40, 'max_faces': 40, 'max_files': 15, 'max_external': 15},
+    {'max_fonts': 15, 'min_share': 0.02, 'sample_chars': 30, 'max_faces': 25, 'max_files': 10, 'max_external': 10},
+    {'max_fonts': 10, 'min_share': 0.05, 'sample_chars': 20, 'max_faces': 15, 'max_files': 5, 'max_external': 5},
+    {'max_fonts': 6, 'min_share': 0.1, 'sample_chars': 0, 'max_faces': 8, 'max_files': 0, 'max_external': 3},
+    {'max_fonts': 3, 'min_share': 0.2, 'sample_chars': 0, 'max_faces': 0, 'max_files': 0, 'max_external': 0}
+]
+
+_encodings = {}
+
+
+def count_tokens(text: str, model: str = 'gpt-4o-mini') -> int:
+    """Counts tokens with tiktoken when installed, otherwise estimates about four characters per token"""
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+        _encodings[model] = encoding
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = 'gpt-4o-mini') -> int:
+    return sum(count_tokens(m['content'], model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _cell(value: Any) -> str:
+    """Formats a table cell, keeping the pipe delimiter and newlines out of it"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        value = f'{value:g}'
+    return ' '.join(str(value).replace('|', '/').split())
+
+
+def _table(title: str, columns: List[str], rows: List[List[Any]], total: Optional[int] = None) -> str:
+    heading = title if total is None or total == len(rows) else f'{title} (showing {len(rows)} of {total})'
+    lines = [f'{heading}:', '|'.join(columns)]
+    lines.extend('|'.join(_cell(v) for v in row) for row in rows)
+    return '\n'.join(lines)
+
+
+def _short_url(url: str) -> str:
+    """Drops the query string and keeps host + path, which is what identifies a font source"""
+    parts = urlsplit(url)
+    return f'{parts.netloc}{parts.path}' if parts.netloc else url.split('?')[0]
+
+
+def _src_urls(src: str) -> List[str]:
+    urls = []
+    for chunk in src.split('url(')[1:]:
+        urls.append(chunk.split(')')[0].strip('\'" '))
+    return urls
+
+
+def _encode(font_data: Dict[str, Any], level: Dict[str, Any]) -> Dict[str, Any]:
+    """Encodes font_data as compact tables under one trim level, returning the text and what was dropped"""
+    fonts = font_data.get('fonts', [])
+    shown_fonts = fonts[:level['max_fonts']]
+    total_usage = sum(f.get('totalUsageCount', 0) for f in fonts) or 1
+    dropped_variations = 0
+
+    font_rows = []
+    variation_rows = []
+    for rank, font in enumerate(shown_fonts, 1):
+        family_usage = font.get('totalUsageCount', 0)
+        font_rows.append([rank, font.get('fontFamily', ''), family_usage,
+                          round(100 * family_usage / total_usage, 1), ','.join(font.get('elements', []))])
+        for v in font.get('variations', []):
+            share = v.get('usageCount', 0) / family_usage if family_usage else 0
+            if share < level['min_share']:
+                dropped_variations += 1
+                continue
+            sample = (v.get('sampleText') or '')[:level['sample_chars']]
+            variation_rows.append([rank, v.get('fontSizePx', 0), v.get('fontWeight', ''), v.get('fontStyle', ''),
+                                   v.get('lineHeightValue'), v.get('usageCount', 0),
+                                   ','.join(v.get('elements', [])), sample])
+
+    used = {font.get('fontFamily', '') for font in fonts}
+    unused = [f for f in font_data.get('declaredFonts', []) if f not in used]
+
+    # Collapse unicode-range subsets and repeated sources into one row per family/weight/style
+    face_groups = {}
+    for face in font_data.get('fontFaces', []):
+        key = (face.get('fontFamily', '').strip('\'"'), face.get('fontWeight', ''), face.get('fontStyle', ''))
+        group = face_groups.setdefault(key, {'display': face.get('fontDisplay', ''), 'subsets': 0, 'sources': []})
+        group['subsets'] += 1
+        for url in _src_urls(face.get('src', '')):
+            short = _short_url(url)
+            if short not in group['sources']:
+                group['sources'].append(short)
+    face_rows = [[family, weight, style, group['display'], group['subsets'], len(group['sources']),
+                  group['sources'][0] if group['sources'] else '']
+                 for (family, weight, style), group in face_groups.items()]
+
+    external = font_data.get('externalFonts', [])
+    files = font_data.get('fontFiles', [])
+    variable = font_data.get('variableFonts', [])
+
+    sections = [
+        _table('Fonts (used)', ['rank', 'family', 'usage', 'share%', 'elements'], font_rows, len(fonts)),
+        _table('Variations', ['font', 'size_px', 'weight', 'style', 'line_height_px', 'usage', 'elements', 'sample'],
+               variation_rows, len(variation_rows) + dropped_variations),
+        'Declared but unused fonts: ' + (', '.join(unused) if unused else 'none')
+    ]
+    if level['max_external'] and external:
+        sections.append(_table('External font sources', ['source', 'url'],
+                               [[e.get('source', ''), e.get('url', '')] for e in external[:level['max_external']]],
+                               len(external)))
+    if level['max_faces'] and face_rows:
+        sections.append(_table('@font-face declarations', ['family', 'weight', 'style', 'display', 'subsets',
+                                                           'sources', 'first_source'],
+                               face_rows[:level['max_faces']], len(face_rows)))
+    if level['max_files'] and files:
+        sections.append(_table('Font files loaded', ['url', 'type', 'status'],
+                               [[_short_url(f.get('url', '')), f.get('type', ''), f.get('status', '')]
+                                for f in files[:level['max_files']]], len(files)))
+    if variable:
+        sections.append('Variable fonts: ' + ', '.join(sorted({v.get('fontFamily', '') for v in variable})))
+
+    return {
+        'text': '\n\n'.join(sections),
+        'droppedVariations': dropped_variations,
+        'fontsShown': len(shown_fonts),
+        'fontsTotal': len(fonts)
+    }
+
+
+def _fit(font_data: Dict[str, Any], token_budget: int, model: str, fixed_tokens: int) -> Dict[str, Any]:
+    """Encodes font_data at the first trim level whose single-page prompt fits token_budget"""
+    prompt = ''
+    tokens = 0
+    encoded = None
+    level_index = 0
+    for level_index, level in enumerate(TRIM_LEVELS):
+        encoded = _encode(font_data, level)
+        prompt = f'{INSTRUCTIONS}\n\n{encoded["text"]}\n\n{RESPONSE_FORMAT}'
+        tokens = count_tokens(prompt, model) + fixed_tokens
+        if tokens <= token_budget:
+            break
+    encoded.update(prompt=prompt, tokens=tokens, trimLevel=level_index)
+    return encoded
+
+
+def build_prompt(font_data: Dict[str, Any], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 model: str = 'gpt-4o-mini', system_prompt: str = '') -> Dict[str, Any]:
+    """Builds the analysis prompt, trimming the data until the whole request fits token_budget
+
+    Returns the prompt with its token count, the trim level used and whether it still ran over.
+    """
+    fixed_tokens = count_tokens(system_prompt, model) + 2 * MESSAGE_OVERHEAD_TOKENS
+    fitted = _fit(font_data, token_budget, model, fixed_tokens)
+
+    return {
+        'prompt': fitted['prompt'],
+        'tokens': fitted['tokens'],
+        'tokenBudget': token_budget,
+        'overBudget': fitted['tokens'] > token_budget,
+        'trimLevel': fitted['trimLevel'],
+        'fontsShown': fitted['fontsShown'],
+        'fontsTotal': fitted['fontsTotal'],
+        'droppedVariations': fitted['droppedVariations'],
+        'tokenizer': 'tiktoken' if tiktoken is not None else 'estimate'
+    }
+
+
+def encode_site(font_data: Dict[str, Any], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                model: str = 'gpt-4o-mini', system_prompt: str = '') -> Dict[str, Any]:
+    """Encodes one page exactly as build_prompt would, ready to be packed into a batch prompt
+
+    Alongside the single-page prompt fields, 'sectionTokens' is what the page adds to a batch.
+    """
+    fixed_tokens = count_tokens(system_prompt, model) + 2 * MESSAGE_OVERHEAD_TOKENS
+    fitted = _fit(font_data, token_budget, model, fixed_tokens)
+    fitted['url'] = font_data.get('url', '')
+    fitted['sectionTokens'] = count_tokens(fitted['text'], model) + BATCH_SITE_OVERHEAD_TOKENS
+    fitted['tokenizer'] = 'tiktoken' if tiktoken is not None else 'estimate'
+    return fitted
+
+
+def batch_overhead_tokens(model: str = 'gpt-4o-mini', system_prompt: str = '') -> int:
+    """Tokens a batch prompt spends on instructions and format before any site data"""
+    return (count_tokens(BATCH_INSTRUCTIONS, model) + count_tokens(BATCH_RESPONSE_FORMAT, model)
+            + count_tokens(system_prompt, model) + 2 * MESSAGE_OVERHEAD_TOKENS)
+
+
+def build_batch_prompt(sites: List[Dict[str, Any]], model: str = 'gpt-4o-mini',
+                       system_prompt: str = '') -> Dict[str, Any]:
+    """Packs several encode_site results into one prompt asking for one analysis per site id"""
+    site_ids = [str(i) for i in range(1, len(sites) + 1)]
+    sections = [f'=== Site {site_id}: {site["url"]} ===\n{site["text"]}' for site_id, site in zip(site_ids, sites)]
+    prompt = BATCH_INSTRUCTIONS + '\n\n' + '\n\n'.join(sections) + '\n\n' + BATCH_RESPONSE_FORMAT
+    return {
+        'prompt': prompt,
+        'tokens': count_tokens(prompt, model) + count_tokens(system_prompt, model) + 2 * MESSAGE_OVERHEAD_TOKENS,
+        'siteIds': site_ids,
+        'tokenizer': 'tiktoken' if tiktoken is not None else 'estimate'
+    }
@@ -0,0 +1,159 @@
+from typing import Dict, List, Any, Optional, Iterable
+from urllib.parse import urlsplit
+from fnmatch import fnmatch
+
+# Resource types that never affect which fonts a page renders
+DEFAULT_BLOCKED_TYPES = ['image', 'media']
+
+# Resource types that are always let through unless explicitly denied
+ALWAYS_ALLOWED_TYPES = ['document', 'stylesheet', 'font']
+
+# Analytics, tag managers and ad networks; matched against the request host and its parents
+TRACKER_DOMAINS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'doubleclick.net',
+    'adservice.google.com',
+    'connect.facebook.net',
+    'facebook.net',
+    'hotjar.com',
+    'clarity.ms',
+    'segment.io',
+    'segment.com',
+    'mixpanel.com',
+    'amplitude.com',
+    'fullstory.com',
+    'newrelic.com',
+    'nr-data.net',
+    'scorecardresearch.com',
+    'quantserve.com',
+    'adnxs.com',
+    'criteo.com',
+    'criteo.net',
+    'taboola.com',
+    'outbrain.com',
+    'amazon-adsystem.com',
+    'bat.bing.com',
+    'ads-twitter.com',
+    'analytics.tiktok.com',
+    'snap.licdn.com'
+]
+
+# Rough median transfer size per blocked request, used to estimate the bytes saved.
+# A blocked request is never fetched, so its real size cannot be known.
+ESTIMATED_BYTES_PER_TYPE = {
+    'image': 25000,
+    'media': 500000,
+    'script': 20000,
+    'xhr': 3000,
+    'fetch': 3000,
+    'stylesheet': 15000,
+    'font': 30000,
+    'other': 5000
+}
+
+
+def _host_matches(host: str, domains: Iterable[str]) -> Optional[str]:
+    for domain in domains:
+        if host == domain or host.endswith('.' + domain):
+            return domain
+    return None
+
+
+def _pattern_matches(url: str, host: str, patterns: Iterable[str]) -> Optional[str]:
+    """Matches plain entries as host suffixes and entries containing '/' or '*' as URL globs"""
+    for pattern in patterns:
+        if '/' in pattern or '*' in pattern:
+            if fnmatch(url, pattern):
+                return pattern
+        elif host == pattern or host.endswith('.' + pattern):
+            return pattern
+    return None
+
+
+class ResourceBlocker:
+    """Aborts requests that cannot influence font extraction, via page.route.
+
+    Decision order: the allow list wins, then the deny list, then documents, stylesheets and
+    fonts are always let through, then tracker domains and blocked resource types are aborted.
+    """
+
+    def __init__(self, block_types: Optional[List[str]] = None, block_trackers: bool = True,
+                 allow: Optional[List[str]] = None, deny: Optional[List[str]] = None,
+                 byte_estimates: Optional[Dict[str, int]] = None):
+        self.block_types = set(DEFAULT_BLOCKED_TYPES if block_types is None else block_types)
+        self.block_trackers = block_trackers
+        self.allow = list(allow or [])
+        self.deny = list(deny or [])
+        self.byte_estimates = byte_estimates or ESTIMATED_BYTES_PER_TYPE
+
+    def decide(self, url: str, resource_type: str) -> Optional[str]:
+        """Returns the reason a request should be blocked, or None to let it through"""
+        host = (urlsplit(url).hostname or '').lower()
+        if _pattern_matches(url, host, self.allow):
+            return None
+        denied = _pattern_matches(url, host, self.deny)
+        if denied:
+            return f'deny:{denied}'
+        if resource_type in ALWAYS_ALLOWED_TYPES:
+            return None
+        if self.block_trackers:
+            tracker = _host_matches(host, TRACKER_DOMAINS)
+            if tracker:
+                return f'tracker:{tracker}'
+        if resource_type in self.block_types:
+            return f'type:{resource_type}'
+        return None
+
+    def new_report(self) -> Dict[str, Any]:
+        return {
+            'allowedRequests': 0,
+            'blockedRequests': 0,
+            'blockedByType': {},
+            'blockedByReason': {},
+            'estimatedBytesSaved': 0
+        }
+
+    def _record(self, report: Dict[str, Any], resource_type: str, reason: Optional[str]):
+        if reason is None:
+            report['allowedRequests'] += 1
+            return
+        report['blockedRequests'] += 1
+        report['blockedByType'][resource_type] = report['blockedByType'].get(resource_type, 0) + 1
+        kind = reason.split(':', 1)[0]
+        report['blockedByReason'][kind] = report['blockedByReason'].get(kind, 0) + 1
+        report['estimatedBytesSaved'] += self.byte_estimates.get(resource_type, self.byte_estimates.get('other', 0))
+
+    def attach(self, page) -> Dict[str, Any]:
+        """Installs the route handler on a sync page and returns the report it keeps up to date"""
+        report = self.new_report()
+
+        def handle_route(route):
+            request = route.request
+            reason = self.decide(request.url, request.resource_type)
+            self._record(report, request.resource_type, reason)
+            if reason is None:
+                route.continue_()
+            else:
+                route.abort('blockedbyclient')
+
+        page.route('**/*', handle_route)
+        return report
+
+    async def attach_async(self, page) -> Dict[str, Any]:
+        """Installs the route handler on an async page and returns the report it keeps up to date"""
+        report = self.new_report()
+
+        async def handle_route(route):
+            request = route.request
+            reason = self.decide(request.url, request.resource_type)
+            self._record(report, request.resource_type, reason)
+            if reason is None:
+                await route.continue_()
+            else:
+                await route.abort('blockedbyclient')
+
+        await page.route('**/*', handle_route)
+        return report
@@ -0,0 +1,255 @@
+from typing import Dict, List, Any, Optional, Tuple
+import time
+
+# Resolves when document.fonts is ready or the budget runs out
+FONTS_READY_SCRIPT = """
+    ({ budgetMs }) => {
+        if (!document.fonts || !document.fonts.ready) {
+            return 'unsupported';
+        }
+        return Promise.race([
+            document.fonts.ready.then(() => 'ready'),
+            new Promise(resolve => setTimeout(() => resolve('timeout'), budgetMs))
+        ]);
+    }
+"""
+
+# The original settle step: jump to the bottom of the page and wait a fixed second
+JUMP_SCROLL_SCRIPT = """
+    ({ delayMs }) => {
+        window.scrollTo(0, document.body.scrollHeight);
+        return new Promise(resolve => setTimeout(() => resolve('done'), delayMs));
+    }
+"""
+
+# Fixed in-page sleep
+SLEEP_SCRIPT = """
+    ({ delayMs }) => new Promise(resolve => setTimeout(() => resolve('done'), delayMs))
+"""
+
+# Scrolls one viewport at a time. An IntersectionObserver watches lazy-load candidates and a
+# sentinel at the end of the body; each step waits only until newly visible candidates and the
+# DOM have had a frame to react, and scrolling stops at the bottom or when the budget runs out.
+INCREMENTAL_SCROLL_SCRIPT = """
+    async ({ budgetMs, stepDelayMs, maxSteps }) => {
+        const start = performance.now();
+        const nextFrame = () => new Promise(resolve => requestAnimationFrame(() => resolve()));
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+        let intersections = 0;
+
+        const observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    intersections++;
+                    observer.unobserve(entry.target);
+                }
+            });
+        });
+        document.querySelectorAll('img[loading="lazy"], iframe[loading="lazy"], [data-src], [data-srcset], [data-lazy]')
+            .forEach(el => observer.observe(el));
+        const sentinel = document.createElement('div');
+        sentinel.style.cssText = 'width:1px;height:1px;';
+        if (document.body) {
+            document.body.appendChild(sentinel);
+            observer.observe(sentinel);
+        }
+
+        let steps = 0;
+        let status = 'bottom';
+        while (true) {
+            const seen = intersections;
+            window.scrollBy(0, window.innerHeight);
+            steps++;
+            await nextFrame();
+            // Only linger when something lazy just came into view
+            if (intersections > seen) {
+                await sleep(stepDelayMs);
+            }
+            const atBottom = window.scrollY + window.innerHeight >= document.documentElement.scrollHeight - 2;
+            if (atBottom) {
+                break;
+            }
+            if (steps >= maxSteps) {
+                status = 'maxSteps';
+                break;
+            }
+            if (performance.now() - start >= budgetMs) {
+                status = 'timeout';
+                break;
+            }
+        }
+
+        observer.disconnect();
+        sentinel.remove();
+        return { status: status, steps: steps, intersections: intersections };
+    }
+"""
+
+# Resolves once no DOM mutation has happened and no font has been loading for quietMs
+QUIESCENCE_SCRIPT = """
+    ({ quietMs, budgetMs }) => new Promise(resolve => {
+        const start = performance.now();
+        let lastChange = start;
+        let mutations = 0;
+        const observer = new MutationObserver(records => {
+            mutations += records.length;
+            lastChange = performance.now();
+        });
+        observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+
+        const check = () => {
+            const now = performance.now();
+            if (document.fonts && document.fonts.status === 'loading') {
+                lastChange = now;
+            }
+            let status = null;
+            if (now - lastChange >= quietMs) {
+                status = 'quiet';
+            } else if (now - start >= budgetMs) {
+                status = 'timeout';
+            }
+            if (status) {
+                observer.disconnect();
+                resolve({ status: status, mutations: mutations });
+            } else {
+                setTimeout(check, Math.min(50, quietMs));
+            }
+        };
+        setTimeout(check, Math.min(50, quietMs));
+    })
+"""
+
+# Available settle policies:
+#   legacy     - networkidle, document.fonts.ready, jump to bottom + 1s, then a fixed 2s (the original behaviour)
+#   fonts      - load event, then document.fonts.ready
+#   quiescence - load event, fonts ready, then wait for a DOM/font quiet window
+#   scroll     - load event, fonts ready, incremental IntersectionObserver scroll, fonts ready
+#   adaptive   - load event, fonts ready, incremental scroll, quiet window, fonts ready
+SETTLE_POLICIES = ['adaptive', 'legacy', 'fonts', 'quiescence', 'scroll']
+
+DEFAULT_BUDGET_MS = {
+    'legacy': 13000,
+    'fonts': 5000,
+    'quiescence': 5000,
+    'scroll': 5000,
+    'adaptive': 5000
+}
+
+
+class SettlePolicy:
+    """Describes how long to wait after navigation before extracting fonts.
+
+    Every phase after navigation runs in-page and is capped by what is left of max_budget_ms,
+    so a slow page can never cost more than navigation plus the budget.
+    """
+
+    def __init__(self, name: str = 'adaptive', max_budget_ms: Optional[int] = None,
+                 quiet_window_ms: int = 300, scroll_step_delay_ms: int = 150, max_scroll_steps: int = 50,
+                 navigation_timeout_ms: int = 60000):
+        if name not in SETTLE_POLICIES:
+            raise ValueError(f"Unknown settle policy '{name}', expected one of: {', '.join(SETTLE_POLICIES)}")
+        self.name = name
+        self.max_budget_ms = max_budget_ms if max_budget_ms is not None else DEFAULT_BUDGET_MS[name]
+        self.quiet_window_ms = quiet_window_ms
+        self.scroll_step_delay_ms = scroll_step_delay_ms
+        self.max_scroll_steps = max_scroll_steps
+        self.navigation_timeout_ms = navigation_timeout_ms
+
+    @property
+    def wait_until(self) -> str:
+        """The Playwright goto wait_until state for this policy"""
+        return 'networkidle' if self.name == 'legacy' else 'load'
+
+    def phases(self) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Returns the (name, script, arg) phases to evaluate after navigation"""
+        fonts_ready = ('fontsReady', FONTS_READY_SCRIPT, {})
+        scroll = ('scroll', INCREMENTAL_SCROLL_SCRIPT, {
+            'stepDelayMs': self.scroll_step_delay_ms,
+            'maxSteps': self.max_scroll_steps
+        })
+        quiescence = ('quiescence', QUIESCENCE_SCRIPT, {'quietMs': self.quiet_window_ms})
+
+        if self.name == 'legacy':
+            return [
+                ('fontsReady', FONTS_READY_SCRIPT, {'budgetMs': 10000}),
+                ('scroll', JUMP_SCROLL_SCRIPT, {'delayMs': 1000}),
+                ('sleep', SLEEP_SCRIPT, {'delayMs': 2000})
+            ]
+        if self.name == 'fonts':
+            return [fonts_ready]
+        if self.name == 'quiescence':
+            return [fonts_ready, quiescence]
+        if self.name == 'scroll':
+            return [fonts_ready, scroll, ('fontsReadyAfterScroll',) + fonts_ready[1:]]
+        return [fonts_ready, scroll, quiescence, ('fontsReadyAfterScroll',) + fonts_ready[1:]]
+
+
+def _phase_arg(arg: Dict[str, Any], remaining_ms: float) -> Dict[str, Any]:
+    """Fills in the phase budget from what is left of the overall budget"""
+    arg = dict(arg)
+    arg['budgetMs'] = max(0, int(min(arg.get('budgetMs', remaining_ms), remaining_ms)))
+    return arg
+
+
+def _phase_status(result: Any) -> Any:
+    if isinstance(result, dict):
+        return result
+    return {'status': result}
+
+
+def settle_page(page, url: str, policy: Optional[SettlePolicy] = None) -> Dict[str, Any]:
+    """Navigates page to url and waits for it to settle, returning per-phase timings"""
+    policy = policy or SettlePolicy()
+    started = time.perf_counter()
+    phases = []
+
+    page.goto(url, wait_until=policy.wait_until, timeout=policy.navigation_timeout_ms)
+    phases.append({'name': 'goto', 'ms': round((time.perf_counter() - started) * 1000, 1), 'status': policy.wait_until})
+
+    settle_started = time.perf_counter()
+    for name, script, arg in policy.phases():
+        remaining_ms = policy.max_budget_ms - (time.perf_counter() - settle_started) * 1000
+        if remaining_ms <= 0:
+            phases.append({'name': name, 'ms': 0, 'status': 'skipped'})
+            continue
+        phase_started = time.perf_counter()
+        result = page.evaluate(script, _phase_arg(arg, remaining_ms))
+        phase = {'name': name, 'ms': round((time.perf_counter() - phase_started) * 1000, 1)}
+        phase.update(_phase_status(result))
+        phases.append(phase)
+
+    return {
+        'policy': policy.name,
+        'budgetMs': policy.max_budget_ms,
+        'phases': phases,
+        'totalMs': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+async def settle_page_async(page, url: str, policy: Optional[SettlePolicy] = None) -> Dict[str, Any]:
+    """asyncio counterpart of settle_page"""
+    policy = policy or SettlePolicy()
+    started = time.perf_counter()
+    phases = []
+
+    await page.goto(url, wait_until=policy.wait_until, timeout=policy.navigation_timeout_ms)
+    phases.append({'name': 'goto', 'ms': round((time.perf_counter() - started) * 1000, 1), 'status': policy.wait_until})
+
+    settle_started = time.perf_counter()
+    for name, script, arg in policy.phases():
+        remaining_ms = policy.max_budget_ms - (time.perf_counter() - settle_started) * 1000
+        if remaining_ms <= 0:
+            phases.append({'name': name, 'ms': 0, 'status': 'skipped'})
+            continue
+        phase_started = time.perf_counter()
+        result = await page.evaluate(script, _phase_arg(arg, remaining_ms))
+        phase = {'name': name, 'ms': round((time.perf_counter() - phase_started) * 1000, 1)}
+        phase.update(_phase_status(result))
+        phases.append(phase)
+
+    return {
+        'policy': policy.name,
+        'budgetMs': policy.max_budget_ms,
+        'phases': phases,
+        'totalMs': round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,124 @@
+from typing import Dict, Any, Iterable, Optional, Callable
+from urllib.parse import urlsplit
+from browser_pool import BrowserPool
+from font_extractor import analyze_fonts_batch, VARIATION_MERGE_FIELDS
+from stylesheet_memo import StylesheetMemo
+
+# Per-page sections merged by identity, with the fields that identify one entry
+_DEDUP_SECTIONS = {
+    'fontFaces': ('fontFamily', 'fontWeight', 'fontStyle', 'unicodeRange', 'src'),
+    'externalFonts': ('source', 'url'),
+    'fontFiles': ('url',),
+    'variableFonts': ('fontFamily', 'src'),
+    'cssImports': ('url', 'media'),
+    'loadedFonts': ('fontFamily', 'weight', 'style')
+}
+
+
+class SiteProfile:
+    """Running site-wide typography profile merged incrementally from per-page font_data.
+
+    to_font_data() has the shape of an analyze_fonts result, so the profile can be formatted
+    and sent to get_ai_analysis like a single page. Usage and character counts are summed
+    over pages; each font family also records on how many pages it was rendered.
+    """
+
+    def __init__(self, site: str = ''):
+        self.site = site
+        self.pages = 0
+        self.failed_pages = []
+        self._fonts = {}
+        self._sections = {name: {} for name in _DEDUP_SECTIONS}
+        self._declared = {}
+
+    def add(self, font_data: Dict[str, Any]):
+        """Merges one page's analyze_fonts result into the profile"""
+        self.pages += 1
+        for font in font_data.get('fonts', []):
+            family = self._fonts.get(font['fontFamily'])
+            if family is None:
+                family = {
+                    'fontFamily': font['fontFamily'],
+                    'totalUsageCount': 0,
+                    'totalCharacterCount': 0,
+                    'pageCount': 0,
+                    'elements': {},
+                    'variations': {}
+                }
+                self._fonts[font['fontFamily']] = family
+            family['totalUsageCount'] += font.get('totalUsageCount', 0)
+            family['totalCharacterCount'] += font.get('totalCharacterCount', 0)
+            family['pageCount'] += 1
+            family['elements'].update(dict.fromkeys(font.get('elements', [])))
+            for variation in font.get('variations', []):
+                key = tuple(variation.get(field) for field in VARIATION_MERGE_FIELDS)
+                merged = family['variations'].get(key)
+                if merged is None:
+                    family['variations'][key] = dict(variation, elements=list(variation.get('elements', [])))
+                    continue
+                merged['usageCount'] += variation.get('usageCount', 0)
+                merged['characterCount'] = merged.get('characterCount', 0) + variation.get('characterCount', 0)
+                for element in variation.get('elements', []):
+                    if element not in merged['elements']:
+                        merged['elements'].append(element)
+
+        for name, fields in _DEDUP_SECTIONS.items():
+            entries = self._sections[name]
+            for entry in font_data.get(name, []):
+                entries.setdefault(tuple(entry.get(field) for field in fields), entry)
+        self._declared.update(dict.fromkeys(font_data.get('declaredFonts', [])))
+
+    def add_failure(self, url: str, error: str):
+        self.failed_pages.append({'url': url, 'error': error})
+
+    def to_font_data(self) -> Dict[str, Any]:
+        fonts = []
+        for family in self._fonts.values():
+            fonts.append({
+                'fontFamily': family['fontFamily'],
+                'totalUsageCount': family['totalUsageCount'],
+                'totalCharacterCount': family['totalCharacterCount'],
+                'pageCount': family['pageCount'],
+                'elements': list(family['elements']),
+                'variations': sorted(family['variations'].values(), key=lambda v: v['usageCount'], reverse=True)
+            })
+        fonts.sort(key=lambda f: f['totalUsageCount'], reverse=True)
+
+        font_data = {'fonts': fonts}
+        for name in _DEDUP_SECTIONS:
+            font_data[name] = list(self._sections[name].values())
+        font_data['declaredFonts'] = list(self._declared)
+        font_data['url'] = self.site
+        font_data['site'] = {'pages': self.pages, 'failedPages': self.failed_pages}
+        return font_data
+
+
+def crawl_site(urls: Iterable[str], verbose: bool = False, pool: Optional[BrowserPool] = None,
+               pool_options: Optional[Dict[str, Any]] = None,
+               on_page: Optional[Callable[[str, Optional[Dict[str, Any]], Optional[str]], None]] = None,
+               **options) -> Dict[str, Any]:
+    """Analyzes the pages of one site in turn and returns the merged SiteProfile as font_data
+
+    One StylesheetMemo is shared by every page, so a stylesheet linked from many pages is
+    extracted once. on_page receives (url, font_data, error) for each page as it finishes.
+    Remaining keyword options are passed to analyze_fonts.
+    """
+    urls = list(urls)
+    site = ''
+    if urls:
+        parts = urlsplit(urls[0])
+        site = f'{parts.scheme}://{parts.netloc}'
+    memo = StylesheetMemo()
+    profile = SiteProfile(site)
+
+    for url, font_data, error in analyze_fonts_batch(urls, verbose, pool, pool_options, sheet_memo=memo, **options):
+        if error:
+            profile.add_failure(url, error)
+        else:
+            profile.add(font_data)
+        if on_page:
+            on_page(url, font_data, error)
+
+    result = profile.to_font_data()
+    result['site']['stylesheetMemo'] = memo.stats()
+    return result
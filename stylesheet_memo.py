@@ -0,0 +1,60 @@
+from typing import Dict, List, Any
+import json
+
+# Report sections that come from stylesheets and can be reused across pages
+SHEET_SECTIONS = ['fontFaces', 'variableFonts', 'cssImports']
+
+
+class StylesheetMemo:
+    """Remembers what each stylesheet of a site contributed so later pages skip re-extracting it.
+
+    Linked sheets are keyed in the page by href, rule count and the cssText lengths of their
+    first and last rules, so the CSSOM is not serialized on every page; an edit elsewhere that
+    keeps all three is missed. Inline sheets are keyed by a hash of their text. Pass one memo
+    to every analyze_fonts call of a site crawl.
+    """
+
+    def __init__(self):
+        self._sheets = {}
+        self._stats = {'sheetsExtracted': 0, 'sheetsReused': 0, 'payloadBytesSaved': 0}
+
+    def known_keys(self) -> List[str]:
+        return list(self._sheets)
+
+    def expand(self, sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuilds the stylesheet sections of a memoized extraction, in document order"""
+        sheets = sections.pop('sheets', None)
+        if sheets is None:
+            return sections
+
+        for sheet in sheets['extracted']:
+            entry = {name: sheet[name] for name in SHEET_SECTIONS + ['declaredFonts']}
+            entry['size'] = len(json.dumps(entry, separators=(',', ':')))
+            self._sheets[sheet['key']] = entry
+
+        # Families declared in stylesheets come before those from inline styles, as without a memo
+        declared = {}
+        extracted_here = {sheet['key'] for sheet in sheets['extracted']}
+        for key in sheets['keys']:
+            entry = self._sheets[key]
+            for name in SHEET_SECTIONS:
+                sections[name].extend(dict(item) for item in entry[name])
+            declared.update(dict.fromkeys(entry['declaredFonts']))
+            if key in extracted_here:
+                extracted_here.discard(key)
+            else:
+                self._stats['sheetsReused'] += 1
+                self._stats['payloadBytesSaved'] += entry['size']
+        declared.update(dict.fromkeys(sections['declaredFonts']))
+        sections['declaredFonts'] = list(declared)
+
+        self._stats['sheetsExtracted'] += len(sheets['extracted'])
+        sections['stylesheetMemo'] = {
+            'sheets': len(sheets['keys']),
+            'extracted': len(sheets['extracted']),
+            'reused': len(sheets['keys']) - len(sheets['extracted'])
+        }
+        return sections
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, uniqueSheets=len(self._sheets))
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip('openai')
+
+import ai_analyzer
+from ai_analyzer import get_ai_analysis
+from cache import ResponseCache
+
+
+def page():
+    return {'url': 'https://example.com/',
+            'fonts': [{'fontFamily': 'Inter', 'totalUsageCount': 10, 'elements': ['p'],
+                       'variations': [{'fontSizePx': 16, 'fontWeight': '400', 'fontStyle': 'normal',
+                                       'usageCount': 10, 'elements': ['p']}]}]}
+
+
+def test_cache_hits_report_no_api_usage(monkeypatch, tmp_path):
+    calls = []
+
+    def request_analysis(client, model, messages, max_retries, profiler, url):
+        calls.append(url)
+        return {'analysis': {}, 'usage': {'retries': 2, 'apiPromptTokens': 900, 'completionTokens': 300}}
+
+    monkeypatch.setattr(ai_analyzer, 'get_client', lambda api_key: None)
+    monkeypatch.setattr(ai_analyzer, '_request_analysis', request_analysis)
+    cache = ResponseCache(str(tmp_path / 'c.sqlite3'))
+    charged = []
+
+    first = get_ai_analysis(page(), 'key', cache=cache, before_request=charged.append)
+    assert first['usage']['retries'] == 2 and 'cached' not in first['usage']
+
+    second = get_ai_analysis(page(), 'key', cache=cache, before_request=charged.append)
+    assert len(calls) == len(charged) == 1
+    assert second['usage']['cached'] is True
+    assert second['usage']['promptTokens'] == first['usage']['promptTokens']
+    assert not {'retries', 'apiPromptTokens', 'completionTokens'} & set(second['usage'])
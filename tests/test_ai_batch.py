@@ -0,0 +1,107 @@
+import pytest
+
+pytest.importorskip('openai')
+
+import ai_batch
+from ai_analyzer import MalformedResponseError
+from ai_batch import get_ai_analyses, plan_batches
+from cache import ResponseCache
+
+
+def page(index):
+    return {'url': f'https://site{index}.example/',
+            'fonts': [{'fontFamily': f'Family {index}', 'totalUsageCount': 10, 'elements': ['p'],
+                       'variations': [{'fontSizePx': 16, 'fontWeight': '400', 'fontStyle': 'normal',
+                                       'usageCount': 10, 'elements': ['p']}]}]}
+
+
+def answer(label):
+    return {'analysis': {'overallQuality': label}, 'fontPairings': []}
+
+
+class FakeApi:
+    """Stands in for request_json and get_ai_analysis, recording every request"""
+
+    def __init__(self, monkeypatch, batch_answer):
+        self.batch_answer = batch_answer
+        self.batch_calls = 0
+        self.single_calls = []
+        monkeypatch.setattr(ai_batch, 'get_client', lambda api_key: None)
+        monkeypatch.setattr(ai_batch, 'request_json', self.request_json)
+        monkeypatch.setattr(ai_batch, 'get_ai_analysis', self.get_ai_analysis)
+
+    def request_json(self, client, model, messages, max_retries, profiler):
+        self.batch_calls += 1
+        answer = self.batch_answer(messages[1]['content'])
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, {'retries': 2}
+
+    def get_ai_analysis(self, font_data, *args):
+        self.single_calls.append(font_data['url'])
+        if 'broken' in font_data['url']:
+            raise Exception('AI Analysis failed: still broken')
+        return dict(answer('single'), usage={'promptTokens': 1})
+
+
+def test_sites_are_grouped_by_count_and_tokens():
+    sites = [{'sectionTokens': tokens} for tokens in (100, 100, 100, 950, 100, 100)]
+    assert plan_batches(sites, batch_size=2, token_ceiling=1000) == [[0, 1], [2], [3], [4, 5]]
+    assert plan_batches(sites, batch_size=10, token_ceiling=1000, overhead_tokens=500) == [[0, 1, 2], [3], [4, 5]]
+    assert plan_batches([{'sectionTokens': 5000}], token_ceiling=1000) == [[0]]
+
+
+def test_batched_answers_are_split_per_page(monkeypatch):
+    api = FakeApi(monkeypatch, lambda prompt: {'sites': {'1': answer('a'), '2': answer('b')}})
+    results = get_ai_analyses([page(1), page(2)], 'key', batch_size=5)
+    assert api.batch_calls == 1 and api.single_calls == []
+    assert [r['analysis']['overallQuality'] for r, _ in results] == ['a', 'b']
+    usage = results[0][0]['usage']
+    assert (usage['batchSize'], usage['batchRetries']) == (2, 2)
+    assert results[0][0]['issues'] == []
+
+
+def test_malformed_batch_falls_back_to_single_requests(monkeypatch):
+    api = FakeApi(monkeypatch, lambda prompt: MalformedResponseError('AI Analysis failed: Invalid JSON'))
+    results = get_ai_analyses([page(1), page(2)], 'key')
+    assert api.single_calls == ['https://site1.example/', 'https://site2.example/']
+    assert all(error is None for _, error in results)
+
+
+def test_only_missing_or_invalid_entries_fall_back(monkeypatch):
+    api = FakeApi(monkeypatch, lambda prompt: {'sites': {'1': answer('a'), '2': {'analysis': 'not an object'}}})
+    results = get_ai_analyses([page(1), page(2), page(3)], 'key')
+    assert api.single_calls == ['https://site2.example/', 'https://site3.example/']
+    assert [r['analysis']['overallQuality'] for r, _ in results] == ['a', 'single', 'single']
+
+
+def test_api_errors_are_raised_not_retried_per_page(monkeypatch):
+    api = FakeApi(monkeypatch, lambda prompt: Exception('OpenAI API authentication failed'))
+    with pytest.raises(Exception, match='authentication'):
+        get_ai_analyses([page(1), page(2)], 'key')
+    assert api.single_calls == []
+
+
+def test_failed_fallback_is_reported_for_its_page(monkeypatch):
+    FakeApi(monkeypatch, lambda prompt: {'sites': {'1': answer('a')}})
+    broken = dict(page(2), url='https://broken.example/')
+    results = get_ai_analyses([page(1), broken], 'key')
+    assert results[0][1] is None
+    assert results[1] == (None, 'AI Analysis failed: still broken')
+
+
+def test_cached_pages_skip_the_request(monkeypatch, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'c.sqlite3'))
+    api = FakeApi(monkeypatch, lambda prompt: {'sites': {'1': answer('a'), '2': answer('b')}})
+    get_ai_analyses([page(1), page(2)], 'key', cache=cache)
+    results = get_ai_analyses([page(1), page(2)], 'key', cache=cache)
+    assert api.batch_calls == 1
+    assert all(r['usage']['cached'] for r, _ in results)
+    assert not any({'batchSize', 'batchRetries'} & set(r['usage']) for r, _ in results)
+
+
+def test_before_request_sees_every_api_request(monkeypatch):
+    FakeApi(monkeypatch, lambda prompt: {'sites': {'1': answer('a'), '2': answer('b')}})
+    charged = []
+    get_ai_analyses([page(1), page(2)], 'key', before_request=charged.append)
+    assert len(charged) == 1 and charged[0] > 0
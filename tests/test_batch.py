@@ -0,0 +1,64 @@
+import json
+import pytest
+
+pytest.importorskip('playwright')
+pytest.importorskip('rich')
+
+import batch
+from batch import JsonlWriter, load_completed_urls, read_url_list
+
+SITEMAP = '<?xml version="1.0"?><{tag} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{tag}>'
+
+
+def urlset(*urls):
+    return SITEMAP.format(tag='urlset', entries=''.join(f'<url><loc> {url} </loc></url>' for url in urls))
+
+
+def sitemap_index(*urls):
+    return SITEMAP.format(tag='sitemapindex', entries=''.join(f'<sitemap><loc>{url}</loc></sitemap>' for url in urls))
+
+
+def test_text_lists_skip_comments_and_duplicates(tmp_path):
+    path = tmp_path / 'urls.txt'
+    path.write_text('# pages\nhttps://a.example/\n\nhttps://b.example/\nhttps://a.example/\n')
+    assert read_url_list(str(path)) == ['https://a.example/', 'https://b.example/']
+
+
+def test_sitemap_indexes_are_followed(tmp_path):
+    (tmp_path / 'pages.xml').write_text(urlset('https://a.example/', 'https://a.example/about'))
+    (tmp_path / 'posts.xml').write_text(urlset('https://a.example/post', 'https://a.example/about'))
+    (tmp_path / 'sitemap.xml').write_text(sitemap_index(str(tmp_path / 'pages.xml'), str(tmp_path / 'posts.xml')))
+    assert read_url_list(str(tmp_path / 'sitemap.xml')) == [
+        'https://a.example/', 'https://a.example/about', 'https://a.example/post'
+    ]
+
+
+def test_sitemap_recursion_is_bounded(tmp_path):
+    path = tmp_path / 'loop.xml'
+    path.write_text(sitemap_index(str(path)))
+    reads = []
+    read_source = batch._read_source
+
+    def counting(source):
+        reads.append(source)
+        return read_source(source)
+
+    batch._read_source = counting
+    try:
+        assert read_url_list(str(path)) == []
+    finally:
+        batch._read_source = read_source
+    assert len(reads) == 4
+
+
+def test_writer_appends_after_a_truncated_line_and_resume_skips_successes(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    path.write_text(json.dumps({'url': 'https://a.example/', 'error': None}) + '\n{"url": "https://b.exa')
+    with JsonlWriter(str(path), compact=True) as writer:
+        writer.write({'url': 'https://c.example/', 'error': None, 'fontData': {'fonts': [1], 'cssImports': []},
+                      'aiAnalysis': None})
+        writer.write({'url': 'https://d.example/', 'error': 'Timeout', 'fontData': None, 'aiAnalysis': None})
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[2]) == {'url': 'https://c.example/', 'error': None, 'fontData': {'fonts': [1]},
+                                    'aiAnalysis': None}
+    assert load_completed_urls(str(path)) == {'https://a.example/', 'https://c.example/'}
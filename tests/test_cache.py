@@ -0,0 +1,151 @@
+import json
+import pytest
+
+import cache
+from cache import ResponseCache, ResultCache, SqliteCache, options_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock)
+    return clock
+
+
+def test_values_round_trip_and_count_hits(tmp_path):
+    store = SqliteCache(str(tmp_path / 'c.sqlite3'))
+    assert store.get('k') is None
+    store.put('k', {'fonts': [1, 2]})
+    assert store.get('k') == {'fonts': [1, 2]}
+    stats = store.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    store = SqliteCache(str(tmp_path / 'c.sqlite3'), ttl_seconds=60)
+    store.put('k', 1)
+    clock.now += 59
+    assert store.get('k') == 1
+    clock.now += 2
+    assert store.get('k') is None
+    assert store.stats()['expired'] == 1
+    assert store.get_entry('k') is None
+
+
+def test_touch_restarts_the_ttl(tmp_path, clock):
+    store = SqliteCache(str(tmp_path / 'c.sqlite3'), ttl_seconds=60)
+    store.put('k', 1)
+    clock.now += 50
+    store.touch('k')
+    clock.now += 50
+    assert store.get('k') == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    store = SqliteCache(str(tmp_path / 'c.sqlite3'), ttl_seconds=None, max_bytes=None)
+    store.put('a', 'x' * 100)
+    size = store.stats()['bytes']
+    store.max_bytes = 3 * size
+    for key in ('b', 'c'):
+        clock.now += 1
+        store.put(key, 'x' * 100)
+    clock.now += 1
+    store.get('a')
+    clock.now += 1
+    store.put('d', 'x' * 100)
+    assert store.get('b') is None
+    assert all(store.get(key) is not None for key in ('a', 'c', 'd'))
+    assert store.stats()['evictions'] == 1
+
+
+def test_fingerprint_mismatch_is_a_miss(tmp_path):
+    store = SqliteCache(str(tmp_path / 'c.sqlite3'))
+    store.put('k', 1, fingerprint='v1')
+    assert store.get('k', 'v1') == 1
+    assert store.get('k', 'v2') is None
+
+
+def test_namespaces_are_validated(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteCache(str(tmp_path / 'c.sqlite3'), namespace='results; DROP TABLE x')
+
+
+def fingerprint(digest, etag=None):
+    return {'hash': digest, 'etag': etag, 'lastModified': None, 'stylesheets': [], 'notModified': False}
+
+
+def test_result_is_served_while_the_fingerprint_is_unchanged(tmp_path, monkeypatch):
+    results = ResultCache(str(tmp_path / 'c.sqlite3'))
+    served = {'fingerprint': fingerprint('h1')}
+    monkeypatch.setattr(cache, 'fetch_fingerprint', lambda url, previous=None: served['fingerprint'])
+
+    result, current = results.lookup('https://example.com/')
+    assert result is None and current['hash'] == 'h1'
+    results.store_result('https://example.com/', {'fonts': []}, current)
+
+    assert results.lookup('https://example.com/')[0] == {'fonts': []}
+    served['fingerprint'] = fingerprint('h2')
+    result, current = results.lookup('https://example.com/')
+    assert result is None and current['hash'] == 'h2'
+
+
+def test_not_modified_answer_keeps_the_result(tmp_path, monkeypatch):
+    results = ResultCache(str(tmp_path / 'c.sqlite3'))
+    results.store_result('https://example.com/', {'fonts': []}, fingerprint('h1', etag='"e1"'))
+    seen = []
+
+    def not_modified(url, previous=None):
+        seen.append(previous)
+        return dict(previous, notModified=True)
+
+    monkeypatch.setattr(cache, 'fetch_fingerprint', not_modified)
+    assert results.lookup('https://example.com/')[0] == {'fonts': []}
+    assert seen[0]['etag'] == '"e1"'
+
+
+def test_refresh_and_unreachable_pages_fall_through_to_a_render(tmp_path, monkeypatch):
+    results = ResultCache(str(tmp_path / 'c.sqlite3'))
+    results.store_result('https://example.com/', {'fonts': []}, fingerprint('h1'))
+    monkeypatch.setattr(cache, 'fetch_fingerprint', lambda url, previous=None: fingerprint('h1'))
+    result, current = results.lookup('https://example.com/', refresh=True)
+    assert result is None and current['hash'] == 'h1'
+
+    def unreachable(url, previous=None):
+        raise OSError('connection refused')
+
+    monkeypatch.setattr(cache, 'fetch_fingerprint', unreachable)
+    assert results.lookup('https://example.com/') == (None, None)
+
+
+def test_results_are_keyed_by_extraction_options(tmp_path, monkeypatch):
+    results = ResultCache(str(tmp_path / 'c.sqlite3'))
+    monkeypatch.setattr(cache, 'fetch_fingerprint', lambda url, previous=None: fingerprint('h1'))
+    results.store_result('https://example.com/', {'collector': 'elements'}, fingerprint('h1'), {'collector': 'elements'})
+    assert results.lookup('https://example.com/', {'collector': 'elements'})[0] == {'collector': 'elements'}
+    assert results.lookup('https://example.com/', {'collector': 'textnodes'})[0] is None
+
+
+def test_options_key_ignores_observers_and_flattens_objects():
+    class Settle:
+        def __init__(self):
+            self.policy = 'adaptive'
+            self.types = {'image', 'media'}
+            self._internal = object()
+
+    key = options_key({'profiler': object(), 'font_store': object(), 'collector': 'elements', 'settle': Settle()})
+    assert key == {'collector': 'elements', 'settle': {'policy': 'adaptive', 'types': ['image', 'media']}}
+    json.dumps(key)
+
+
+def test_response_cache_keys_are_canonical():
+    messages = [{'role': 'user', 'content': 'hi'}]
+    assert ResponseCache.key_for('m', messages, 0.7) == ResponseCache.key_for('m', [dict(messages[0])], 0.7)
+    assert ResponseCache.key_for('m', messages, 0.7) != ResponseCache.key_for('m2', messages, 0.7)
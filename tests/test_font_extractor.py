@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip('playwright')
+
+from font_extractor import (
+    VARIATION_MERGE_FIELDS, build_font_data, frame_results, frame_script_options, merge_frame_fonts
+)
+
+
+def variation(size='16px', line_height='24px', color='rgb(0, 0, 0)', usage=1, elements=('p',)):
+    return {'fontSize': size, 'fontWeight': '400', 'fontStyle': 'normal', 'lineHeight': line_height,
+            'color': color, 'usageCount': usage, 'characterCount': usage * 10, 'elements': list(elements)}
+
+
+def font(family, *variations, codepoints=None):
+    entry = {'fontFamily': family, 'totalUsageCount': sum(v['usageCount'] for v in variations),
+             'totalCharacterCount': sum(v['characterCount'] for v in variations),
+             'elements': sorted({tag for v in variations for tag in v['elements']}), 'variations': list(variations)}
+    if codepoints is not None:
+        entry['codepoints'] = codepoints
+    return entry
+
+
+def test_single_frame_is_returned_unchanged():
+    fonts = [font('Inter', variation())]
+    assert merge_frame_fonts([('https://example.com/', fonts), ('https://ads.example/', [])]) is fonts
+    assert merge_frame_fonts([('https://example.com/', None)]) == []
+
+
+def test_frames_merge_by_family_and_variation_key():
+    main = [font('Inter', variation(usage=3), variation(size='32px', usage=1, elements=('h1',)))]
+    child = [font('Inter', variation(usage=2, elements=('span',))), font('Lora', variation(usage=1))]
+    merged = merge_frame_fonts([('https://example.com/', main), ('https://embed.example/', child)])
+
+    assert [f['fontFamily'] for f in merged] == ['Inter', 'Lora']
+    inter = merged[0]
+    assert inter['totalUsageCount'] == 6
+    assert inter['sources'] == {'https://example.com/': 4, 'https://embed.example/': 2}
+    assert inter['elements'] == ['h1', 'p', 'span']
+    body = inter['variations'][0]
+    assert (body['fontSize'], body['usageCount'], body['characterCount']) == ('16px', 5, 50)
+    assert body['elements'] == ['p', 'span']
+    assert body['sources'] == {'https://example.com/': 3, 'https://embed.example/': 2}
+
+
+def test_line_height_and_colour_keep_variations_apart():
+    assert {'lineHeight', 'color'} <= set(VARIATION_MERGE_FIELDS)
+    main = [font('Inter', variation(line_height='24px'))]
+    child = [font('Inter', variation(line_height='32px'), variation(color='rgb(255, 0, 0)'))]
+    merged = merge_frame_fonts([('https://example.com/', main), ('https://embed.example/', child)])
+    assert len(merged[0]['variations']) == 3
+
+
+def test_sampled_errors_and_codepoints_combine():
+    main = [font('Inter', dict(variation(), usageCountStdError=3.0), codepoints='abc')]
+    main[0]['usageCountStdError'] = 3.0
+    child = [font('Inter', dict(variation(), usageCountStdError=4.0), codepoints='cd')]
+    child[0]['usageCountStdError'] = 4.0
+    merged = merge_frame_fonts([('https://example.com/', main), ('https://embed.example/', child)])[0]
+    assert merged['usageCountStdError'] == 5.0
+    assert merged['variations'][0]['usageCountStdError'] == 5.0
+    assert merged['codepoints'] == 'abcd'
+
+
+def test_frame_errors_are_listed_and_usage_is_merged():
+    class Frame:
+        def __init__(self, url):
+            self.url = url
+            self.name = ''
+
+    frames = frame_results([Frame('https://embed.example/'), Frame('https://gone.example/')],
+                           [{'fonts': [font('Inter', variation(usage=2))]}, RuntimeError('Frame was detached\nstack')])
+    font_data = build_font_data('https://example.com/', {'fonts': [font('Inter', variation())]}, frames, [])
+    assert font_data['fonts'][0]['totalUsageCount'] == 3
+    assert font_data['frames'] == [
+        {'url': 'https://embed.example/', 'name': '', 'fonts': 1, 'usageCount': 2},
+        {'url': 'https://gone.example/', 'name': '', 'error': 'Frame was detached'}
+    ]
+
+
+def test_child_frames_only_collect_usage():
+    options = frame_script_options('textnodes', parse_fonts=True, style_sharing=True)
+    assert options == {'collector': 'textnodes', 'usageOnly': True, 'codepoints': True, 'styleSharing': True}
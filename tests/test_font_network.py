@@ -0,0 +1,74 @@
+from font_network import FontNetworkMonitor, build_font_network_report, match_families
+
+
+class Response:
+    def __init__(self, url, content_type, status=200):
+        self.url = url
+        self.status = status
+        self.headers = {'content-type': content_type, 'cache-control': 'max-age=60'}
+        self.from_service_worker = False
+
+    def body(self):
+        return b'wOF2'
+
+
+class Request:
+    def __init__(self, url, response=None, failure=None):
+        self.url = url
+        self._response = response
+        self.failure = failure
+        self.headers = {'referer': 'https://example.com/site.css'}
+        self.timing = {'startTime': 10.0, 'requestStart': 1.0, 'responseStart': 5.0, 'responseEnd': 20.0}
+
+    def response(self):
+        return self._response
+
+    def sizes(self):
+        return {'responseBodySize': 2048, 'responseHeadersSize': 100}
+
+
+class Page:
+    def __init__(self):
+        self.listeners = {}
+
+    def on(self, event, listener):
+        self.listeners.setdefault(event, []).append(listener)
+
+    def emit(self, event, request):
+        for listener in self.listeners.get(event, []):
+            listener(request)
+
+
+def test_one_listener_records_files_and_network_entries():
+    page = Page()
+    monitor = FontNetworkMonitor(capture_bodies=True)
+    monitor.attach(page)
+    assert 'response' not in page.listeners
+
+    font_url = 'https://cdn.example/inter.woff2'
+    page.emit('requestfinished', Request(font_url, Response(font_url, 'font/woff2')))
+    page.emit('requestfinished', Request('https://example.com/logo.svg',
+                                         Response('https://example.com/logo.svg', 'image/svg+xml')))
+    page.emit('requestfailed', Request('https://cdn.example/lora.ttf', failure='net::ERR_FAILED'))
+
+    assert monitor.files == [{'url': font_url, 'type': 'font/woff2', 'status': 200}]
+    assert [entry['url'] for entry in monitor.entries] == [font_url, 'https://cdn.example/lora.ttf']
+    assert monitor.entries[0]['referer'] == 'https://example.com/site.css'
+    assert monitor.entries[0]['transferBytes'] == 2148
+    assert monitor.entries[0]['timing']['ttfbMs'] == 4.0
+    assert monitor.bodies == {font_url: b'wOF2'}
+
+
+def test_report_matches_families_and_warns():
+    entries = [{'url': 'https://cdn.example/fonts/inter.ttf', 'status': 200, 'transferBytes': 400 * 1024,
+                'decodedBytes': 400 * 1024, 'cacheControl': None, 'timing': {'totalMs': 50.0}, 'startTime': 0.0}]
+    font_data = {'url': 'https://example.com/', 'fonts': [{'fontFamily': 'Lora'}],
+                 'fontFaces': [{'fontFamily': '"Inter"', 'src': 'url(/fonts/inter.ttf) format("truetype")'}]}
+    report = build_font_network_report(entries, font_data, first_start=0.0)
+    assert report['files'][0]['families'] == ['Inter']
+    assert report['totals']['unusedFiles'] == 1
+    assert any('page budget' in warning for warning in report['warnings'])
+    assert any('WOFF2 would be smaller' in warning for warning in report['warnings'])
+    # A src relative to a stylesheet still matches by path
+    assert match_families('https://cdn.example/fonts/inter.ttf',
+                          {'https://example.com/fonts/inter.ttf': ['Inter']}) == ['Inter']
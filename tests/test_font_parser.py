@@ -0,0 +1,136 @@
+import struct
+import pytest
+
+import font_parser
+from benchmarks.fixtures import build_font, to_woff
+from font_parser import analyze_font_binaries, covers, parse_font, parse_font_file
+from font_store import FontStore
+
+WOFF2_TAG_INDEX = {tag: index for index, tag in enumerate(font_parser.WOFF2_KNOWN_TAGS)}
+
+
+def base128(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def to_woff2(font):
+    """Wraps a TrueType font in WOFF2 without table transforms"""
+    brotli = pytest.importorskip('brotli')
+    num_tables = struct.unpack_from('>H', font, 4)[0]
+    records = [struct.unpack_from('>4sIII', font, 12 + 16 * i) for i in range(num_tables)]
+    directory, stream = b'', b''
+    for tag, _, offset, length in records:
+        tag = tag.decode('latin-1')
+        # Transform version 3 is the null transform for glyf/loca, 0 for every other table
+        transform = 3 if tag in ('glyf', 'loca') else 0
+        directory += bytes([transform << 6 | WOFF2_TAG_INDEX[tag]]) + base128(length)
+        stream += font[offset:offset + length]
+    compressed = brotli.compress(stream)
+    body = directory + compressed
+    header = struct.pack('>4s4sIHHIIHHIIIII', b'wOF2', font[0:4], 48 + len(body), num_tables, 0, len(font),
+                         len(compressed), 1, 0, 0, 0, 0, 0, 0)
+    return header + body
+
+
+@pytest.fixture(autouse=True)
+def empty_parse_cache():
+    font_parser._parse_cache.clear()
+
+
+def test_parses_truetype():
+    info = parse_font(build_font('Bench Serif', 700))
+    assert info['container'] == 'sfnt'
+    assert info['outlines'] == 'truetype'
+    assert info['familyName'] == 'Bench Serif'
+    assert info['weightClass'] == 700
+    assert info['glyphCount'] == 96
+    assert info['cmapRanges'] == [[32, 126]]
+    assert info['mappedCodepoints'] == 95
+    assert not info['isVariable']
+
+
+def test_parses_woff_and_variable_axes():
+    info = parse_font(to_woff(build_font('Bench Flex', variable=True)))
+    assert info['container'] == 'woff'
+    assert info['isVariable']
+    assert info['axes'] == [{'tag': 'wght', 'min': 100.0, 'default': 400.0, 'max': 900.0, 'name': 'Weight'}]
+
+
+def test_parses_woff2():
+    font = build_font('Bench Sans', 400)
+    info = parse_font(to_woff2(font))
+    assert info['container'] == 'woff2'
+    expected = parse_font(font)
+    for key in ('familyName', 'weightClass', 'glyphCount', 'cmapRanges', 'glyphDataShare'):
+        assert info[key] == expected[key]
+
+
+@pytest.mark.skipif(font_parser.brotli is not None, reason='brotli is installed')
+def test_woff2_without_brotli_is_an_error():
+    info = parse_font(b'wOF2' + bytes(60))
+    assert 'brotli' in info['error']
+
+
+def test_invalid_data_is_reported_not_raised():
+    info = parse_font(b'not a font at all')
+    assert 'Not a font file' in info['error']
+
+
+def test_results_are_cached_by_content():
+    font = build_font('Bench Mono')
+    first = parse_font(font)
+    hits = font_parser.parse_cache_stats()['cacheHits']
+    assert parse_font(bytes(font)) is first
+    assert font_parser.parse_cache_stats()['cacheHits'] == hits + 1
+
+
+def test_parses_files_through_a_memory_map(tmp_path):
+    path = tmp_path / 'font.ttf'
+    path.write_bytes(build_font('Bench Display', 900))
+    assert parse_font_file(str(path))['weightClass'] == 900
+
+
+def test_covers():
+    ranges = [[32, 126], [160, 255]]
+    assert covers(ranges, ord('A'))
+    assert covers(ranges, 160)
+    assert not covers(ranges, 127)
+    assert not covers(None, 65)
+
+
+def page(rendered='Hello'):
+    return {
+        'url': 'https://example.com/',
+        'fonts': [{'fontFamily': 'Bench Sans', 'codepoints': rendered}],
+        'fontFaces': [{'fontFamily': '"Bench Sans"', 'src': 'url(/fonts/sans.woff) format("woff")'}]
+    }
+
+
+def test_binaries_report_glyph_usage_and_coverage():
+    font_data = page('Helloé')
+    report = analyze_font_binaries({'https://example.com/fonts/sans.woff': to_woff(build_font('Bench Sans'))}, font_data)
+    entry = report['files'][0]
+    assert entry['families'] == ['Bench Sans']
+    assert entry['renderedCodepoints'] == 4
+    assert entry['wastedGlyphBytes'] > 0
+    family = report['byFamily']['Bench Sans']
+    assert family['missingCodepoints'] == 'é'
+    assert family['coverage'] == round(1 - 1 / 6, 4)
+    assert report['totals']['parsed'] == 1
+    assert 'codepoints' not in font_data['fonts'][0]
+
+
+def test_parse_results_are_stored_but_errors_are_not(tmp_path):
+    store = FontStore(str(tmp_path))
+    bodies = {'https://example.com/fonts/sans.woff': to_woff(build_font('Bench Sans')),
+              'https://example.com/fonts/broken.woff': b'not a font'}
+    analyze_font_binaries(bodies, page(), store)
+    good = store.digest_for_url('https://example.com/fonts/sans.woff')
+    broken = store.digest_for_url('https://example.com/fonts/broken.woff')
+    assert store.get_metadata(good, 'parse')['familyName'] == 'Bench Sans'
+    assert store.get_metadata(broken, 'parse') is None
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import pytest
+
+import font_store
+from font_store import FontStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+
+    def time():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(font_store.time, 'time', time)
+
+
+def test_binaries_are_stored_once_with_every_alias(tmp_path):
+    store = FontStore(str(tmp_path))
+    digest = store.add('https://a.example/font.woff2', b'font-bytes')
+    assert digest == hashlib.sha256(b'font-bytes').hexdigest()
+    assert store.add('https://b.example/copy.woff2?v=2', b'font-bytes') == digest
+    assert store.read(digest) == b'font-bytes'
+    assert sorted(store.aliases(digest)) == ['https://a.example/font.woff2', 'https://b.example/copy.woff2?v=2']
+    assert store.digest_for_url('https://b.example/copy.woff2?v=2') == digest
+
+    stats = store.stats()
+    assert (stats['binaries'], stats['aliases'], stats['observations']) == (1, 2, 2)
+    assert stats['run']['duplicateObservations'] == 1
+    assert stats['run']['duplicateBytes'] == len(b'font-bytes')
+
+
+def test_binaries_from_an_earlier_run_count_as_duplicates(tmp_path):
+    FontStore(str(tmp_path)).add('https://a.example/font.woff2', b'font-bytes')
+    store = FontStore(str(tmp_path))
+    store.add('https://a.example/font.woff2', b'font-bytes')
+    assert store.stats()['run']['newBinaries'] == 0
+    assert store.stats()['run']['duplicateObservations'] == 1
+
+
+def test_least_recently_used_binaries_are_evicted(tmp_path, clock):
+    store = FontStore(str(tmp_path), max_bytes=30)
+    old = store.add('https://a.example/old.woff2', b'o' * 10)
+    used = store.add('https://a.example/used.woff2', b'u' * 10)
+    store.put_metadata(old, 'parse', {'familyName': 'Old'})
+    store.read(old)
+    store.add('https://a.example/third.woff2', b't' * 10)
+    newest = store.add('https://a.example/newest.woff2', b'n' * 10)
+
+    assert store.read(used) is None
+    assert not os.path.exists(store.path_for(used))
+    assert store.digest_for_url('https://a.example/used.woff2') is None
+    assert store.read(old) == b'o' * 10
+    assert store.get_metadata(old, 'parse') == {'familyName': 'Old'}
+    assert store.read(newest) == b'n' * 10
+    assert store.stats()['run']['evictions'] == 1
+
+
+def test_a_binary_larger_than_the_store_is_kept_until_the_next_one(tmp_path, clock):
+    store = FontStore(str(tmp_path), max_bytes=5)
+    big = store.add('https://a.example/big.woff2', b'b' * 10)
+    assert store.read(big) == b'b' * 10
+    store.add('https://a.example/next.woff2', b'n' * 10)
+    assert store.read(big) is None
+
+
+def test_metadata_is_computed_once(tmp_path):
+    store = FontStore(str(tmp_path))
+    digest = store.add('https://a.example/font.woff2', b'font-bytes')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'glyphCount': 3}
+
+    assert store.metadata(digest, 'parse', compute) == {'glyphCount': 3}
+    assert store.metadata(digest, 'parse', compute) == {'glyphCount': 3}
+    assert len(calls) == 1
+
+
+def test_rejected_metadata_is_returned_but_not_stored(tmp_path):
+    store = FontStore(str(tmp_path))
+    digest = store.add('https://a.example/font.woff2', b'font-bytes')
+    keep = lambda result: 'error' not in result
+    assert store.metadata(digest, 'parse', lambda: {'error': 'no brotli'}, keep) == {'error': 'no brotli'}
+    assert store.get_metadata(digest, 'parse') is None
+    assert store.metadata(digest, 'parse', lambda: {'glyphCount': 3}, keep) == {'glyphCount': 3}
+
+    # An error stored before keep existed is computed again
+    store.put_metadata(digest, 'other', {'error': 'old'})
+    assert store.metadata(digest, 'other', lambda: {'glyphCount': 4}, keep) == {'glyphCount': 4}
+
+
+def test_metadata_of_an_evicted_binary_is_dropped(tmp_path):
+    store = FontStore(str(tmp_path))
+    store.put_metadata('0' * 64, 'parse', {'glyphCount': 1})
+    assert store.get_metadata('0' * 64, 'parse') is None
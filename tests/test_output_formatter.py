@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip('rich')
+
+from output_formatter import LIST_SECTIONS, iter_ndjson_records, json_sections
+
+
+def test_optional_sections_appear_only_when_present():
+    font_data = {'url': 'https://example.com/', 'fonts': [{'fontFamily': 'Inter'}], 'metrics': {'distinctSizes': 1},
+                 'sampling': None}
+    assert list(json_sections(font_data)) == LIST_SECTIONS + ['metrics']
+    record = next(iter_ndjson_records(font_data, None))
+    assert 'frames' not in record and 'sampling' not in record
+    assert record['fontFaces'] == [] and record['aiAnalysis'] is None
+
+
+def test_by_section_records_split_lists():
+    font_data = {'url': 'https://example.com/', 'fonts': ['a', 'b'], 'site': {'pages': 2}}
+    assert list(iter_ndjson_records(font_data, {'analysis': {}}, by_section=True)) == [
+        {'url': 'https://example.com/', 'section': 'fonts', 'index': 0, 'data': 'a'},
+        {'url': 'https://example.com/', 'section': 'fonts', 'index': 1, 'data': 'b'},
+        {'url': 'https://example.com/', 'section': 'site', 'data': {'pages': 2}},
+        {'url': 'https://example.com/', 'section': 'aiAnalysis', 'data': {'analysis': {}}}
+    ]
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+
+pytest.importorskip('playwright')
+pytest.importorskip('openai')
+
+import pipeline
+from pipeline import run_pipeline
+
+
+def page(url, sizes=(16, 20, 25)):
+    return {'url': url, 'fonts': [{'fontFamily': 'Inter', 'totalUsageCount': len(sizes), 'elements': ['p'],
+                                   'variations': [{'fontSize': f'{size}px', 'fontSizePx': size, 'fontWeight': '400',
+                                                   'fontStyle': 'normal', 'usageCount': 1, 'elements': ['p']}
+                                                  for size in sizes]}]}
+
+
+def fake_extraction(monkeypatch, failures=()):
+    """Replaces rendering with pages built from the URL, consulting the lookup first like the real stage"""
+    rendered = []
+
+    async def analyze_fonts_concurrent(urls, concurrency, per_host_limit, verbose, pool_options=None, lookup=None,
+                                       **options):
+        for url in urls:
+            hit = lookup(url) if lookup else None
+            if hit is not None:
+                yield url, hit, None
+            elif url in failures:
+                yield url, None, 'Timeout'
+            else:
+                rendered.append(url)
+                yield url, page(url), None
+
+    monkeypatch.setattr(pipeline, 'analyze_fonts_concurrent', analyze_fonts_concurrent)
+    return rendered
+
+
+def run(urls, **options):
+    records = []
+    stats = asyncio.run(run_pipeline(urls, records.append, **options))
+    return sorted(records, key=lambda record: record['url']), stats
+
+
+def test_lookup_hits_skip_rendering_and_are_marked_cached(monkeypatch):
+    rendered = fake_extraction(monkeypatch)
+    extracted = []
+    cached = page('https://a.example/')
+    records, stats = run(['https://a.example/', 'https://b.example/'],
+                         lookup=lambda url: cached if url == 'https://a.example/' else None,
+                         on_extracted=lambda url, font_data: extracted.append(url))
+    assert rendered == extracted == ['https://b.example/']
+    assert records[0] == {'url': 'https://a.example/', 'error': None, 'fontData': cached, 'aiAnalysis': None,
+                          'cached': True}
+    assert 'cached' not in records[1]
+    assert stats['extracted'] == 1
+
+
+def test_failed_extraction_is_emitted_without_analysis(monkeypatch):
+    fake_extraction(monkeypatch, failures={'https://b.example/'})
+    monkeypatch.setattr(pipeline, 'get_ai_analysis', lambda font_data, *args, **kwargs: {'usage': {'retries': 1}})
+    records, stats = run(['https://a.example/', 'https://b.example/'], api_key='key')
+    assert records[0]['aiAnalysis'] == {'usage': {'retries': 1}}
+    assert records[1] == {'url': 'https://b.example/', 'error': 'Timeout', 'fontData': None, 'aiAnalysis': None}
+    assert (stats['analyzed'], stats['extractionFailed'], stats['aiRetries']) == (1, 1, 1)
+
+
+def test_batch_errors_fail_each_page_of_the_batch(monkeypatch):
+    fake_extraction(monkeypatch)
+
+    def get_ai_analyses(pages, *args, **kwargs):
+        raise Exception('OpenAI API authentication failed')
+
+    monkeypatch.setattr(pipeline, 'get_ai_analyses', get_ai_analyses)
+    # A page that ends up alone in its batch is sent through get_ai_analysis instead
+    monkeypatch.setattr(pipeline, 'get_ai_analysis', get_ai_analyses)
+    urls = [f'https://site{index}.example/' for index in range(3)]
+    records, stats = run(urls, api_key='key', ai_concurrency=1, ai_batch_size=3)
+    assert all(record['error'] == 'OpenAI API authentication failed' for record in records)
+    assert all(record['fontData'] is not None for record in records)
+    assert (stats['analysisFailed'], stats['analyzed'], stats['aiBatches']) == (3, 0, 0)
+
+
+def test_consistent_pages_skip_the_ai(monkeypatch):
+    fake_extraction(monkeypatch)
+    monkeypatch.setattr(pipeline, 'get_ai_analysis', lambda *args, **kwargs: pytest.fail('AI was called'))
+    records, stats = run(['https://a.example/'], api_key='key', skip_ai_above=90)
+    assert records[0]['fontData']['metrics']['consistencyScore'] >= 90
+    assert stats['aiSkipped'] == 1
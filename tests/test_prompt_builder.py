@@ -0,0 +1,80 @@
+import prompt_builder
+from prompt_builder import (
+    TRIM_LEVELS, build_prompt, build_batch_prompt, batch_overhead_tokens, count_tokens, encode_site
+)
+
+
+def font_data(families=3, variations=30):
+    fonts = []
+    for f in range(families):
+        fonts.append({
+            'fontFamily': f'Family {f}',
+            'totalUsageCount': 1000 - f,
+            'elements': ['p', 'h1'],
+            'variations': [{'fontSizePx': 10 + v, 'fontWeight': '400', 'fontStyle': 'normal', 'lineHeightValue': 20,
+                            'usageCount': 1000 - v * 33, 'elements': ['p'], 'sampleText': 'The quick brown fox ' * 5}
+                           for v in range(variations)]
+        })
+    return {
+        'url': 'https://example.com/',
+        'fonts': fonts,
+        'fontFaces': [{'fontFamily': 'Family 0', 'fontWeight': '400', 'fontStyle': 'normal',
+                       'src': f'url(https://cdn.example.com/f{i}.woff2?v=1)', 'fontDisplay': 'swap'}
+                      for i in range(40)],
+        'declaredFonts': ['Family 0', 'Unused'],
+    }
+
+
+def test_count_tokens_estimates_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(prompt_builder, 'tiktoken', None)
+    assert count_tokens('') == 0
+    assert count_tokens('abcd') == 1
+    assert count_tokens('abcde') == 2
+
+
+def test_prompt_within_budget_is_not_trimmed():
+    built = build_prompt(font_data(1, 2), token_budget=100000)
+    assert built['trimLevel'] == 0
+    assert not built['overBudget']
+    assert built['droppedVariations'] == 0
+    assert 'Declared but unused fonts: Unused' in built['prompt']
+
+
+def test_tight_budget_trims_until_it_fits():
+    data = font_data()
+    full = build_prompt(data, token_budget=100000)
+    built = build_prompt(data, token_budget=full['tokens'] // 2)
+    assert 0 < built['trimLevel'] < len(TRIM_LEVELS)
+    assert built['tokens'] <= built['tokenBudget']
+    assert not built['overBudget']
+    assert built['droppedVariations'] > 0
+
+
+def test_budget_below_the_last_level_reports_over_budget():
+    built = build_prompt(font_data(), token_budget=10)
+    assert built['trimLevel'] == len(TRIM_LEVELS) - 1
+    assert built['overBudget']
+    assert built['fontsShown'] == TRIM_LEVELS[-1]['max_fonts']
+
+
+def test_font_face_subsets_collapse_into_one_row():
+    prompt = build_prompt(font_data(1, 1), token_budget=100000)['prompt']
+    assert 'Family 0|400|normal|swap|40|40|cdn.example.com/f0.woff2' in prompt
+
+
+def test_encode_site_matches_build_prompt():
+    data = font_data()
+    site = encode_site(data, 2000, system_prompt='system')
+    built = build_prompt(data, 2000, system_prompt='system')
+    assert site['prompt'] == built['prompt']
+    assert site['tokens'] == built['tokens']
+    assert site['sectionTokens'] < site['tokens']
+
+
+def test_batch_prompt_lists_every_site():
+    sites = [encode_site(dict(font_data(1, 2), url=f'https://site{i}.example/')) for i in range(3)]
+    built = build_batch_prompt(sites)
+    assert len(built['siteIds']) == 3
+    for site_id, site in zip(built['siteIds'], sites):
+        assert f'=== Site {site_id}: {site["url"]} ===' in built['prompt']
+    assert built['tokens'] >= batch_overhead_tokens()
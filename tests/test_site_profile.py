@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip('playwright')
+
+from site_profile import SiteProfile
+
+
+def variation(size, usage, line_height='24px', elements=('p',)):
+    return {'fontSize': size, 'fontWeight': '400', 'fontStyle': 'normal', 'lineHeight': line_height,
+            'color': 'rgb(0, 0, 0)', 'usageCount': usage, 'characterCount': usage * 10, 'elements': list(elements)}
+
+
+def page(url, *fonts, faces=()):
+    return {'url': url, 'fonts': list(fonts), 'fontFaces': list(faces), 'externalFonts': [], 'fontFiles': [],
+            'variableFonts': [], 'cssImports': [], 'loadedFonts': [], 'declaredFonts': [f['fontFamily'] for f in fonts]}
+
+
+def font(family, *variations):
+    return {'fontFamily': family, 'totalUsageCount': sum(v['usageCount'] for v in variations),
+            'totalCharacterCount': sum(v['characterCount'] for v in variations),
+            'elements': sorted({tag for v in variations for tag in v['elements']}), 'variations': list(variations)}
+
+
+def test_pages_merge_into_one_profile():
+    face = {'fontFamily': 'Inter', 'fontWeight': '400', 'fontStyle': 'normal', 'unicodeRange': None,
+            'src': 'url(/inter.woff2)'}
+    profile = SiteProfile('https://example.com')
+    profile.add(page('https://example.com/', font('Inter', variation('16px', 5)), faces=[face]))
+    profile.add(page('https://example.com/about', font('Inter', variation('16px', 2, elements=('li',)),
+                                                       variation('16px', 1, line_height='32px')),
+                     font('Lora', variation('32px', 4, elements=('h1',))), faces=[dict(face)]))
+    profile.add_failure('https://example.com/broken', 'Timeout')
+    data = profile.to_font_data()
+
+    assert [f['fontFamily'] for f in data['fonts']] == ['Inter', 'Lora']
+    inter = data['fonts'][0]
+    assert (inter['totalUsageCount'], inter['pageCount']) == (8, 2)
+    assert inter['elements'] == ['p', 'li']
+    # Variations with another line height stay apart, as within a page
+    assert [(v['lineHeight'], v['usageCount']) for v in inter['variations']] == [('24px', 7), ('32px', 1)]
+    assert inter['variations'][0]['elements'] == ['p', 'li']
+    assert len(data['fontFaces']) == 1
+    assert data['declaredFonts'] == ['Inter', 'Lora']
+    assert data['site'] == {'pages': 2, 'failedPages': [{'url': 'https://example.com/broken', 'error': 'Timeout'}]}
+    assert data['url'] == 'https://example.com'
@@ -0,0 +1,42 @@
+from stylesheet_memo import StylesheetMemo
+
+
+def sheet(key, family):
+    return {'key': key, 'href': key.split('#')[0], 'fontFaces': [{'fontFamily': family}], 'variableFonts': [],
+            'cssImports': [], 'declaredFonts': [family]}
+
+
+def sections(keys, extracted, declared=()):
+    return {'fontFaces': [], 'variableFonts': [], 'cssImports': [], 'declaredFonts': list(declared),
+            'fonts': [], 'sheets': {'keys': keys, 'extracted': extracted}}
+
+
+def test_first_page_extracts_and_later_pages_reuse():
+    memo = StylesheetMemo()
+    first = memo.expand(sections(['a.css#3', 'inline#1:9f'], [sheet('a.css#3', 'Inter'), sheet('inline#1:9f', 'Lora')]))
+    assert [face['fontFamily'] for face in first['fontFaces']] == ['Inter', 'Lora']
+    assert first['stylesheetMemo'] == {'sheets': 2, 'extracted': 2, 'reused': 0}
+    assert memo.known_keys() == ['a.css#3', 'inline#1:9f']
+
+    second = memo.expand(sections(['a.css#3', 'b.css#1'], [sheet('b.css#1', 'Mono')], declared=['Inline Family']))
+    assert [face['fontFamily'] for face in second['fontFaces']] == ['Inter', 'Mono']
+    # Families from stylesheets come first, then those from inline styles
+    assert second['declaredFonts'] == ['Inter', 'Mono', 'Inline Family']
+    assert second['stylesheetMemo'] == {'sheets': 2, 'extracted': 1, 'reused': 1}
+
+    stats = memo.stats()
+    assert (stats['sheetsExtracted'], stats['sheetsReused'], stats['uniqueSheets']) == (3, 1, 3)
+    assert stats['payloadBytesSaved'] > 0
+
+
+def test_expanded_entries_are_copies():
+    memo = StylesheetMemo()
+    memo.expand(sections(['a.css#3'], [sheet('a.css#3', 'Inter')]))
+    page = memo.expand(sections(['a.css#3'], []))
+    page['fontFaces'][0]['fontFamily'] = 'Changed'
+    assert memo.expand(sections(['a.css#3'], []))['fontFaces'][0]['fontFamily'] == 'Inter'
+
+
+def test_sections_without_a_memo_pass_through():
+    result = {'fonts': [], 'fontFaces': [{'fontFamily': 'Inter'}]}
+    assert StylesheetMemo().expand(dict(result)) == result
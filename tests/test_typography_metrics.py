@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from typography_metrics import compute_metrics, page_metrics, reaches_score
+
+
+def variation(size, weight='400', usage=1, line_height=None):
+    return {'fontSize': f'{size}px', 'fontSizePx': size, 'fontWeight': weight, 'fontStyle': 'normal',
+            'lineHeightValue': line_height, 'usageCount': usage}
+
+
+def page(*variations, family='Inter'):
+    return {'url': 'https://example.com/', 'fonts': [{'fontFamily': family, 'variations': list(variations)}]}
+
+
+def test_single_size_scores_full_marks_and_passes():
+    metrics = page_metrics(page(variation(16, usage=10, line_height=24)))
+    assert metrics['distinctSizes'] == 1
+    assert metrics['typeScale'] is None
+    assert metrics['consistencyScore'] == 100.0
+    assert metrics['passes'] is True
+    # A page that reaches the threshold skips the AI
+    assert reaches_score(metrics, 90)
+
+
+def test_page_without_sizes_has_no_score_and_never_skips_ai():
+    for font_data in ({'fonts': []}, page(variation(0))):
+        metrics = page_metrics(font_data)
+        assert metrics == {'distinctSizes': 0, 'consistencyScore': None, 'passes': False}
+        assert not reaches_score(metrics, 0)
+
+
+def test_sizes_on_a_modular_scale_fit_it():
+    sizes = [16 * 1.25 ** k for k in range(5)]
+    metrics = page_metrics(page(*(variation(round(size, 1), usage=10 if k == 0 else 1)
+                                  for k, size in enumerate(sizes))))
+    assert metrics['typeScale']['name'] == 'major third'
+    assert metrics['typeScale']['fit'] == 1.0
+    assert metrics['typeScale']['baseSizePx'] == 16.0
+
+
+def test_arbitrary_sizes_do_not_fit_a_scale():
+    metrics = page_metrics(page(*(variation(size) for size in (13, 17.5, 21, 29, 37, 43))))
+    assert metrics['components']['typeScale'] < 0.5
+
+
+def test_near_duplicate_sizes_are_clustered():
+    metrics = page_metrics(page(variation(15), variation(16), variation(24)))
+    assert metrics['sizeClusters'] == 2
+    assert metrics['nearDuplicateSizes'] == [[15.0, 16.0]]
+
+
+def test_weights_and_line_heights_are_usage_weighted():
+    metrics = page_metrics(page(variation(16, '400', usage=3, line_height=24),
+                                variation(16, 'bold', usage=1, line_height=16)))
+    assert metrics['weightDistribution'] == {'400': 0.75, '700': 0.25}
+    assert metrics['lineHeightRatio']['bodyComfortableShare'] == 0.75
+
+
+def test_pages_are_scored_independently():
+    results = compute_metrics([page(variation(16)), {'fonts': []}, page(variation(12), variation(40))])
+    assert [r['distinctSizes'] for r in results] == [1, 0, 2]
+    assert results[1]['consistencyScore'] is None
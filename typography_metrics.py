@@ -0,0 +1,227 @@
+from typing import Dict, List, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Common modular type scales, by step ratio
+TYPE_SCALES = {
+    'minor second': 1.067,
+    'major second': 1.125,
+    'minor third': 1.2,
+    'major third': 1.25,
+    'perfect fourth': 1.333,
+    'augmented fourth': 1.414,
+    'perfect fifth': 1.5,
+    'golden ratio': 1.618
+}
+
+# A size counts as on a scale when it is within a tenth of the scale's step of base * ratio^k,
+# and never more than 3% off; a fixed 3% would cover most of a 1.067 step, so any sizes would fit
+SCALE_STEP_TOLERANCE = 0.1
+SCALE_TOLERANCE = 0.03
+
+# Adjacent sizes less than 8% apart (e.g. 15px and 16px) fall in one cluster and count as near duplicates
+CLUSTER_TOLERANCE = 0.08
+
+# Line-height / font-size ratios considered comfortable for body text (24px and below)
+COMFORTABLE_LINE_HEIGHT = (1.3, 1.8)
+BODY_TEXT_MAX_PX = 24
+
+WEIGHT_NAMES = {'normal': 400, 'bold': 700, 'lighter': 300, 'bolder': 700}
+
+DEFAULT_PASS_SCORE = 80
+
+# Share of the consistency score taken by each component
+SCORE_WEIGHTS = {
+    'typeScale': 0.3,
+    'nearDuplicates': 0.2,
+    'sizeCount': 0.15,
+    'families': 0.15,
+    'weights': 0.1,
+    'lineHeight': 0.1
+}
+
+
+def _weight_value(weight: Any) -> float:
+    try:
+        return float(weight)
+    except (TypeError, ValueError):
+        return float(WEIGHT_NAMES.get(str(weight).lower(), 400))
+
+
+def load_variations(font_datas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Flattens the variations of many analyze_fonts results into parallel NumPy arrays
+
+    Each row is one variation; 'page' indexes font_datas and 'family' indexes 'familyNames'.
+    Missing line heights are NaN.
+    """
+    if np is None:
+        raise Exception('Typography metrics need numpy: pip install numpy')
+    pages, families, sizes, weights, usage, line_heights = [], [], [], [], [], []
+    family_ids = {}
+    for page, font_data in enumerate(font_datas):
+        for font in font_data.get('fonts', []):
+            family = family_ids.setdefault(font.get('fontFamily', ''), len(family_ids))
+            for v in font.get('variations', []):
+                pages.append(page)
+                families.append(family)
+                sizes.append(v.get('fontSizePx') or 0.0)
+                weights.append(_weight_value(v.get('fontWeight')))
+                usage.append(v.get('usageCount', 0))
+                line_height = v.get('lineHeightValue')
+                line_heights.append(np.nan if line_height is None else line_height)
+    return {
+        'page': np.asarray(pages, dtype=np.int64),
+        'family': np.asarray(families, dtype=np.int64),
+        'size': np.asarray(sizes, dtype=np.float64),
+        'weight': np.asarray(weights, dtype=np.float64),
+        'usage': np.asarray(usage, dtype=np.float64),
+        'lineHeight': np.asarray(line_heights, dtype=np.float64),
+        'familyNames': list(family_ids),
+        'pages': len(font_datas)
+    }
+
+
+def _ratio(numerator, denominator):
+    """Element-wise numerator / denominator with NaN where the denominator is 0"""
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def compute_metrics(font_datas: List[Dict[str, Any]], pass_score: float = DEFAULT_PASS_SCORE) -> List[Dict[str, Any]]:
+    """Computes typography metrics for every page at once, returning one dict per font_data
+
+    All pages share the same arrays; per-page figures come from segment sums over the page
+    index, so thousands of pages cost a handful of vectorised passes.
+    """
+    arrays = load_variations(font_datas)
+    n = arrays['pages']
+    valid = np.isfinite(arrays['size']) & (arrays['size'] > 0)
+    page = arrays['page'][valid]
+    family = arrays['family'][valid]
+    size = arrays['size'][valid]
+    weight = arrays['weight'][valid]
+    usage = arrays['usage'][valid]
+    line_height = arrays['lineHeight'][valid]
+
+    family_count = max(len(arrays['familyNames']), 1)
+    families = np.bincount(np.unique(page * family_count + family) // family_count, minlength=n)
+
+    # Distinct sizes per page (to 0.1px), sorted by page then size, with their usage
+    rounded = np.round(size, 1)
+    order = np.lexsort((rounded, page))
+    sorted_page = page[order]
+    sorted_size = rounded[order]
+    new_size = np.ones(len(order), dtype=bool)
+    new_size[1:] = (sorted_page[1:] != sorted_page[:-1]) | (sorted_size[1:] != sorted_size[:-1])
+    size_page = sorted_page[new_size]
+    size_value = sorted_size[new_size]
+    size_usage = np.bincount(np.cumsum(new_size) - 1, weights=usage[order], minlength=len(size_value))
+    distinct = np.bincount(size_page, minlength=n)
+
+    # Clusters: a new one starts on a new page or when the step from the previous size is 8%+
+    new_cluster = np.ones(len(size_value), dtype=bool)
+    new_cluster[1:] = (size_page[1:] != size_page[:-1]) | (size_value[1:] >= size_value[:-1] * (1 + CLUSTER_TOLERANCE))
+    clusters = np.bincount(size_page[new_cluster], minlength=n)
+    duplicate_rows = np.nonzero(~new_cluster)[0]
+
+    # Base size: the most used size of each page, the smaller one on a tie
+    by_usage = np.lexsort((-size_value, size_usage, size_page))
+    last = np.ones(len(by_usage), dtype=bool)
+    last[:-1] = size_page[by_usage][1:] != size_page[by_usage][:-1]
+    base = np.full(n, np.nan)
+    base[size_page[by_usage][last]] = size_value[by_usage][last]
+
+    # Type scale: share of the non-base sizes lying on base * ratio^k, corrected for the share
+    # a random size would hit by chance (the base itself is always on the scale)
+    ratios = np.array(list(TYPE_SCALES.values()))
+    log_ratios = np.log(ratios)
+    tolerance = np.minimum(SCALE_STEP_TOLERANCE * log_ratios, np.log(1 + SCALE_TOLERANCE))
+    steps = np.log(size_value / base[size_page])[:, None] / log_ratios[None, :]
+    on_scale = np.abs(steps - np.round(steps)) * log_ratios[None, :] <= tolerance[None, :]
+    hits = np.stack([np.bincount(size_page, weights=on_scale[:, j].astype(np.float64), minlength=n) for j in range(len(ratios))], axis=1)
+    chance = 2 * tolerance / log_ratios
+    share = _ratio(hits - 1, np.repeat((distinct - 1)[:, None], len(ratios), axis=1).astype(np.float64))
+    fit = np.clip((share - chance[None, :]) / (1 - chance[None, :]), 0, 1)
+    # On equal fit the larger ratio wins, being the less likely to fit by chance
+    best_scale = np.argmax(np.round(np.nan_to_num(fit, nan=-1.0), 3) + 1e-6 * log_ratios[None, :], axis=1)
+    best_fit = fit[np.arange(n), best_scale]
+
+    # Usage-weighted weight distribution over the 100..900 bins
+    weight_bin = np.clip(np.round(weight / 100), 1, 9).astype(np.int64) - 1
+    weight_usage = np.bincount(page * 9 + weight_bin, weights=usage, minlength=n * 9).reshape(n, 9)
+    weight_share = _ratio(weight_usage, np.repeat(weight_usage.sum(axis=1, keepdims=True), 9, axis=1))
+    distinct_weights = (weight_usage > 0).sum(axis=1)
+
+    # Line-height / size ratios, usage weighted; comfort is judged on body text only
+    has_line_height = np.isfinite(line_height)
+    lh_ratio = np.where(has_line_height, line_height / size, 0.0)
+    lh_usage = np.where(has_line_height, usage, 0.0)
+    mean_lh_ratio = _ratio(np.bincount(page, weights=lh_ratio * lh_usage, minlength=n),
+                           np.bincount(page, weights=lh_usage, minlength=n))
+    body = has_line_height & (size <= BODY_TEXT_MAX_PX)
+    comfortable = body & (lh_ratio >= COMFORTABLE_LINE_HEIGHT[0]) & (lh_ratio <= COMFORTABLE_LINE_HEIGHT[1])
+    body_usage = np.bincount(page, weights=np.where(body, usage, 0.0), minlength=n)
+    comfortable_share = _ratio(np.bincount(page, weights=np.where(comfortable, usage, 0.0), minlength=n), body_usage)
+
+    # Consistency score, each component in 0..1
+    components = {
+        'typeScale': np.where(distinct >= 3, np.nan_to_num(best_fit), 1.0),
+        'nearDuplicates': 1 - _ratio((distinct - clusters).astype(np.float64), np.maximum(distinct - 1, 1).astype(np.float64)),
+        'sizeCount': np.clip(1 - (distinct - 8) / 8, 0, 1),
+        'families': np.clip(1 - (families - 3) / 3, 0, 1),
+        'weights': np.clip(1 - (distinct_weights - 4) / 4, 0, 1),
+        'lineHeight': np.where(body_usage > 0, np.nan_to_num(comfortable_share), 1.0)
+    }
+    score = 100 * sum(SCORE_WEIGHTS[name] * np.nan_to_num(values, nan=1.0) for name, values in components.items())
+
+    near_duplicates = [[] for _ in range(n)]
+    for row in duplicate_rows:
+        near_duplicates[size_page[row]].append([float(size_value[row - 1]), float(size_value[row])])
+
+    scale_names = list(TYPE_SCALES)
+    results = []
+    for i in range(n):
+        if distinct[i] == 0:
+            results.append({'distinctSizes': 0, 'consistencyScore': None, 'passes': False})
+            continue
+        type_scale = None
+        if distinct[i] >= 3:
+            type_scale = {
+                'name': scale_names[best_scale[i]],
+                'ratio': float(ratios[best_scale[i]]),
+                'fit': round(float(best_fit[i]), 3),
+                'baseSizePx': float(base[i])
+            }
+        results.append({
+            'distinctSizes': int(distinct[i]),
+            'sizeClusters': int(clusters[i]),
+            'nearDuplicateSizes': near_duplicates[i],
+            'typeScale': type_scale,
+            'families': int(families[i]),
+            'distinctWeights': int(distinct_weights[i]),
+            'weightDistribution': {str(100 * (b + 1)): round(float(weight_share[i, b]), 3)
+                                   for b in range(9) if weight_usage[i, b] > 0},
+            'lineHeightRatio': {
+                'mean': None if np.isnan(mean_lh_ratio[i]) else round(float(mean_lh_ratio[i]), 3),
+                'bodyComfortableShare': None if np.isnan(comfortable_share[i]) else round(float(comfortable_share[i]), 3)
+            },
+            'components': {name: round(float(values[i]), 3) for name, values in components.items()},
+            'consistencyScore': round(float(score[i]), 1),
+            'passes': bool(score[i] >= pass_score)
+        })
+    return results
+
+
+def page_metrics(font_data: Dict[str, Any], pass_score: float = DEFAULT_PASS_SCORE) -> Dict[str, Any]:
+    """compute_metrics for a single page"""
+    return compute_metrics([font_data], pass_score)[0]
+
+
+def reaches_score(metrics: Dict[str, Any], threshold: float) -> bool:
+    """True if the page's consistency score reaches threshold; a page without one (no usable sizes) never does"""
+    score = metrics.get('consistencyScore')
+    return score is not None and score >= threshold
@@ -0,0 +1,410 @@
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from urllib.parse import urlsplit
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from browser_pool import AsyncBrowserPool, _process_tree_rss_mb
+from async_extractor import analyze_fonts_async
+from font_store import FontStore
+from profiling import Profiler
+
+DEFAULT_URL_TIMEOUT = 180.0
+
+# A run is aborted once this many workers in a row die before they are ready for a URL
+MAX_STARTUP_FAILURES = 3
+
+# How often the supervisor checks for timed-out or dead workers while waiting for results,
+# and for finished lookups while any are running
+_POLL_SECONDS = 0.25
+_LOOKUP_POLL_SECONDS = 0.02
+
+# Marks the end of the results handed from the supervisor thread to imap_async
+_END = object()
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident memory (MB) of pid and all of its descendants, e.g. a worker and its browser"""
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            own_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return own_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024) + (_process_tree_rss_mb(pid) or 0)
+
+
+def _worker_main(conn, options: Dict[str, Any], pool_options: Dict[str, Any],
+                 store_spec: Optional[Tuple[str, Optional[int]]], profile: bool, max_memory_mb: Optional[float]):
+    """Worker process: analyzes the URLs the supervisor sends over conn with its own browser
+
+    Replies ('ready',) once the browser is up, then ('done', font_data, error, profiler events,
+    recycle) per URL. With recycle set the worker has grown past max_memory_mb and exits.
+    Pages run on the asyncio engine, so the child frames of a page are evaluated at once.
+    """
+    events = []
+    profiler = Profiler(hook=events.append) if profile else None
+    try:
+        if store_spec is not None:
+            # SQLite connections cannot cross processes; every worker opens the shared store itself
+            options = dict(options, font_store=FontStore(*store_spec))
+        asyncio.run(_serve(conn, options, pool_options, profiler, events, max_memory_mb))
+    except (EOFError, KeyboardInterrupt):
+        # The supervisor went away or the run was interrupted
+        return
+    except Exception as e:
+        try:
+            conn.send(('failed', str(e)))
+        except OSError:
+            pass
+
+
+async def _serve(conn, options: Dict[str, Any], pool_options: Dict[str, Any], profiler: Optional[Profiler],
+                 events: List[Dict[str, Any]], max_memory_mb: Optional[float]):
+    loop = asyncio.get_running_loop()
+    async with AsyncBrowserPool(**dict(pool_options, profiler=profiler)) as pool:
+        conn.send(('ready',))
+        while True:
+            # Waiting in a thread keeps the loop, and with it the Playwright connection, running
+            url = await loop.run_in_executor(None, conn.recv)
+            if url is None:
+                return
+            try:
+                font_data, error = await analyze_fonts_async(url, pool=pool, profiler=profiler, **options), None
+            except Exception as e:
+                font_data, error = None, str(e)
+            rss = _rss_mb(os.getpid()) if max_memory_mb else None
+            recycle = rss is not None and rss > max_memory_mb
+            conn.send(('done', font_data, error, list(events), recycle))
+            events.clear()
+            if profiler is not None:
+                profiler.events.clear()
+            if recycle:
+                return
+
+
+class WorkerPool:
+    """Runs extraction in `workers` separate processes, each with its own AsyncBrowserPool.
+
+    A page that crashes or hangs only takes down its worker: a URL that runs past
+    `url_timeout` seconds or whose worker dies yields an error, and the worker is killed and
+    replaced. Idle workers pull the next URL from the supervisor's shared queue, so a slow
+    page never holds up URLs another worker could take, and at most `per_host_limit` pages
+    of one host are in flight. A worker whose process tree (itself plus its browser) is above
+    `max_memory_mb` after a page is restarted. Remaining keyword options are passed to
+    analyze_fonts_async in the workers; the profiler gets the workers' events, and a FontStore is
+    reopened from its directory in every worker.
+    """
+
+    def __init__(self, workers: Optional[int] = None, url_timeout: float = DEFAULT_URL_TIMEOUT,
+                 max_memory_mb: Optional[float] = None, per_host_limit: int = 2,
+                 pool_options: Optional[Dict[str, Any]] = None, **extraction_options):
+        self.workers = workers or os.cpu_count() or 1
+        self.url_timeout = url_timeout
+        self.max_memory_mb = max_memory_mb
+        self.per_host_limit = per_host_limit
+        self.profiler = extraction_options.pop('profiler', None)
+        font_store = extraction_options.pop('font_store', None)
+        self._store_spec = (font_store.directory, font_store.max_bytes) if font_store is not None else None
+        self._options = extraction_options
+        self._pool_options = {k: v for k, v in (pool_options or {}).items() if k != 'profiler'}
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = {}
+        self._next_id = 0
+        self._startup_failures = 0
+        self._last_startup_error = None
+        self._host_load = {}
+        self._stats = {'started': 0, 'restarts': 0, 'timeouts': 0, 'crashes': 0, 'recycled': 0, 'pages': 0}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        while len(self._workers) < self.workers:
+            self._spawn()
+
+    def close(self):
+        """Stops idle workers gracefully and kills the ones still busy with a page"""
+        for worker in self._workers.values():
+            if worker['task'] is None:
+                try:
+                    worker['conn'].send(None)
+                except OSError:
+                    pass
+        deadline = time.monotonic() + 10
+        for worker_id in list(self._workers):
+            worker = self._workers[worker_id]
+            if worker['task'] is None:
+                worker['process'].join(max(0, deadline - time.monotonic()))
+            self._retire(worker_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, workers=self.workers)
+
+    def imap(self, urls: Iterable[str], ordered: bool = True,
+             lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+             ) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Yields (url, font_data, error) for every URL, in input order unless ordered is False
+
+        URLs are pulled from the iterable lazily. In order, results that finish early wait in
+        a bounded reorder buffer; with ordered=False they are yielded as they complete.
+        `lookup`, e.g. a result cache check, runs in a supervisor thread for each URL under
+        its host limit; a URL it returns a result for is yielded with it instead of being rendered.
+        """
+        return self._imap(urls, ordered, lookup=lookup)
+
+    async def imap_async(self, urls: Iterable[str], ordered: bool = True,
+                         lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+                         ) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """imap for asyncio code: the supervisor runs in a thread and hands results to the event loop"""
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue(maxsize=self.workers)
+        stop = threading.Event()
+
+        def supervise():
+            end = _END
+            try:
+                for item in self._imap(urls, ordered, stop, lookup):
+                    asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+            except BaseException as e:
+                end = e
+            asyncio.run_coroutine_threadsafe(items.put(end), loop)
+
+        thread = threading.Thread(target=supervise, name='worker-pool-supervisor', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = await items.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the supervisor if it is waiting on a full queue, then let it wind down
+            while thread.is_alive():
+                while not items.empty():
+                    items.get_nowait()
+                await asyncio.sleep(0.05)
+
+    def _imap(self, urls, ordered, stop=None, lookup=None):
+        self.start()
+        url_iter = enumerate(urls)
+        backlog = deque()
+        exhausted = False
+        buffer = {}
+        next_out = 0
+        # In order, a URL is only started while the buffer waiting on the oldest one stays bounded
+        window = self.workers * 16
+        self._host_load = {}
+        # Lookups in flight, and the backlog indexes whose lookup found nothing
+        lookups = {}
+        checked = set() if lookup is not None else None
+        executor = ThreadPoolExecutor(max_workers=self.workers * 2) if lookup is not None else None
+        finished_run = False
+        try:
+            while stop is None or not stop.is_set():
+                while not exhausted and len(backlog) < self.workers * 4:
+                    try:
+                        backlog.append(next(url_iter))
+                    except StopIteration:
+                        exhausted = True
+                index_limit = next_out + window if ordered else None
+                if lookup is not None:
+                    self._start_lookups(backlog, lookups, checked, executor, lookup, index_limit)
+                self._assign(backlog, index_limit, checked)
+                if (exhausted and not backlog and not lookups
+                        and all(w['task'] is None for w in self._workers.values())):
+                    finished_run = True
+                    break
+                finished = self._poll(_LOOKUP_POLL_SECONDS if lookups else _POLL_SECONDS)
+                finished.extend(self._finish_lookups(backlog, lookups, checked))
+                for index, url, font_data, error in finished:
+                    if ordered:
+                        buffer[index] = (url, font_data, error)
+                    else:
+                        yield url, font_data, error
+                while next_out in buffer:
+                    yield buffer.pop(next_out)
+                    next_out += 1
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            if not finished_run:
+                # Abandoned mid-run: don't leave workers busy with pages nobody will collect
+                self.close()
+
+    def _start_lookups(self, backlog: deque, lookups: Dict[Any, Tuple[int, str]], checked: Set[int],
+                       executor: ThreadPoolExecutor, lookup: Callable, index_limit: Optional[int]):
+        """Starts the lookup of backlog URLs not looked up yet, within the host limit"""
+        looking = {index for index, _ in lookups.values()}
+        for index, url in backlog:
+            if len(lookups) >= self.workers * 2 or (index_limit is not None and index >= index_limit):
+                return
+            if index in checked or index in looking or self._host_load.get(_host(url), 0) >= self.per_host_limit:
+                continue
+            lookups[executor.submit(lookup, url)] = (index, url)
+            self._host_load[_host(url)] = self._host_load.get(_host(url), 0) + 1
+
+    def _finish_lookups(self, backlog: deque, lookups: Dict[Any, Tuple[int, str]],
+                        checked: Set[int]) -> List[Tuple[int, str, Optional[Dict[str, Any]], None]]:
+        """Collects finished lookups: hits leave the backlog as results, misses are left for a worker"""
+        finished = []
+        for future in [f for f in lookups if f.done()]:
+            index, url = lookups.pop(future)
+            self._release(url)
+            try:
+                result = future.result()
+            except Exception:
+                result = None
+            if result is None:
+                checked.add(index)
+            else:
+                backlog.remove((index, url))
+                finished.append((index, url, result, None))
+        return finished
+
+    def _assign(self, backlog: deque, index_limit: Optional[int], checked: Optional[Set[int]] = None):
+        """Hands the first eligible backlog URL to every idle worker; with checked, only URLs in it"""
+        for worker in self._workers.values():
+            if not worker['ready'] or worker['task'] is not None:
+                continue
+            pick = None
+            for position, (index, url) in enumerate(backlog):
+                if index_limit is not None and index >= index_limit:
+                    break
+                if checked is not None and index not in checked:
+                    continue
+                if self._host_load.get(_host(url), 0) < self.per_host_limit:
+                    pick = position
+                    break
+            if pick is None:
+                return
+            index, url = backlog[pick]
+            del backlog[pick]
+            if checked is not None:
+                checked.discard(index)
+            try:
+                worker['conn'].send(url)
+            except OSError:
+                # The worker is gone; _poll fails the URL and replaces it
+                pass
+            worker['task'] = (index, url, time.monotonic())
+            self._host_load[_host(url)] = self._host_load.get(_host(url), 0) + 1
+
+    def _poll(self, timeout: float = _POLL_SECONDS) -> List[Tuple[int, str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Waits up to timeout for worker messages, then deals with timed-out and dead workers"""
+        finished = []
+        connections = {worker['conn']: worker_id for worker_id, worker in self._workers.items()}
+        for conn in wait(list(connections), timeout=timeout):
+            self._receive(connections[conn], finished)
+
+        now = time.monotonic()
+        for worker_id, worker in list(self._workers.items()):
+            process, task = worker['process'], worker['task']
+            if task is not None and now - task[2] > self.url_timeout:
+                self._retire(worker_id)
+                self._stats['timeouts'] += 1
+                finished.append(self._fail(task, f'Timed out after {self.url_timeout:g}s; worker restarted'))
+            elif worker['closed'] or not process.is_alive():
+                # A worker can report its last page or its startup error just before exiting
+                while not worker['closed'] and worker['conn'].poll():
+                    self._receive(worker_id, finished)
+                task = worker['task']
+                self._retire(worker_id)
+                if task is not None:
+                    self._stats['crashes'] += 1
+                    finished.append(self._fail(task, f'Worker crashed (exit code {process.exitcode}); worker restarted'))
+                elif not worker['ready'] and not worker['recycling']:
+                    self._startup_failures += 1
+                    self._last_startup_error = worker['error'] or f'exit code {process.exitcode}'
+                    if self._startup_failures >= MAX_STARTUP_FAILURES:
+                        raise RuntimeError(f'Extraction workers fail to start: {self._last_startup_error}')
+            else:
+                continue
+            self._stats['restarts'] += 1
+            self._spawn()
+        return finished
+
+    def _receive(self, worker_id: int, finished: list):
+        worker = self._workers[worker_id]
+        try:
+            message = worker['conn'].recv()
+        except (EOFError, OSError):
+            worker['closed'] = True
+            return
+        if message[0] == 'ready':
+            worker['ready'] = True
+            self._startup_failures = 0
+        elif message[0] == 'failed':
+            worker['error'] = message[1]
+        elif message[0] == 'done':
+            _, font_data, error, events, recycle = message
+            index, url, _ = worker['task']
+            worker['task'] = None
+            self._release(url)
+            self._replay(events)
+            self._stats['pages'] += 1
+            if recycle:
+                worker['ready'] = False
+                worker['recycling'] = True
+                self._stats['recycled'] += 1
+            finished.append((index, url, font_data, error))
+
+    def _fail(self, task: Tuple[int, str, float], error: str) -> Tuple[int, str, None, str]:
+        index, url, _ = task
+        self._release(url)
+        return index, url, None, error
+
+    def _release(self, url: str):
+        host = _host(url)
+        self._host_load[host] = max(0, self._host_load.get(host, 0) - 1)
+
+    def _replay(self, events: List[Dict[str, Any]]):
+        """Records a worker's profiler events in this process's profiler"""
+        if self.profiler is None:
+            return
+        for event in events:
+            if event['type'] == 'phase':
+                self.profiler.record(event['name'], event['ms'], event['url'])
+            else:
+                self.profiler.count(event['name'], event['value'], event['url'])
+
+    def _spawn(self):
+        worker_id = self._next_id
+        self._next_id += 1
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f'font-worker-{worker_id}', daemon=True,
+            args=(child_conn, self._options, self._pool_options, self._store_spec, self.profiler is not None,
+                  self.max_memory_mb))
+        process.start()
+        child_conn.close()
+        self._workers[worker_id] = {'process': process, 'conn': conn, 'task': None, 'ready': False,
+                                    'recycling': False, 'closed': False, 'error': None}
+        self._stats['started'] += 1
+
+    def _retire(self, worker_id: int):
+        """Removes a worker, killing its process if it is still running"""
+        worker = self._workers.pop(worker_id)
+        process = worker['process']
+        if process.is_alive():
+            # The browser's driver notices its parent is gone and takes the browser down with it
+            process.terminate()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+        process.join()
+        worker['conn'].close()
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()